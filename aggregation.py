@@ -0,0 +1,636 @@
+"""Aggregation Engine
+Purpose: Compute every per-city and overall total the reports need in a single pass over the records.
+Callers register the metrics they want, run the engine once, and read each answer from the result.
+The functions in pm25_functions.py and ozone_functions.py are thin views over this engine.
+Backends: "python" loops over records (AirQualityTable columns are folded by integer city code, with
+per-city totals in flat lists; names are looked up only when the totals are written back); "numpy" uses numpy_backend on AirQualityTable columns;
+"auto" picks NumPy when it is installed and the records are a table. Both give identical results.
+A sqlite_store.SQLiteStore is answered with SQL GROUP BY queries instead of any scan.
+Every pollutant with a breakpoint table (categories.BREAKPOINTS: PM2.5, ozone, AQI, NO2, CO, PM10, ...)
+goes through the same accumulator, so summarize_pollutants covers all of a table's pollutant columns
+in one scan.
+Example: result = AggregationEngine(["pm25_averages", "ozone_unhealthy"]).run(records)
+         result.city_averages("pm25") -> {"LA": {"avg_pm25": 17.5, "pm25_count": 2}, ...}
+Sums are kept exactly (see exact_sum.py), so averages do not depend on backend, shard or file order.
+Notes: "quantiles" and "distinct" metrics use the bounded-memory sketches in sketches.py, so
+percentiles and distinct counts stay approximate (with documented error) but mergeable across shards.
+"""
+from bisect import bisect_left
+from collections import Counter
+
+from categories import BREAKPOINTS
+from data import AirQualityTable
+from exact_sum import exact, mean
+import numpy_backend
+from sqlite_store import SQLiteStore, PUSHED_DOWN
+from sketches import KLLSketch, HyperLogLog
+
+BACKENDS = ("python", "numpy", "auto")
+default_backend = "python"
+# Distinct readings whose exact units each accumulator remembers (see PollutantAccumulator.units)
+EXACT_MEMO_SIZE = 1 << 16
+
+
+"""
+Purpose: Choose the backend used by engines that do not name one (including the pm25/ozone functions).
+Input type: str ("python", "numpy" or "auto")
+Output type: None
+Example: set_backend("auto")
+"""
+def set_backend(name):
+    global default_backend
+    if name not in BACKENDS:
+        raise ValueError("unknown backend: " + str(name))
+    default_backend = name
+
+
+METRIC_KINDS = ("statistics", "averages", "unhealthy", "distribution", "quantiles", "distinct")
+SUMMARY_KINDS = ("statistics", "averages", "unhealthy", "distribution")
+
+
+"""
+Purpose: Compute statistics, per-city averages, unhealthy-day counts and category distributions for
+several pollutants in one scan.
+Input type: records (AirQualityTable or iterable of AirQuality), pollutants (list[str] or None for every
+pollutant column of a table that has a breakpoint table; PM2.5 and ozone for other records),
+kinds (metric kinds), backend (str or None)
+Output type: AggregateResult
+Example: summarize_pollutants(table).city_averages("no2") -> {"LA": {"avg_no2": 41.0, "no2_count": 2}}
+"""
+def summarize_pollutants(records, pollutants=None, kinds=SUMMARY_KINDS, backend=None):
+    if pollutants is None:
+        columns = records.pollutants() if isinstance(records, AirQualityTable) else ["pm25", "ozone"]
+        pollutants = [pollutant for pollutant in columns if pollutant in BREAKPOINTS]
+    metrics = [pollutant + "_" + kind for pollutant in pollutants for kind in kinds]
+    return AggregationEngine(metrics, backend).run(records)
+
+
+class PollutantAccumulator:
+    """Running totals for one pollutant, overall and per city."""
+    def __init__(self, pollutant, track_cities=True, track_unhealthy=True, track_distribution=True,
+                 track_quantiles=False, track_distinct=False, track_sums=True):
+        """Purpose: Start empty totals for one pollutant.
+        Inputs: pollutant str (a key of categories.BREAKPOINTS), bool flags choosing which totals to keep
+        (track_sums: keep the exact sums behind the averages; per-city averages always need them).
+        Output: None.
+        Example: PollutantAccumulator("pm25", track_distribution=False)
+        """
+        self.pollutant = pollutant
+        self.breakpoints = BREAKPOINTS[pollutant]
+        self.unhealthy_at = self.breakpoints.unhealthy_at
+        self.integer = self.breakpoints.integer
+        self.track_cities = track_cities
+        self.track_unhealthy = track_unhealthy
+        self.track_distribution = track_distribution
+        self.track_quantiles = track_quantiles
+        self.track_distinct = track_distinct
+        self.track_sums = track_sums or track_cities
+        # value -> exact units, so each distinct reading is converted once (at most EXACT_MEMO_SIZE kept)
+        self.exact_values = {}
+        self.count = 0
+        # Exact sum in units of 2**-1074 (see exact_sum.py)
+        self.total = 0
+        self.low = None
+        self.high = None
+        # city -> [exact sum, count, min, max]
+        self.cities = {}
+        self.unhealthy = {}
+        self.distribution = {}
+        # Quantile sketches overall and per city; distinct counters for cities and dates
+        self.sketch = KLLSketch() if track_quantiles else None
+        self.city_sketches = {}
+        self.city_counter = HyperLogLog() if track_distinct else None
+        self.date_counter = HyperLogLog() if track_distinct else None
+        self.city_dates = {}
+
+    def add(self, city, value, date=None):
+        """Purpose: Fold one non-missing reading into the totals.
+        Inputs: city str, value float, date str (only used by the distinct counters).
+        Output: None.
+        Example: acc.add("LA", 12.5, "01/01/25")
+        """
+        self.count += 1
+        if self.track_sums:
+            units = self.exact_values.get(value)
+            if units is None:
+                units = self.units(value)
+            self.total += units
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+        if self.track_cities:
+            slot = self.cities.get(city)
+            if slot is None:
+                slot = [0, 0, value, value]
+                self.cities[city] = slot
+            slot[0] += units
+            slot[1] += 1
+            if value < slot[2]:
+                slot[2] = value
+            if value > slot[3]:
+                slot[3] = value
+        if self.track_unhealthy and value >= self.unhealthy_at:
+            self.unhealthy[city] = self.unhealthy.get(city, 0) + 1
+        if self.track_distribution:
+            label = self.breakpoints.labels[bisect_left(self.breakpoints.limits, value)]
+            self.distribution[label] = self.distribution.get(label, 0) + 1
+        if self.track_quantiles:
+            self.sketch.update(value)
+            sketch = self.city_sketches.get(city)
+            if sketch is None:
+                sketch = self.city_sketches[city] = KLLSketch()
+            sketch.update(value)
+        if self.track_distinct:
+            self.add_distinct(city, date)
+
+    def units(self, value):
+        """Purpose: Return exact_sum.exact(value), remembered per distinct value.
+        Example: acc.units(0.5) -> 1 << 1073
+        """
+        units = self.exact_values.get(value)
+        if units is None:
+            units = exact(value)
+            if len(self.exact_values) < EXACT_MEMO_SIZE:
+                self.exact_values[value] = units
+        return units
+
+    def add_distinct(self, city, date):
+        """Purpose: Count a reading's city and date in the distinct counters."""
+        self.city_counter.add(city)
+        self.date_counter.add(date)
+        counter = self.city_dates.get(city)
+        if counter is None:
+            counter = self.city_dates[city] = HyperLogLog()
+        counter.add(date)
+
+    def quantiles(self, fractions):
+        """Purpose: Return approximate overall quantiles (see sketches.KLLSketch for the error bound).
+        Input: list of fractions 0..1.
+        Output: dict fraction -> value, like {0.5: 14.2, 0.98: 41.0}.
+        Raises ValueError when no values were added.
+        """
+        if self.count == 0:
+            raise ValueError("no " + self.pollutant + " values to summarize")
+        return dict(zip(fractions, self.sketch.quantiles(fractions)))
+
+    def city_quantiles(self, fractions):
+        """Purpose: Return approximate quantiles for each city.
+        Output: dict like {"LA": {0.5: 14.2, 0.98: 41.0}}.
+        """
+        return {city: dict(zip(fractions, sketch.quantiles(fractions))) for city, sketch in self.city_sketches.items()}
+
+    def distinct(self):
+        """Purpose: Return approximate distinct counts of cities and dates with a reading.
+        Output: dict like {"cities": 40, "dates": 365, "city_dates": {"LA": 362, ...}}.
+        """
+        return {
+            "cities": self.city_counter.count(),
+            "dates": self.date_counter.count(),
+            "city_dates": {city: counter.count() for city, counter in self.city_dates.items()},
+        }
+
+    def statistics(self):
+        """Purpose: Return overall min, max, average and count.
+        Output: dict like {"min": 10.0, "max": 30.0, "avg": 20.0, "count": 3}.
+        Raises ValueError when no values were added.
+        """
+        if self.count == 0:
+            raise ValueError("no " + self.pollutant + " values to summarize")
+        return {
+            "min": self.low,
+            "max": self.high,
+            "avg": mean(self.total, self.count),
+            "count": self.count
+        }
+
+    def city_averages(self):
+        """Purpose: Return each city's average and count.
+        Output: dict like {"LA": {"avg_pm25": 17.5, "pm25_count": 2}}.
+        """
+        avg_key = "avg_" + self.pollutant
+        count_key = self.pollutant + "_count"
+        city_averages = {}
+        for city in self.cities:
+            slot = self.cities[city]
+            city_averages[city] = {avg_key: mean(slot[0], slot[1]), count_key: slot[1]}
+        return city_averages
+
+    def city_statistics(self):
+        """Purpose: Return each city's min, max, average and count.
+        Output: dict like {"LA": {"min": 15.0, "max": 20.0, "avg": 17.5, "count": 2}}.
+        """
+        city_stats = {}
+        for city in self.cities:
+            total, count, low, high = self.cities[city]
+            city_stats[city] = {"min": low, "max": high, "avg": mean(total, count), "count": count}
+        return city_stats
+
+    def to_dict(self):
+        """Purpose: Return the totals as plain JSON-ready data (see from_dict).
+        Output: dict.
+        """
+        return {
+            "pollutant": self.pollutant,
+            "track": [self.track_cities, self.track_unhealthy, self.track_distribution,
+                      self.track_quantiles, self.track_distinct, self.track_sums],
+            "count": self.count,
+            "total": self.total,
+            "low": self.low,
+            "high": self.high,
+            "cities": self.cities,
+            "unhealthy": self.unhealthy,
+            "distribution": self.distribution,
+            "sketch": self.sketch.to_dict() if self.track_quantiles else None,
+            "city_sketches": {city: sketch.to_dict() for city, sketch in self.city_sketches.items()},
+            "city_counter": self.city_counter.to_dict() if self.track_distinct else None,
+            "date_counter": self.date_counter.to_dict() if self.track_distinct else None,
+            "city_dates": {city: counter.to_dict() for city, counter in self.city_dates.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Purpose: Rebuild an accumulator saved with to_dict.
+        Input: dict.
+        Output: PollutantAccumulator.
+        """
+        accumulator = cls(data["pollutant"], *data["track"])
+        accumulator.count = data["count"]
+        accumulator.total = data["total"]
+        accumulator.low = data["low"]
+        accumulator.high = data["high"]
+        accumulator.cities = data["cities"]
+        accumulator.unhealthy = data["unhealthy"]
+        accumulator.distribution = data["distribution"]
+        if accumulator.track_quantiles:
+            accumulator.sketch = KLLSketch.from_dict(data["sketch"])
+            accumulator.city_sketches = {city: KLLSketch.from_dict(saved) for city, saved in data["city_sketches"].items()}
+        if accumulator.track_distinct:
+            accumulator.city_counter = HyperLogLog.from_dict(data["city_counter"])
+            accumulator.date_counter = HyperLogLog.from_dict(data["date_counter"])
+            accumulator.city_dates = {city: HyperLogLog.from_dict(saved) for city, saved in data["city_dates"].items()}
+        return accumulator
+
+    def merge(self, other):
+        """Purpose: Fold another accumulator's totals (for example from another file or shard) into this one.
+        Input: PollutantAccumulator for the same pollutant, covering rows that come after this one's.
+        Output: None.
+        Example: first.merge(second) leaves first holding the totals of both.
+        Notes: Everything but the approximate sketches merges exactly (sums are exact, see exact_sum.py),
+        so averages match a single scan over all the rows bit for bit.
+        """
+        # A shard folded for its distribution only (see fold_column) has categories but no overall totals
+        if other.count:
+            self.count += other.count
+            self.total += other.total
+            if self.low is None or other.low < self.low:
+                self.low = other.low
+            if self.high is None or other.high > self.high:
+                self.high = other.high
+        for city in other.cities:
+            total, count, low, high = other.cities[city]
+            slot = self.cities.get(city)
+            if slot is None:
+                self.cities[city] = [total, count, low, high]
+            else:
+                slot[0] += total
+                slot[1] += count
+                if low < slot[2]:
+                    slot[2] = low
+                if high > slot[3]:
+                    slot[3] = high
+        for city in other.unhealthy:
+            self.unhealthy[city] = self.unhealthy.get(city, 0) + other.unhealthy[city]
+        for label in other.distribution:
+            self.distribution[label] = self.distribution.get(label, 0) + other.distribution[label]
+        if self.track_quantiles:
+            self.sketch.merge(other.sketch)
+            for city, sketch in other.city_sketches.items():
+                self.city_sketches.setdefault(city, KLLSketch()).merge(sketch)
+        if self.track_distinct:
+            self.city_counter.merge(other.city_counter)
+            self.date_counter.merge(other.date_counter)
+            for city, counter in other.city_dates.items():
+                self.city_dates.setdefault(city, HyperLogLog()).merge(counter)
+
+
+class AggregateResult:
+    """Answers from one engine run, read per pollutant."""
+    def __init__(self, accumulators, metrics):
+        self.accumulators = accumulators
+        self.metrics = metrics
+        self.row_count = 0
+
+    def merge(self, other):
+        """Purpose: Fold another result with the same metrics into this one (rows of other come after).
+        Input: AggregateResult.
+        Output: None.
+        """
+        for pollutant in other.accumulators:
+            self.accumulators[pollutant].merge(other.accumulators[pollutant])
+        self.row_count += other.row_count
+
+    def has_values(self, pollutant):
+        """Purpose: Tell whether any reading of a pollutant was added (files may lack some pollutants).
+        Example: result.has_values("ozone") -> False when no file had an ozone column
+        """
+        accumulator = self.accumulators.get(pollutant)
+        return accumulator is not None and accumulator.count > 0
+
+    def _accumulator(self, pollutant, kind):
+        if pollutant + "_" + kind not in self.metrics:
+            raise KeyError("metric not registered: " + pollutant + "_" + kind)
+        return self.accumulators[pollutant]
+
+    def statistics(self, pollutant):
+        """Purpose: Overall min/max/avg/count, same shape as get_pm25_statistics."""
+        return self._accumulator(pollutant, "statistics").statistics()
+
+    def city_averages(self, pollutant):
+        """Purpose: Per-city average and count, same shape as calculate_pm25_city_averages."""
+        return self._accumulator(pollutant, "averages").city_averages()
+
+    def city_statistics(self, pollutant):
+        """Purpose: Per-city min/max/avg/count (kept alongside the averages)."""
+        return self._accumulator(pollutant, "averages").city_statistics()
+
+    def unhealthy_days(self, pollutant):
+        """Purpose: Per-city unhealthy day counts, same shape as count_unhealthy_pm25_days."""
+        return dict(self._accumulator(pollutant, "unhealthy").unhealthy)
+
+    def distribution(self, pollutant):
+        """Purpose: Category counts, same shape as get_pm25_distribution."""
+        return dict(self._accumulator(pollutant, "distribution").distribution)
+
+    def quantiles(self, pollutant, fractions=(0.5, 0.98)):
+        """Purpose: Approximate overall quantiles, like {0.5: 14.2, 0.98: 41.0}."""
+        return self._accumulator(pollutant, "quantiles").quantiles(list(fractions))
+
+    def city_quantiles(self, pollutant, fractions=(0.5, 0.98)):
+        """Purpose: Approximate per-city quantiles, like {"LA": {0.5: 14.2, 0.98: 41.0}}."""
+        return self._accumulator(pollutant, "quantiles").city_quantiles(list(fractions))
+
+    def distinct(self, pollutant):
+        """Purpose: Approximate distinct cities, dates and dates per city with a reading."""
+        return self._accumulator(pollutant, "distinct").distinct()
+
+
+class AggregationEngine:
+    """Collects metric names, then computes all of them in one scan."""
+    def __init__(self, metrics=(), backend=None):
+        """Purpose: Create an engine, optionally registering metrics right away.
+        Inputs: iterable of metric names like "pm25_averages" or "ozone_distribution";
+        backend str or None (None uses the module default set by set_backend).
+        Output: None.
+        Example: AggregationEngine(["pm25_statistics", "ozone_statistics"], backend="auto")
+        """
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError("unknown backend: " + str(backend))
+        self.backend = backend
+        self.metrics = set()
+        for metric in metrics:
+            self.register(metric)
+
+    def register(self, metric):
+        """Purpose: Ask the engine to compute one more metric.
+        Input: str "<pollutant>_<kind>", kind one of statistics, averages, unhealthy, distribution,
+        quantiles, distinct.
+        Output: the engine (so calls can be chained).
+        Example: engine.register("pm25_unhealthy").register("ozone_unhealthy")
+        """
+        pollutant, _, kind = metric.rpartition("_")
+        if pollutant not in BREAKPOINTS or kind not in METRIC_KINDS:
+            raise ValueError("unknown metric: " + metric)
+        self.metrics.add(metric)
+        return self
+
+    def accumulators(self):
+        """Purpose: Build empty accumulators for the registered metrics.
+        Output: dict pollutant -> PollutantAccumulator.
+        """
+        accumulators = {}
+        for pollutant in BREAKPOINTS:
+            kinds = set()
+            for kind in METRIC_KINDS:
+                if pollutant + "_" + kind in self.metrics:
+                    kinds.add(kind)
+            if kinds:
+                accumulators[pollutant] = PollutantAccumulator(
+                    pollutant,
+                    track_cities="averages" in kinds,
+                    track_unhealthy="unhealthy" in kinds,
+                    track_distribution="distribution" in kinds,
+                    track_quantiles="quantiles" in kinds,
+                    track_distinct="distinct" in kinds,
+                    track_sums="statistics" in kinds or "averages" in kinds,
+                )
+        return accumulators
+
+    def uses_numpy(self, records):
+        """Purpose: Decide whether this run goes through the NumPy backend.
+        Input: the records about to be scanned.
+        Output: bool (always False when NumPy is not installed).
+        """
+        backend = self.backend or default_backend
+        if not numpy_backend.HAVE_NUMPY or backend == "python":
+            return False
+        return backend == "numpy" or isinstance(records, AirQualityTable)
+
+    def run(self, records):
+        """Purpose: Scan the records once and fill every registered metric.
+        Input: iterable of AirQuality (list, AirQualityTable or stream), or a sqlite_store.SQLiteStore
+        (answered with GROUP BY queries when every metric allows it).
+        Output: AggregateResult.
+        Example: AggregationEngine(["pm25_statistics"]).run(records).statistics("pm25")
+        """
+        accumulators = self.accumulators()
+        stored = records.pollutants() if isinstance(records, SQLiteStore) else ()
+        if stored and all(metric.rpartition("_")[2] in PUSHED_DOWN and metric.rpartition("_")[0] in stored
+                          for metric in self.metrics):
+            records.fill_accumulators(accumulators)
+            result = AggregateResult(accumulators, set(self.metrics))
+            result.row_count = len(records)
+            return result
+        if self.uses_numpy(records):
+            if not isinstance(records, AirQualityTable):
+                records = AirQualityTable.from_records(records)
+            numpy_backend.fill_accumulators(accumulators, records)
+            result = AggregateResult(accumulators, set(self.metrics))
+            result.row_count = len(records)
+            return result
+        result = AggregateResult(accumulators, set(self.metrics))
+        self.feed(result, records)
+        return result
+
+    def _feed_table(self, result, table, pollutants=None):
+        """Fold a table column by column, keyed by its integer city codes (see fold_column). Pollutants
+        the table has no column for are left as they are, like missing readings."""
+        for pollutant, accumulator in result.accumulators.items():
+            if (pollutants is None or pollutant in pollutants) and table.has_column(pollutant):
+                fold_column(accumulator, table, pollutant + "_statistics" in self.metrics)
+        result.row_count += len(table)
+        return len(table)
+
+    def feed(self, result, records, pollutants=None):
+        """Purpose: Keep scanning into an existing result, as if the new records came right after the old ones.
+        Inputs: AggregateResult from this engine (or a saved state), iterable of AirQuality,
+        optional list of pollutants to update (default: all of them).
+        Output: int (number of records added).
+        Example: engine.feed(result, new_day_records) -> 50
+        Notes: AirQualityTable input (including iter_air_quality batches) is folded by integer city code.
+        """
+        if isinstance(records, AirQualityTable):
+            return self._feed_table(result, records, pollutants)
+        active = []
+        for pollutant in result.accumulators:
+            if pollutants is None or pollutant in pollutants:
+                active.append((pollutant, result.accumulators[pollutant]))
+        rows = 0
+        for record in records:
+            rows += 1
+            city = record.city
+            for pollutant, accumulator in active:
+                value = record.value(pollutant)
+                if value is not None:
+                    accumulator.add(city, value, record.date)
+        result.row_count += rows
+        return rows
+
+
+"""
+Purpose: Fold one pollutant column of a table into an accumulator, as if its rows were added one by one.
+Per-city totals live in flat lists indexed by the table's city codes while scanning, so no city name
+is hashed per row; names are looked up once per city when the totals are written back.
+Input type: PollutantAccumulator, AirQualityTable, with_statistics (bool: also fold the overall totals
+when nothing else needs a scan)
+Output type: None (the accumulator is updated in place)
+Notes: Totals continue from what the accumulator already holds. Sums are exact (each distinct value is
+converted once, see PollutantAccumulator.units) and only kept when the accumulator tracks them, so they
+match a record loop bit for bit; new cities and unhealthy counts keep first-seen order.
+"""
+def fold_column(accumulator, table, with_statistics=True):
+    values = table.column(accumulator.pollutant)
+    if accumulator.track_distribution:
+        for label, count in accumulator.breakpoints.count_categories(values).items():
+            accumulator.distribution[label] = accumulator.distribution.get(label, 0) + count
+    track_cities = accumulator.track_cities
+    track_unhealthy = accumulator.track_unhealthy
+    track_quantiles = accumulator.track_quantiles
+    if not (track_cities or track_unhealthy or track_quantiles or accumulator.track_distinct):
+        if with_statistics:
+            _fold_statistics(accumulator, values)
+        return
+    names = table.city_names
+    size = len(names)
+    # This call's exact sums per city code; added to the existing totals when written back
+    sums = [0] * size
+    counts = [0] * size
+    lows = [None] * size
+    highs = [None] * size
+    bad = [0] * size
+    for code, name in enumerate(names):
+        slot = accumulator.cities.get(name)
+        if slot is not None:
+            counts[code], lows[code], highs[code] = slot[1:]
+        bad[code] = accumulator.unhealthy.get(name, 0)
+    # Codes in the order their first reading (or first unhealthy reading) arrives
+    new_cities = []
+    new_unhealthy = []
+    city_values = [[] for _ in range(size)] if track_quantiles else None
+    global_values = [] if track_quantiles else None
+    count = accumulator.count
+    low = accumulator.low
+    high = accumulator.high
+    unhealthy_at = accumulator.unhealthy_at
+    as_value = int if accumulator.integer else float
+    track_sums = accumulator.track_sums
+    exact_values = accumulator.exact_values
+    units_of = accumulator.units
+    for code, value in zip(table.city_ids, values):
+        if value != value:
+            continue
+        value = as_value(value)
+        if track_sums:
+            units = exact_values.get(value)
+            if units is None:
+                units = units_of(value)
+            sums[code] += units
+        count += 1
+        if low is None or value < low:
+            low = value
+        if high is None or value > high:
+            high = value
+        if track_cities:
+            if counts[code] == 0:
+                new_cities.append(code)
+                lows[code] = highs[code] = value
+            counts[code] += 1
+            if value < lows[code]:
+                lows[code] = value
+            if value > highs[code]:
+                highs[code] = value
+        if track_unhealthy and value >= unhealthy_at:
+            if bad[code] == 0:
+                new_unhealthy.append(code)
+            bad[code] += 1
+        if track_quantiles:
+            global_values.append(value)
+            city_values[code].append(value)
+    accumulator.count = count
+    accumulator.total += sum(sums)
+    accumulator.low = low
+    accumulator.high = high
+    if track_cities:
+        # Existing cities keep their place in the dict; new ones are added in first-seen order
+        for code, name in enumerate(names):
+            slot = accumulator.cities.get(name)
+            if slot is not None:
+                accumulator.cities[name] = [slot[0] + sums[code], counts[code], lows[code], highs[code]]
+        for code in new_cities:
+            accumulator.cities[names[code]] = [sums[code], counts[code], lows[code], highs[code]]
+    if track_unhealthy:
+        for code, name in enumerate(names):
+            if name in accumulator.unhealthy:
+                accumulator.unhealthy[name] = bad[code]
+        for code in new_unhealthy:
+            accumulator.unhealthy[names[code]] = bad[code]
+    if track_quantiles:
+        accumulator.sketch.extend(global_values)
+        for code in _first_seen(table.city_ids, values, size):
+            sketch = accumulator.city_sketches.get(names[code])
+            if sketch is None:
+                sketch = accumulator.city_sketches[names[code]] = KLLSketch()
+            sketch.extend(city_values[code])
+    if accumulator.track_distinct:
+        seen = set()
+        date_names = table.date_names
+        for code, date_code, value in zip(table.city_ids, table.date_ids, values):
+            if value == value and (code, date_code) not in seen:
+                seen.add((code, date_code))
+                accumulator.add_distinct(names[code], date_names[date_code])
+
+
+def _fold_statistics(accumulator, values):
+    """Fold only the overall count, exact sum, min and max, visiting each distinct value once."""
+    as_value = int if accumulator.integer else float
+    for value, repeat in Counter(values).items():
+        if value != value:
+            continue
+        value = as_value(value)
+        accumulator.count += repeat
+        accumulator.total += repeat * accumulator.units(value)
+        if accumulator.low is None or value < accumulator.low:
+            accumulator.low = value
+        if accumulator.high is None or value > accumulator.high:
+            accumulator.high = value
+
+
+def _first_seen(codes, values, size):
+    """Return the city codes that have a reading, in the order of their first reading."""
+    order = []
+    seen = [False] * size
+    for code, value in zip(codes, values):
+        if value == value and not seen[code]:
+            seen[code] = True
+            order.append(code)
+    return order
@@ -0,0 +1,135 @@
+"""AQI Engine
+Purpose: Compute the EPA Air Quality Index from PM2.5 and 8-hour ozone concentrations.
+Each pollutant's sub-index is the EPA piecewise-linear interpolation inside its breakpoint band,
+I = (I_hi - I_lo) / (C_hi - C_lo) * (C - C_lo) + I_lo, rounded to the nearest whole number, after
+truncating the concentration to instrument resolution (0.1 ug/m3, 0.001 ppm). A day's AQI is the
+larger of the two sub-indexes.
+The scalar functions are memoized because readings repeat heavily at that resolution; fill_aqi
+fills a whole table at once, with NumPy when it is installed.
+Example: pm25_aqi(35.9) -> 102; ozone_aqi(0.078) -> 126; combined_aqi(35.9, 0.078) -> 126
+Notes: PM2.5 above 500.4 is reported as 500. 8-hour ozone above 0.200 ppm has no 8-hour AQI
+(EPA uses 1-hour ozone there), so its sub-index is None.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+import math
+
+import numpy_backend
+
+"""
+Breakpoint bands as (C_lo, C_hi, I_lo, I_hi), matching the category limits in categories.py.
+"""
+PM25_BANDS = (
+    (0.0, 12.0, 0, 50),
+    (12.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 150.4, 151, 200),
+    (150.5, 250.4, 201, 300),
+    (250.5, 350.4, 301, 400),
+    (350.5, 500.4, 401, 500),
+)
+OZONE_BANDS = (
+    (0.000, 0.054, 0, 50),
+    (0.055, 0.070, 51, 100),
+    (0.071, 0.085, 101, 150),
+    (0.086, 0.105, 151, 200),
+    (0.106, 0.200, 201, 300),
+)
+PM25_HIGHS = tuple(band[1] for band in PM25_BANDS)
+OZONE_HIGHS = tuple(band[1] for band in OZONE_BANDS)
+PM25_DIGITS = 1
+OZONE_DIGITS = 3
+MEMO_SIZE = 1 << 16
+
+
+def _truncate(value, digits):
+    """Cut a concentration down to `digits` decimals (a tiny nudge keeps 12.3 from becoming 12.2)."""
+    scale = 10 ** digits
+    return math.floor(value * scale + 1e-6) / scale
+
+
+def _sub_index(value, digits, bands, highs, cap):
+    if value is None or value != value:
+        return None
+    concentration = _truncate(max(value, 0.0), digits)
+    position = bisect_left(highs, concentration)
+    if position == len(bands):
+        return cap
+    low, high, index_low, index_high = bands[position]
+    return int((index_high - index_low) / (high - low) * (concentration - low) + index_low + 0.5)
+
+
+"""
+Purpose: Return the PM2.5 sub-index for a 24-hour average concentration (memoized).
+Input type: float (ug/m3) or None
+Output type: int or None
+Example: pm25_aqi(12.0) -> 50; pm25_aqi(None) -> None
+"""
+@lru_cache(maxsize=MEMO_SIZE)
+def pm25_aqi(value):
+    return _sub_index(value, PM25_DIGITS, PM25_BANDS, PM25_HIGHS, 500)
+
+
+"""
+Purpose: Return the ozone sub-index for an 8-hour concentration (memoized).
+Input type: float (ppm) or None
+Output type: int or None (None above 0.200 ppm, where the 8-hour AQI is not defined)
+Example: ozone_aqi(0.054) -> 50
+"""
+@lru_cache(maxsize=MEMO_SIZE)
+def ozone_aqi(value):
+    return _sub_index(value, OZONE_DIGITS, OZONE_BANDS, OZONE_HIGHS, None)
+
+
+"""
+Purpose: Return the day's AQI: the larger of the PM2.5 and ozone sub-indexes.
+Input type: pm25 float/None, ozone float/None
+Output type: int or None (None when neither sub-index is available)
+Example: combined_aqi(8.0, 0.090) -> 161
+"""
+def combined_aqi(pm25, ozone):
+    pm_index = pm25_aqi(pm25)
+    ozone_index = ozone_aqi(ozone)
+    if pm_index is None:
+        return ozone_index
+    if ozone_index is None:
+        return pm_index
+    return max(pm_index, ozone_index)
+
+
+def _numpy_sub_index(values, digits, bands, cap):
+    np = numpy_backend.np
+    scale = 10 ** digits
+    concentration = np.floor(np.maximum(values, 0.0) * scale + 1e-6) / scale
+    # One extra NaN band catches values above the table (and NaN input) without an out-of-range index
+    low, high, index_low, index_high = (np.array(list(column) + [np.nan], dtype=np.float64) for column in zip(*bands))
+    position = np.searchsorted(high[:-1], concentration, side="left")
+    low, high, index_low, index_high = low[position], high[position], index_low[position], index_high[position]
+    # Same operation order as _sub_index, so both paths round identically
+    result = np.floor((index_high - index_low) / (high - low) * (concentration - low) + index_low + 0.5)
+    above = position == len(bands)
+    result[above] = np.nan if cap is None else cap
+    result[np.isnan(values)] = np.nan
+    return result
+
+
+"""
+Purpose: Fill a table's AQI column from its PM2.5 and ozone columns, in place.
+Input type: data.AirQualityTable
+Output type: None
+Notes: Uses NumPy when installed (one vectorized pass per pollutant); otherwise the memoized scalar
+functions, which see each distinct reading only once. Both give the same numbers.
+"""
+def fill_aqi(table):
+    if numpy_backend.HAVE_NUMPY:
+        np = numpy_backend.np
+        pm_index = _numpy_sub_index(numpy_backend.column(table, "pm25"), PM25_DIGITS, PM25_BANDS, 500)
+        ozone_index = _numpy_sub_index(numpy_backend.column(table, "ozone"), OZONE_DIGITS, OZONE_BANDS, None)
+        # fmax ignores NaN, so a missing sub-index leaves the other one
+        numpy_backend.column(table, "aqi")[:] = np.fmax(pm_index, ozone_index)
+        return
+    aqi_values = table.aqi_values
+    nan = math.nan
+    for row, (pm25, ozone) in enumerate(zip(table.pm25_values, table.ozone_values)):
+        value = combined_aqi(None if pm25 != pm25 else pm25, None if ozone != ozone else ozone)
+        aqi_values[row] = nan if value is None else value
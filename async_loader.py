@@ -0,0 +1,86 @@
+"""Async Multi-File Loader
+Purpose: Read many CSV files at once (for example from slow network storage) and aggregate them
+while they are still being read. Each file is read and parsed in batches on a worker thread
+(asyncio.to_thread), up to `concurrency` files at a time. Batches go through a bounded queue of
+`prefetch` batches to one consumer that folds them into that file's running totals, so waiting on
+I/O overlaps with parsing and aggregating, and memory stays bounded.
+The per-file totals are merged in the order the paths were given. Malformed rows are skipped like
+parse_csv does; they are counted per file and written to the quarantine file in path order once every
+file has been read.
+Example: result = asyncio.run(aggregate_files(["a.csv", "b.csv"], ["pm25_averages"]))
+Notes: Sums are exact (see exact_sum.py), so merging per-file totals gives the same answers, to the last
+digit, as one serial scan over the files in order.
+"""
+import asyncio
+
+from aggregation import AggregationEngine
+from file_handling import iter_air_quality, write_quarantine, ParseReport
+
+"""
+Purpose: Read and aggregate several CSV files concurrently.
+Input type: paths (list[str]), metrics (list[str]), prefetch (int batches held in the queue),
+chunk_size (int rows per batch), concurrency (int files read at once),
+batch_source (function(path, chunk_size) -> iterator of record batches; defaults to iter_air_quality),
+report (file_handling.ParseReport or None: receives the row and reject counts),
+quarantine (str path or None: CSV that collects the rejected rows)
+Output type: aggregation.AggregateResult
+Example: asyncio.run(aggregate_files(paths, ["ozone_unhealthy"], prefetch=8)).unhealthy_days("ozone")
+"""
+async def aggregate_files(paths, metrics, prefetch=4, chunk_size=50000, concurrency=4, batch_source=None,
+                          report=None, quarantine=None):
+    # Each file has its own report and reject list, since files are parsed on different threads
+    reports = [ParseReport() for _ in paths]
+    rejects = [[] for _ in paths]
+    engine = AggregationEngine(metrics, backend="python")
+    results = [engine.run([]) for _ in paths]
+    queue = asyncio.Queue(maxsize=max(prefetch, 1))
+    limit = asyncio.Semaphore(max(concurrency, 1))
+
+    def open_batches(position, path):
+        if batch_source is None:
+            return iter_air_quality(path, chunk_size, reports[position], rejects[position])
+        return batch_source(path, chunk_size)
+
+    async def produce(position, path):
+        async with limit:
+            batches = open_batches(position, path)
+            while True:
+                # Reading and parsing a batch blocks, so it runs on a thread
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    return
+                await queue.put((position, batch))
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            position, batch = item
+            engine.feed(results[position], batch)
+
+    consumer = asyncio.create_task(consume())
+    try:
+        await asyncio.gather(*(produce(position, path) for position, path in enumerate(paths)))
+    finally:
+        if not consumer.done():
+            await queue.put(None)
+        await consumer
+    merged = engine.run([])
+    for path, result, file_report, file_rejects in zip(paths, results, reports, rejects):
+        merged.merge(result)
+        if report is not None:
+            report.merge(file_report)
+        if file_rejects and quarantine is not None:
+            write_quarantine(quarantine, path, file_rejects)
+    return merged
+
+
+"""
+Purpose: Blocking wrapper around aggregate_files for scripts.
+Input type: same as aggregate_files
+Output type: aggregation.AggregateResult
+"""
+def load_files(paths, metrics, prefetch=4, chunk_size=50000, concurrency=4, report=None, quarantine=None):
+    return asyncio.run(aggregate_files(paths, metrics, prefetch, chunk_size, concurrency,
+                                       report=report, quarantine=quarantine))
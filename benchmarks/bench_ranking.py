@@ -0,0 +1,50 @@
+"""Ranking Benchmark
+Purpose: Show how ranking scales from 10^2 to 10^6 keys: the old exchange sort (only run up to 10^4,
+it is quadratic), a full stable sort (rank_all) and heap top-3 (top_k).
+Run: python -m benchmarks.bench_ranking [max_exponent]
+Output: one line per size with seconds for each method.
+"""
+import random
+import sys
+import time
+
+from ranking import top_k, rank_all
+
+"""
+Purpose: The exchange sort main.py used before ranking.py, kept here as the reference to beat.
+Input type: dict[str, float]
+Output type: list[tuple]
+"""
+def exchange_sort_top3(mapping):
+    items = list(mapping.items())
+    for i in range(len(items)):
+        for j in range(i + 1, len(items)):
+            if items[i][1] < items[j][1]:
+                items[i], items[j] = items[j], items[i]
+    return items[:3]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main(max_exponent=6):
+    generator = random.Random(42)
+    print("keys        exchange     rank_all     top_k(3)")
+    for exponent in range(2, max_exponent + 1):
+        size = 10 ** exponent
+        mapping = {"site" + str(i): generator.random() for i in range(size)}
+        exchange = "-"
+        if exponent <= 4:
+            seconds, expected = timed(exchange_sort_top3, mapping)
+            exchange = "%.4f" % seconds
+        full_seconds, full = timed(rank_all, mapping)
+        heap_seconds, best = timed(top_k, mapping, 3)
+        assert best == full[:3]
+        print("%-11d %-12s %-12.4f %.4f" % (size, exchange, full_seconds, heap_seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
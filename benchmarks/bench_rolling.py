@@ -0,0 +1,81 @@
+"""Rolling Window Benchmark
+Purpose: Compare rolling.rolling (running sums and monotonic deques, O(n)) with recomputing every
+window from scratch (O(n*w)) on synthetic data, for growing window lengths.
+Run: python -m benchmarks.bench_rolling [cities] [days]
+Output: one line per window length with seconds for each method (results are checked to match).
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_synthetic_csv
+from file_handling import ozone_pm25_air_quality
+from rolling import rolling
+from time_index import TimeIndex
+
+WINDOWS = (1, 8, 30, 90, 365)
+
+"""
+Purpose: Rebuild each window by walking back from the current row; the reference to beat.
+Input type: TimeIndex, pollutant (str), days (int)
+Output type: list of (city, date, statistics dict or None), same order as rolling
+"""
+def naive_rolling(index, pollutant, days):
+    results = []
+    for city in index.cities:
+        rows = index.query(city)
+        ordinals = index.cities[city].dates
+        for position, record in enumerate(rows):
+            window = []
+            earlier = position
+            while earlier >= 0 and ordinals[earlier] > ordinals[position] - days:
+                value = getattr(rows[earlier], pollutant)
+                if value is not None:
+                    window.append(value)
+                earlier -= 1
+            stats = None
+            if window:
+                window.reverse()
+                stats = {"min": min(window), "max": max(window), "avg": sum(window) / len(window), "count": len(window)}
+            results.append((city, record.date, stats))
+    return results
+
+
+def same(fast, slow):
+    if len(fast) != len(slow):
+        return False
+    for (city, date, stats), (other_city, other_date, other_stats) in zip(fast, slow):
+        if (city, date) != (other_city, other_date) or (stats is None) != (other_stats is None):
+            return False
+        if stats is not None and (stats["min"], stats["max"], stats["count"]) != (
+                other_stats["min"], other_stats["max"], other_stats["count"]):
+            return False
+        if stats is not None and abs(stats["avg"] - other_stats["avg"]) > 1e-9 * max(1.0, abs(stats["avg"])):
+            return False
+    return True
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main(cities=20, days=1000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rolling.csv")
+        rows = write_synthetic_csv(path, cities, days)
+        index = TimeIndex(ozone_pm25_air_quality(path))
+    print("rows: " + str(rows))
+    print("window(days)  naive        sliding")
+    for window in WINDOWS:
+        slow_seconds, slow = timed(naive_rolling, index, "pm25", window)
+        fast_seconds, fast = timed(lambda: list(rolling(index, "pm25", window)))
+        assert same(fast, slow)
+        print("%-13d %-12.4f %.4f" % (window, slow_seconds, fast_seconds))
+
+
+if __name__ == "__main__":
+    arguments = [int(value) for value in sys.argv[1:3]]
+    main(*arguments)
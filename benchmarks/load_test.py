@@ -0,0 +1,101 @@
+"""Report Server Load Test
+Purpose: Measure requests/second and latency percentiles of the warm report server (server.py) with
+concurrent clients, next to the cold-start path (one `python main.py` process per report).
+Run: python -m benchmarks.load_test [csv path] --clients 8 --requests 200 --cold-runs 5
+     (without a csv path a synthetic 50-city, 365-day file is generated)
+Output: one line per path with requests/sec, p50 and p99 latency in milliseconds.
+Notes: Everything runs on this machine; the server binds to 127.0.0.1 on a free port.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import urlopen
+
+from benchmarks.synthetic import write_synthetic_csv
+from server import ReportServer
+
+ENDPOINTS = ("/report", "/summary?k=5", "/health")
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def describe(name, latencies, seconds):
+    print("%-12s %8.1f req/s   p50 %8.2f ms   p99 %8.2f ms   (%d requests)" % (
+        name, len(latencies) / seconds, percentile(latencies, 0.50) * 1000,
+        percentile(latencies, 0.99) * 1000, len(latencies)))
+
+
+"""
+Purpose: Hit a running server from several client threads and collect each request's latency.
+Input type: base URL (str), clients (int), requests per client (int)
+Output type: (list of latencies in seconds, wall-clock seconds)
+"""
+def run_clients(base_url, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(number):
+        mine = []
+        for request in range(requests):
+            start = time.perf_counter()
+            with urlopen(base_url + ENDPOINTS[(number + request) % len(ENDPOINTS)]) as response:
+                response.read()
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def run_cold(path, runs):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(runs):
+        began = time.perf_counter()
+        subprocess.run([sys.executable, MAIN_PATH, path], check=True, stdout=subprocess.DEVNULL)
+        latencies.append(time.perf_counter() - began)
+    return latencies, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load-test the report server against cold starts.")
+    parser.add_argument("csv_path", nargs="?", default=None)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--cold-runs", type=int, default=5)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.csv_path
+        if path is None:
+            path = os.path.join(directory, "load_test.csv")
+            write_synthetic_csv(path, 50, 365)
+        server = ReportServer([path], port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            host, port = server.server_address[:2]
+            latencies, seconds = run_clients("http://" + host + ":" + str(port), args.clients, args.requests)
+        finally:
+            server.shutdown()
+            server.server_close()
+        describe("warm server", latencies, seconds)
+        latencies, seconds = run_cold(path, args.cold_runs)
+        describe("cold start", latencies, seconds)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
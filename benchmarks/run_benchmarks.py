@@ -0,0 +1,156 @@
+"""Benchmark Suite
+Purpose: Time the loader, every analysis function, combined_dictionary, city_series and main.main end to end on
+synthetic data from 10^3 rows up to --max-rows, reporting rows/second and peak traced memory, and
+flag regressions against a stored baseline JSON.
+Run: python -m benchmarks.run_benchmarks --max-rows 1000000 --save-baseline benchmarks/baseline.json
+     python -m benchmarks.run_benchmarks --max-rows 1000000 --baseline benchmarks/baseline.json
+Notes: Each benchmark runs once untraced for timing and once under tracemalloc for peak memory.
+A benchmark counts as a regression when it is more than --tolerance slower than the baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import write_synthetic_csv
+from dictionary import combined_dictionary, city_series
+from file_handling import ozone_pm25_air_quality
+import main as report
+import ozone_functions
+import pm25_functions
+
+
+def _loader_benchmarks(path):
+    return [
+        ("load_csv", lambda: ozone_pm25_air_quality(path)),
+        ("load_mmap", lambda: ozone_pm25_air_quality(path, engine="mmap")),
+    ]
+
+
+def _analysis_benchmarks(records):
+    pm25_averages = pm25_functions.calculate_pm25_city_averages(records)
+    ozone_averages = ozone_functions.ozone_averages(records)
+    pm25_values = [r.pm25 for r in records if r.pm25 is not None]
+    ozone_values = [r.ozone for r in records if r.ozone is not None]
+    return [
+        ("calculate_pm25_city_averages", lambda: pm25_functions.calculate_pm25_city_averages(records)),
+        ("count_unhealthy_pm25_days", lambda: pm25_functions.count_unhealthy_pm25_days(records)),
+        ("rank_cities_by_pm25", lambda: pm25_functions.rank_cities_by_pm25(pm25_averages)),
+        ("get_pm25_category", lambda: [pm25_functions.get_pm25_category(v) for v in pm25_values]),
+        ("get_pm25_statistics", lambda: pm25_functions.get_pm25_statistics(records)),
+        ("get_pm25_distribution", lambda: pm25_functions.get_pm25_distribution(records)),
+        ("ozone_averages", lambda: ozone_functions.ozone_averages(records)),
+        ("unhealthy_ozone_days", lambda: ozone_functions.unhealthy_ozone_days(records)),
+        ("city_ranks_by_ozone", lambda: ozone_functions.city_ranks_by_ozone(ozone_averages)),
+        ("ozone_category", lambda: [ozone_functions.ozone_category(v) for v in ozone_values]),
+        ("ozone_statistics", lambda: ozone_functions.ozone_statistics(records)),
+        ("ozone_distribution", lambda: ozone_functions.ozone_distribution(records)),
+        ("combined_dictionary", lambda: combined_dictionary(records)),
+        ("city_series", lambda: city_series(records)),
+    ]
+
+
+"""
+Purpose: Run one benchmark function: seconds (untraced) and peak traced memory in bytes.
+Input type: function with no arguments
+Output type: tuple (seconds float, peak_bytes int)
+"""
+def measure(function):
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+"""
+Purpose: Run every benchmark at every size.
+Input type: sizes (list[int] row counts), cities (int), missing_rate (float), workdir (str)
+Output type: dict name -> dict rows -> {"seconds", "rows_per_second", "peak_bytes"}
+"""
+def run_suite(sizes, cities, missing_rate, workdir):
+    results = {}
+    for rows in sizes:
+        city_count = min(cities, rows)
+        path = os.path.join(workdir, "bench_" + str(rows) + ".csv")
+        actual_rows = write_synthetic_csv(path, city_count, max(rows // city_count, 1), missing_rate)
+        records = ozone_pm25_air_quality(path)
+        benchmarks = _loader_benchmarks(path) + _analysis_benchmarks(records)
+        benchmarks.append(("main_end_to_end", lambda: _quiet_main(path)))
+        for name, function in benchmarks:
+            seconds, peak = measure(function)
+            results.setdefault(name, {})[str(rows)] = {
+                "seconds": seconds,
+                "rows_per_second": actual_rows / seconds if seconds > 0 else None,
+                "peak_bytes": peak,
+            }
+            print("%-30s %10d rows %9.4f s %12s rows/s %10.1f MiB" % (
+                name, actual_rows, seconds,
+                "%.0f" % (actual_rows / seconds) if seconds > 0 else "-", peak / 2 ** 20))
+        os.remove(path)
+    return results
+
+
+def _quiet_main(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        report.main(path, cache=False)
+
+
+"""
+Purpose: Compare results with a baseline and list the benchmarks that got slower than allowed.
+Input type: results (dict from run_suite), baseline (same shape), tolerance (float, 0.2 = 20% slower allowed)
+Output type: list[str] messages
+"""
+def find_regressions(results, baseline, tolerance):
+    messages = []
+    for name in results:
+        for rows in results[name]:
+            before = baseline.get(name, {}).get(rows)
+            if before is None:
+                continue
+            now = results[name][rows]["seconds"]
+            if now > before["seconds"] * (1 + tolerance):
+                messages.append("%s at %s rows: %.4f s vs baseline %.4f s" % (name, rows, now, before["seconds"]))
+    return messages
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the air quality loader and analysis functions.")
+    parser.add_argument("--max-rows", type=int, default=100000, help="largest size (powers of ten from 10^3)")
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--missing", type=float, default=0.05)
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write these results as the new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    sizes = []
+    rows = 1000
+    while rows <= args.max_rows:
+        sizes.append(rows)
+        rows *= 10
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(sizes, args.cities, args.missing, workdir)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = find_regressions(results, json.load(handle), args.tolerance)
+        for message in regressions:
+            print("REGRESSION: " + message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
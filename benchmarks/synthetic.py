@@ -0,0 +1,57 @@
+"""Synthetic Dataset Generator
+Purpose: Write deterministic CSV files in the layout ozone_pm25_air_quality expects (date in column 0,
+PM2.5 in column 4, city in column 7, ozone in column 24, plus filler columns) for benchmarks.
+Run: python -m benchmarks.synthetic out.csv --cities 50 --days 365 --missing 0.05
+"""
+import argparse
+import datetime
+import random
+
+COLUMN_COUNT = 26
+
+"""
+Purpose: Write a synthetic air quality CSV; the same arguments always produce the same file.
+Input type: path (str), cities (int), days (int), missing_rate (float 0..1), seed (int)
+Output type: int (number of data rows written, cities * days)
+Example: write_synthetic_csv("bench.csv", 10, 100) -> 1000
+"""
+def write_synthetic_csv(path, cities, days, missing_rate=0.05, seed=101):
+    generator = random.Random(seed)
+    first_day = datetime.date(2020, 1, 1)
+    header = ["Date", "Source", "Site ID", "POC", "Daily Mean PM2.5 Concentration", "Units",
+              "Daily AQI Value", "Local Site Name"]
+    header += ["Column " + str(i) for i in range(len(header), COLUMN_COUNT)]
+    header[24] = "Daily Max 8-hour Ozone Concentration"
+    # Each city gets its own typical level so rankings are stable
+    city_levels = [(generator.uniform(4, 30), generator.uniform(0.025, 0.06)) for _ in range(cities)]
+    with open(path, "w") as handle:
+        handle.write(",".join(header) + "\n")
+        for day in range(days):
+            date = (first_day + datetime.timedelta(days=day)).strftime("%m/%d/%Y")
+            for city in range(cities):
+                pm_level, ozone_level = city_levels[city]
+                parts = [""] * COLUMN_COUNT
+                parts[0] = date
+                parts[1] = "AQS"
+                parts[2] = str(60000000 + city)
+                parts[3] = "1"
+                parts[5] = "ug/m3 LC"
+                parts[7] = "Site " + str(city)
+                if generator.random() >= missing_rate:
+                    parts[4] = "%.1f" % (pm_level * generator.lognormvariate(0, 0.6))
+                if generator.random() >= missing_rate:
+                    parts[24] = "%.3f" % (ozone_level * generator.lognormvariate(0, 0.35))
+                handle.write(",".join(parts) + "\n")
+    return cities * days
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic air quality CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--missing", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=101)
+    args = parser.parse_args()
+    rows = write_synthetic_csv(args.path, args.cities, args.days, args.missing, args.seed)
+    print("wrote " + str(rows) + " rows to " + args.path)
@@ -0,0 +1,138 @@
+"""Category Breakpoints
+Purpose: The one place that defines each pollutant's health categories and unhealthy threshold.
+AirQuality, pm25_functions, ozone_functions, the aggregation engine and the NumPy backend all read
+these tables, so the thresholds cannot drift between copies.
+A value belongs to the first category whose upper limit it does not exceed (value <= limit), found
+by binary search; values above every limit fall in the last category. Missing values are "No Data".
+Bulk helpers categorize each distinct value only once, since readings repeat heavily at instrument
+resolution (0.1 ug/m3, 0.001 ppm).
+Pollutants beyond PM2.5 and ozone (NO2, CO, PM10, or any registered with register_pollutant) are
+aggregated by the same engine, keyed by the names in BREAKPOINTS (see schema.py for the CSV columns).
+Example: PM25.label(25.0) -> "Moderate"; OZONE.count_categories([0.04, 0.09]) -> {"Good": 1, "Unhealthy": 1}
+"""
+from bisect import bisect_left
+from collections import Counter
+
+NO_DATA = "No Data"
+
+
+class Breakpoints:
+    """Upper category limits and labels for one pollutant."""
+    def __init__(self, limits, labels, unhealthy_at, integer=False):
+        """Purpose: Store one breakpoint table.
+        Inputs: limits (ascending upper limits), labels (one more than limits), unhealthy_at (value at
+        which a day counts as unhealthy), integer (True when values are whole numbers, like AQI).
+        Output: None.
+        Example: Breakpoints((50, 100), ("Good", "Moderate", "High"), 101, integer=True)
+        """
+        if len(labels) != len(limits) + 1:
+            raise ValueError("need exactly one more label than limits")
+        self.limits = tuple(limits)
+        self.labels = tuple(labels)
+        self.unhealthy_at = unhealthy_at
+        self.integer = integer
+
+    def index(self, value):
+        """Purpose: Return the category number of a (non-missing) value.
+        Example: PM25.index(12.0) -> 0; PM25.index(12.1) -> 1
+        """
+        return bisect_left(self.limits, value)
+
+    def label(self, value):
+        """Purpose: Return the category name of a value ("No Data" for None or NaN).
+        Example: OZONE.label(0.060) -> "Moderate"
+        """
+        if value is None or value != value:
+            return NO_DATA
+        return self.labels[bisect_left(self.limits, value)]
+
+    def is_unhealthy(self, value):
+        """Purpose: Tell if a value is at or above the unhealthy threshold (None is never unhealthy)."""
+        return value is not None and value >= self.unhealthy_at
+
+    def categorize_many(self, values):
+        """Purpose: Return the category name of every value, working out each distinct value once.
+        Input: iterable of float/None (a list or an array('d') column with NaN for missing).
+        Output: list[str].
+        Example: PM25.categorize_many([8.0, None, 8.0]) -> ["Good", "No Data", "Good"]
+        """
+        seen = {}
+        labels = self.labels
+        limits = self.limits
+        result = []
+        for value in values:
+            name = seen.get(value)
+            if name is None:
+                if value is None or value != value:
+                    name = NO_DATA
+                else:
+                    name = labels[bisect_left(limits, value)]
+                    seen[value] = name
+            result.append(name)
+        return result
+
+    def count_categories(self, values):
+        """Purpose: Count values per category (missing values are skipped).
+        Input: iterable of float/None.
+        Output: dict label -> count, in order of each label's first appearance (like get_pm25_distribution).
+        Example: PM25.count_categories([8.0, 25.0, 8.0]) -> {"Good": 2, "Moderate": 1}
+        """
+        counts = {}
+        labels = self.labels
+        limits = self.limits
+        # Counter keeps first-seen order, so labels come out in first-appearance order too
+        for value, count in Counter(values).items():
+            if value is None or value != value:
+                continue
+            name = labels[bisect_left(limits, value)]
+            counts[name] = counts.get(name, 0) + count
+        return counts
+
+
+PM25 = Breakpoints(
+    (12, 35.4, 55.4),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"),
+    unhealthy_at=55.5,
+)
+OZONE = Breakpoints(
+    (0.054, 0.070, 0.085),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"),
+    unhealthy_at=0.085,
+)
+AQI = Breakpoints(
+    (50, 100, 150, 200, 300),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"),
+    unhealthy_at=151,
+    integer=True,
+)
+
+# EPA breakpoints for 1-hour NO2 (ppb), 8-hour CO (ppm) and 24-hour PM10 (ug/m3), cut at the same
+# four categories as PM2.5 and ozone
+NO2 = Breakpoints(
+    (53, 100, 360),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"),
+    unhealthy_at=361,
+)
+CO = Breakpoints(
+    (4.4, 9.4, 12.4),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"),
+    unhealthy_at=12.5,
+)
+PM10 = Breakpoints(
+    (54, 154, 254),
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"),
+    unhealthy_at=255,
+)
+
+BREAKPOINTS = {"pm25": PM25, "ozone": OZONE, "aqi": AQI, "no2": NO2, "co": CO, "pm10": PM10}
+
+
+"""
+Purpose: Add (or replace) the breakpoint table of a pollutant, so the aggregation engine accepts
+metrics like "so2_averages" and schema columns of that name can be summarized.
+Input type: name (str, lowercase like "so2"), breakpoints (Breakpoints)
+Output type: None
+Example: register_pollutant("so2", Breakpoints((35, 75, 185), ("Good", "Moderate", "USG", "Unhealthy"), 186))
+"""
+def register_pollutant(name, breakpoints):
+    BREAKPOINTS[name] = breakpoints
@@ -1,15 +1,29 @@
 """
 AirQuality class
 Purpose: Hold one day's air quality readings (city, date, PM2.5, ozone, and optional AQI) and provide simple helper methods for health checks and categories.
-Inputs to constructor: city (str), date (str), pm25 (float or None), ozone (float or None), aqi (int or None)
+Inputs to constructor: city (str), date (str), pm25 (float or None), ozone (float or None), aqi (int or None),
+readings (dict of other pollutants like {"no2": 41.0}, or None)
 Example: AirQuality("LA","01/01/25", 12.5, 0.055, 65)
+Example: AirQuality("LA","01/01/25", 12.5, 0.055, readings={"no2": 41.0}).value("no2") -> 41.0
 Authors: Shishir and Drew
 """
+from array import array
+import math
+
+from categories import PM25, OZONE, AQI
+
+# Pollutants with their own AirQuality field and AirQualityTable column; others live in `readings`
+CORE_POLLUTANTS = ("pm25", "ozone", "aqi")
+
+
 class AirQuality:
     """Simple data holder for one day's readings."""
-    def __init__(self, city, date, pm25, ozone, aqi=None):
+    __slots__ = ("city", "date", "pm25", "ozone", "aqi", "readings")
+
+    def __init__(self, city, date, pm25, ozone, aqi=None, readings=None):
         """Purpose: Store provided values.
-        Inputs: city str, date str, pm25 float/None, ozone float/None, aqi int/None.
+        Inputs: city str, date str, pm25 float/None, ozone float/None, aqi int/None,
+        readings dict/None (other pollutants, missing ones left out or None).
         Output: None (object fields are set).
         Example: AirQuality("SF","02/01/25", 10.0, 0.040) creates an instance with those values.
         """
@@ -18,6 +32,17 @@ class AirQuality:
         self.pm25 = pm25
         self.ozone = ozone
         self.aqi = aqi
+        self.readings = readings
+
+    def value(self, pollutant):
+        """Purpose: Return the reading of any pollutant by name.
+        Input: str like "pm25", "aqi" or "no2".
+        Output: float/int, or None when missing.
+        Example: AirQuality("X","d", 10.0, 0.040, readings={"co": 0.6}).value("co") -> 0.6
+        """
+        if pollutant in CORE_POLLUTANTS:
+            return getattr(self, pollutant)
+        return self.readings.get(pollutant) if self.readings else None
 
     def pm_unhealthy(self):
         """Purpose: Tell if PM2.5 is in the Unhealthy range.
@@ -25,7 +50,7 @@ class AirQuality:
         Output: bool (True if pm25 >= 55.5).
         Example: AirQuality("X","d", 60.0, 0.040).pm_unhealthy() -> True
         """
-        return self.pm25 is not None and self.pm25 >= 55.5
+        return PM25.is_unhealthy(self.pm25)
 
     def pm_level_category(self):
         """Purpose: Return health category name for this PM2.5 value.
@@ -33,16 +58,7 @@ class AirQuality:
         Output: str category like "Good" or "Moderate".
         Example: 25.0 -> "Moderate"; None -> "No Data".
         """
-        if self.pm25 is None:
-            return "No Data"
-        elif self.pm25 <= 12:
-            return "Good"
-        elif self.pm25 <= 35.4:
-            return "Moderate"
-        elif self.pm25 <= 55.4:
-            return "Unhealthy for Sensitive Groups"
-        else:
-            return "Unhealthy"
+        return PM25.label(self.pm25)
 
     def ozone_unhealthy(self):
         """Purpose: Tell if ozone is Unhealthy (>= 0.085 ppm).
@@ -50,7 +66,7 @@ class AirQuality:
         Output: bool.
         Example: 0.090 -> True; 0.050 -> False.
         """
-        return self.ozone is not None and self.ozone >= 0.085
+        return OZONE.is_unhealthy(self.ozone)
 
     def ozone_level_category(self):
         """Purpose: Return ozone health category string.
@@ -58,16 +74,7 @@ class AirQuality:
         Output: str category (Good, Moderate, Unhealthy for Sensitive Groups, Unhealthy, or No Data).
         Example: 0.060 -> "Moderate".
         """
-        if self.ozone is None:
-            return "No Data"
-        elif self.ozone <= 0.054:
-            return "Good"
-        elif self.ozone <= 0.070:
-            return "Moderate"
-        elif self.ozone <= 0.085:
-            return "Unhealthy for Sensitive Groups"
-        else:
-            return "Unhealthy"
+        return OZONE.label(self.ozone)
 
     def aqi_unhealthy(self):
         """Purpose: Tell if AQI is Unhealthy or worse (>= 151).
@@ -75,7 +82,7 @@ class AirQuality:
         Output: bool.
         Example: aqi 160 -> True; aqi 100 -> False; None -> False.
         """
-        return self.aqi is not None and self.aqi >= 151
+        return AQI.is_unhealthy(self.aqi)
 
     def aqi_category(self):
         """Purpose: Return AQI category string.
@@ -83,18 +90,180 @@ class AirQuality:
         Output: str category.
         Example: 45 -> "Good"; 180 -> "Unhealthy"; None -> "No Data".
         """
-        if self.aqi is None:
-            return "No Data"
-        if self.aqi <= 50:
-            return "Good"
-        elif self.aqi <= 100:
-            return "Moderate"
-        elif self.aqi <= 150:
-            return "Unhealthy for Sensitive Groups"
-        elif self.aqi <= 200:
-            return "Unhealthy"
-        elif self.aqi <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
+        return AQI.label(self.aqi)
+
+
+"""
+AirQualityTable class
+Purpose: Hold many days of readings in typed columns instead of one AirQuality object per row.
+City and date strings are stored once in code tables and each row keeps small integer codes.
+PM2.5, ozone and AQI are stored as doubles with NaN meaning "missing". Any other pollutant the CSV
+has (see schema.py) gets its own double column in extra_values, read through column().
+Rows are handed out as AirQuality objects on demand, so code that loops over records keeps working.
+Example: table = AirQualityTable(); table.append("LA", "01/01/25", 12.5, None); table[0].ozone -> None
+"""
+class AirQualityTable:
+    """Columnar store of daily readings."""
+    def __init__(self):
+        """Purpose: Create an empty table.
+        Inputs: none.
+        Output: None (empty columns and code tables are set).
+        Example: AirQualityTable() has len 0.
+        """
+        self.city_names = []
+        self.city_lookup = {}
+        self.date_names = []
+        self.date_lookup = {}
+        self.city_ids = array("i")
+        self.date_ids = array("i")
+        self.pm25_values = array("d")
+        self.ozone_values = array("d")
+        self.aqi_values = array("d")
+        # pollutant -> array("d") for columns beyond PM2.5, ozone and AQI, like {"no2": array("d", [...])}
+        self.extra_values = {}
+        # Set by table_cache when the columns are views over a memory-mapped cache file
+        self.cache_mapping = None
+
+    @classmethod
+    def from_records(cls, records):
+        """Purpose: Build a table from any iterable of AirQuality records.
+        Input: iterable of AirQuality.
+        Output: AirQualityTable.
+        Example: AirQualityTable.from_records([AirQuality("A","d1",10.0,0.04)]) has len 1.
+        """
+        table = cls()
+        for record in records:
+            table.append(record.city, record.date, record.pm25, record.ozone, record.aqi, record.readings)
+        return table
+
+    def pollutants(self):
+        """Purpose: List the measured pollutant columns (AQI is derived, so it is not listed).
+        Output: list[str].
+        Example: table.pollutants() -> ["pm25", "ozone", "no2"]
+        """
+        return ["pm25", "ozone"] + list(self.extra_values)
+
+    def column(self, pollutant):
+        """Purpose: Return the column of any pollutant (NaN = missing).
+        Input: str like "pm25", "aqi" or "no2".
+        Output: array("d") (or a memoryview for cached tables).
+        Raises KeyError for a pollutant the table does not have.
+        Example: table.column("no2")[0] -> 41.0
+        """
+        if pollutant in CORE_POLLUTANTS:
+            return getattr(self, pollutant + "_values")
+        try:
+            return self.extra_values[pollutant]
+        except KeyError:
+            raise KeyError("no " + str(pollutant) + " column") from None
+
+    def has_column(self, pollutant):
+        """Purpose: Tell whether column(pollutant) exists (PM2.5, ozone and AQI always do).
+        Example: table.has_column("no2") -> False for a file without an NO2 column
+        """
+        return pollutant in CORE_POLLUTANTS or pollutant in self.extra_values
+
+    def add_column(self, pollutant):
+        """Purpose: Add an all-missing column for a new pollutant (no change if it already exists).
+        Input: str.
+        Output: array("d") (the column).
+        """
+        if pollutant in CORE_POLLUTANTS or pollutant in self.extra_values:
+            return self.column(pollutant)
+        column = array("d", [math.nan]) * len(self)
+        self.extra_values[pollutant] = column
+        return column
+
+    def city_id(self, city):
+        """Purpose: Return the integer code for a city, adding it if new.
+        Input: city str.
+        Output: int code.
+        Example: first city seen -> 0.
+        """
+        code = self.city_lookup.get(city)
+        if code is None:
+            code = len(self.city_names)
+            self.city_lookup[city] = code
+            self.city_names.append(city)
+        return code
+
+    def date_id(self, date):
+        """Purpose: Return the integer code for a date string, adding it if new.
+        Input: date str.
+        Output: int code.
+        Example: first date seen -> 0.
+        """
+        code = self.date_lookup.get(date)
+        if code is None:
+            code = len(self.date_names)
+            self.date_lookup[date] = code
+            self.date_names.append(date)
+        return code
+
+    def append(self, city, date, pm25, ozone, aqi=None, readings=None):
+        """Purpose: Add one row to the end of the table.
+        Inputs: city str, date str, pm25 float/None, ozone float/None, aqi int/None,
+        readings dict/None (other pollutants; a new name adds a column, missing for earlier rows).
+        Output: None.
+        Example: table.append("SF", "02/01/25", 10.0, 0.040)
+        """
+        if readings:
+            for pollutant in readings:
+                if pollutant not in self.extra_values:
+                    self.add_column(pollutant)
+        for pollutant, column in self.extra_values.items():
+            value = readings.get(pollutant) if readings else None
+            column.append(math.nan if value is None else value)
+        self.city_ids.append(self.city_id(city))
+        self.date_ids.append(self.date_id(date))
+        self.pm25_values.append(math.nan if pm25 is None else pm25)
+        self.ozone_values.append(math.nan if ozone is None else ozone)
+        self.aqi_values.append(math.nan if aqi is None else aqi)
+
+    def __len__(self):
+        return len(self.city_ids)
+
+    def __getitem__(self, index):
+        """Purpose: Return row `index` as an AirQuality object (missing values become None).
+        Input: int index (negative counts from the end), or a slice.
+        Output: AirQuality (a list of AirQuality for a slice, like slicing the old list of records).
+        Example: table[0] -> AirQuality("LA", "01/01/25", 12.5, None); table[:2] -> [AirQuality(...), AirQuality(...)]
+        """
+        if isinstance(index, slice):
+            return [self[row] for row in range(*index.indices(len(self)))]
+        pm25 = self.pm25_values[index]
+        ozone = self.ozone_values[index]
+        aqi = self.aqi_values[index]
+        return AirQuality(
+            self.city_names[self.city_ids[index]],
+            self.date_names[self.date_ids[index]],
+            None if pm25 != pm25 else pm25,
+            None if ozone != ozone else ozone,
+            None if aqi != aqi else int(aqi),
+            self._readings(index) if self.extra_values else None,
+        )
+
+    def _readings(self, index):
+        readings = {}
+        for pollutant, column in self.extra_values.items():
+            value = column[index]
+            readings[pollutant] = None if value != value else value
+        return readings
 
+    def __iter__(self):
+        if self.extra_values:
+            for index in range(len(self)):
+                yield self[index]
+            return
+        city_names = self.city_names
+        date_names = self.date_names
+        for city_id, date_id, pm25, ozone, aqi in zip(
+            self.city_ids, self.date_ids, self.pm25_values, self.ozone_values, self.aqi_values
+        ):
+            yield AirQuality(
+                city_names[city_id],
+                date_names[date_id],
+                None if pm25 != pm25 else pm25,
+                None if ozone != ozone else ozone,
+                None if aqi != aqi else int(aqi),
+            )
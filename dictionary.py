@@ -1,7 +1,15 @@
 """Dictionary Utilities
 Purpose: Build simple combined dictionaries from AirQuality records.
+city_series is the typed version for large data: per-city array('d') columns with aligned date
+ordinals, plus PM2.5/ozone covariance and correlation computed straight from those buffers.
 Author: Shishir
 """
+from array import array
+import math
+
+from data import AirQualityTable
+import numpy_backend
+from time_index import date_ordinals
 
 """
 Purpose: Given a list of AirQuality records, return a dictionary mapping each city to lists of its PM2.5 and ozone values.
@@ -9,6 +17,7 @@ Input type: list[AirQuality]
 Output type: dict[str, dict]
 Example input: [AirQuality("A","d1",10.0,0.040), AirQuality("A","d2",12.0,0.050), AirQuality("B","d1",8.0,0.030)]
 Output given example: {"A": {"pm25": [10.0,12.0], "ozone": [0.040,0.050]}, "B": {"pm25": [8.0], "ozone": [0.030]}}
+Notes: Lists of boxed floats; for large data use city_series below.
 """
 def combined_dictionary(records):
     ozone_pm25_dict = {}
@@ -18,4 +27,149 @@ def combined_dictionary(records):
             ozone_pm25_dict[city] = {"pm25": [], "ozone": []}
         ozone_pm25_dict[city]["pm25"].append(record.pm25)
         ozone_pm25_dict[city]["ozone"].append(record.ozone)
-    return ozone_pm25_dict
\ No newline at end of file
+    return ozone_pm25_dict
+
+
+class PollutantSeries:
+    """One city's readings as typed, aligned columns (row i of every column is the same day)."""
+    def __init__(self, size):
+        """Purpose: Allocate zero-filled columns for `size` readings up front.
+        Input: size (int).
+        Output: None.
+        Example: PollutantSeries(3).pm25 -> array('d', [0.0, 0.0, 0.0])
+        """
+        self.dates = array("i", bytes(size * array("i").itemsize))
+        self.pm25 = array("d", bytes(size * 8))
+        self.ozone = array("d", bytes(size * 8))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def missing(self, pollutant):
+        """Purpose: Return the missing-value mask of one pollutant (1 where the reading is missing).
+        Input: str "pm25" or "ozone".
+        Output: bytearray, one byte per reading.
+        Example: series.missing("pm25") -> bytearray(b'\\x00\\x01')
+        """
+        return bytearray(1 if value != value else 0 for value in getattr(self, pollutant))
+
+    def covariance(self):
+        """Purpose: Sample covariance of PM2.5 and ozone over the days where both were measured.
+        Output: float, or None with fewer than two such days.
+        Example: series.covariance() -> 0.012
+        """
+        moments = _paired_moments(self.pm25, self.ozone)
+        if moments is None or moments[0] < 2:
+            return None
+        count, _, _, pm_ozone, _, _ = moments
+        return pm_ozone / (count - 1)
+
+    def correlation(self):
+        """Purpose: Pearson correlation of PM2.5 and ozone over the days where both were measured.
+        Output: float -1..1, or None with fewer than two such days or a constant column.
+        Example: series.correlation() -> 0.42
+        """
+        moments = _paired_moments(self.pm25, self.ozone)
+        if moments is None or moments[0] < 2:
+            return None
+        count, _, _, pm_ozone, pm_pm, ozone_ozone = moments
+        if pm_pm == 0 or ozone_ozone == 0:
+            return None
+        return pm_ozone / math.sqrt(pm_pm * ozone_ozone)
+
+
+def _paired_moments(first, second):
+    """Count, means and centered sums of products over rows where both values are present.
+    NumPy views the array('d') buffers directly when it is installed; otherwise two passes in Python.
+    """
+    if numpy_backend.HAVE_NUMPY:
+        np = numpy_backend.np
+        x = np.frombuffer(first, dtype=np.float64)
+        y = np.frombuffer(second, dtype=np.float64)
+        both = ~(np.isnan(x) | np.isnan(y))
+        x = x[both]
+        y = y[both]
+        if len(x) == 0:
+            return None
+        x_mean = x.mean()
+        y_mean = y.mean()
+        dx = x - x_mean
+        dy = y - y_mean
+        return len(x), float(x_mean), float(y_mean), float(dx @ dy), float(dx @ dx), float(dy @ dy)
+    pairs = [(x, y) for x, y in zip(first, second) if x == x and y == y]
+    if not pairs:
+        return None
+    count = len(pairs)
+    x_mean = math.fsum(x for x, _ in pairs) / count
+    y_mean = math.fsum(y for _, y in pairs) / count
+    xy = xx = yy = 0.0
+    for x, y in pairs:
+        dx = x - x_mean
+        dy = y - y_mean
+        xy += dx * dy
+        xx += dx * dx
+        yy += dy * dy
+    return count, x_mean, y_mean, xy, xx, yy
+
+
+"""
+Purpose: Typed replacement for combined_dictionary: each city's PM2.5 and ozone readings as array('d')
+columns (NaN = missing) with an aligned array('i') of date ordinals, in file order.
+Input type: AirQualityTable (other iterables of AirQuality are copied into one first), report
+(file_handling.ParseReport or None)
+Output type: dict[str, PollutantSeries], cities in first-seen order
+Example input: [AirQuality("A","01/01/25",10.0,0.040), AirQuality("A","01/02/25",None,0.050)]
+Output given example: {"A": series} with series.pm25 == array('d', [10.0, nan]), series.ozone == array('d', [0.04, 0.05])
+Notes: One counting pass sizes every column, then one pass writes each row into place (no appends).
+Each distinct date string is parsed once; rows whose date cannot be read are left out and counted in
+report as "bad date". With NumPy the rows are grouped by a stable argsort instead.
+"""
+def city_series(records, report=None):
+    table = records if isinstance(records, AirQualityTable) else AirQualityTable.from_records(records)
+    names = table.city_names
+    ordinals = date_ordinals(table.date_names)
+    rows = zip(table.city_ids, table.date_ids, table.pm25_values, table.ozone_values)
+    codes = table.city_ids
+    if None in ordinals:
+        rows = [row for row in rows if ordinals[row[1]] is not None]
+        codes = [row[0] for row in rows]
+        if report is not None:
+            for _ in range(len(table) - len(rows)):
+                report.reject("bad date")
+    if numpy_backend.HAVE_NUMPY:
+        return _numpy_city_series(table, ordinals)
+    counts = [0] * len(names)
+    for code in codes:
+        counts[code] += 1
+    series = [PollutantSeries(count) for count in counts]
+    positions = [0] * len(names)
+    for code, date_code, pm25, ozone in rows:
+        target = series[code]
+        position = positions[code]
+        target.dates[position] = ordinals[date_code]
+        target.pm25[position] = pm25
+        target.ozone[position] = ozone
+        positions[code] = position + 1
+    return dict(zip(names, series))
+
+
+def _numpy_city_series(table, ordinals):
+    np = numpy_backend.np
+    # Ordinal days start at 1, so 0 marks a date that could not be read
+    days = np.asarray([ordinal or 0 for ordinal in ordinals], dtype=np.intc)[np.frombuffer(table.date_ids, dtype=np.intc)]
+    readable = days != 0
+    codes = numpy_backend.city_codes(table)[readable]
+    order = np.argsort(codes, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(table.city_names)))))
+    dates = days[readable][order]
+    pm25 = numpy_backend.column(table, "pm25")[readable][order]
+    ozone = numpy_backend.column(table, "ozone")[readable][order]
+    result = {}
+    for code, name in enumerate(table.city_names):
+        start, end = int(bounds[code]), int(bounds[code + 1])
+        series = PollutantSeries(0)
+        series.dates.frombytes(dates[start:end].tobytes())
+        series.pm25.frombytes(pm25[start:end].tobytes())
+        series.ozone.frombytes(ozone[start:end].tobytes())
+        result[name] = series
+    return result
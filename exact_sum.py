@@ -0,0 +1,66 @@
+"""Exact Sums
+Purpose: Add readings without rounding, so a total does not depend on the order its values arrive in or on
+how the rows were split into files, shards or batches. Every float is a whole multiple of 2**-1074, so a
+sum of floats is kept exactly as a Python int counting units of 2**-1074. Averages divide once at the end
+(int / int is correctly rounded), which makes the serial, NumPy, SQLite, --workers and --async paths
+agree bit for bit.
+Example: mean(exact(0.1) + exact(0.2) + exact(0.3), 3) -> 0.2 (a running float sum gives 0.20000000000000004)
+"""
+UNIT_BITS = 1074
+
+
+"""
+Purpose: Convert one finite reading to an exact count of 2**-1074 units.
+Input type: float or int
+Output type: int
+Example: exact(0.5) -> 1 << 1073
+"""
+def exact(value):
+    numerator, denominator = value.as_integer_ratio()
+    # denominator is a power of two no larger than 2**1074
+    return numerator << (UNIT_BITS + 1 - denominator.bit_length())
+
+
+"""
+Purpose: Give the average of readings from their exact total, rounded once.
+Input type: total (int from exact sums), count (int, > 0)
+Output type: float
+Example: mean(exact(10.0) + exact(15.0), 2) -> 12.5
+"""
+def mean(total, count):
+    return total / (count << UNIT_BITS)
+
+"""
+Purpose: Find the scale 2**-bits at which every value of a column is a whole number, so running sums can
+be kept as small ints (see scaled) instead of full 2**-1074 units.
+Input type: iterable of float (NaN is ignored)
+Output type: int (bits)
+Example: scale_bits([0.5, 0.25]) -> 2
+"""
+def scale_bits(values):
+    bits = 0
+    for value in set(values):
+        if value == value:
+            bits = max(bits, value.as_integer_ratio()[1].bit_length() - 1)
+    return bits
+
+
+"""
+Purpose: Convert one value to a whole number of 2**-bits units (bits from scale_bits).
+Input type: value (float or int), bits (int)
+Output type: int
+Example: scaled(0.75, 2) -> 3
+"""
+def scaled(value, bits):
+    numerator, denominator = value.as_integer_ratio()
+    return numerator << (bits + 1 - denominator.bit_length())
+
+
+"""
+Purpose: Turn a sum of scaled values back into exact units (see exact), for mean.
+Input type: total (int), bits (int)
+Output type: int
+Example: mean(from_scaled(scaled(0.5, 2) + scaled(0.25, 2), 2), 2) -> 0.375
+"""
+def from_scaled(total, bits):
+    return total << (UNIT_BITS - bits)
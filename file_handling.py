@@ -1,30 +1,340 @@
 """File Handling Functions
-Purpose: Load CSV rows and convert them into AirQuality objects.
+Purpose: Load CSV rows and convert them into AirQuality records.
+Columns are found by header name once per file (see schema.py), so any number of pollutant columns
+(PM2.5, ozone, NO2, CO, PM10, ...) load into the table; files with placeholder headers use the fixed
+positions of the original export.
+No reader stops on a bad row: parse_csv, the mmap engine, iter_air_quality and iter_byte_range all
+skip short rows, unparseable numbers and unreadable dates, count them in a ParseReport and can pass them
+on for a quarantine CSV with their line numbers. Sentinel strings like "NA" or "-999" count as missing readings
+(see schema.convert_column).
 Author: Shishir
 """
+from array import array
 import csv
-from data import AirQuality
+from itertools import islice
+import math
+import os
+import time
+from data import AirQualityTable
+from schema import DEFAULT_SCHEMA, LEGACY_COLUMNS, bad_dates, convert_column, read_columns
+from table_cache import load_cached_table, save_cached_table
+from scanner import scan_table
+from aqi import fill_aqi
+
+# Rows converted together; small batches stay in the CPU cache and never build up enough live lists to
+# set off the garbage collector (50000-row batches parse about 1.7x slower)
+BATCH_ROWS = 512
+QUARANTINE_HEADER = ["file", "line", "reason", "row"]
+
+
+class ParseReport:
+    """Counts from one or more parse_csv calls: rows kept, rows rejected (by reason) and throughput."""
+    def __init__(self):
+        self.rows = 0
+        self.rejected = 0
+        self.reasons = {}
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def reject(self, reason):
+        self.rejected += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def merge(self, other):
+        """Purpose: Add another report's counts (for example from another file or shard) to this one."""
+        self.rows += other.rows
+        self.rejected += other.rejected
+        for reason, count in other.reasons.items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + count
+        self.seconds += other.seconds
+        self.bytes += other.bytes
+
+    def rows_per_second(self):
+        """Purpose: Rows read (kept and rejected) per second of parsing."""
+        return (self.rows + self.rejected) / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self):
+        """Purpose: Return the counts as JSON-ready data.
+        Output: dict like {"rows": 9998, "rejected": 2, "reasons": {"short row": 2}, "seconds": 0.4,
+        "rows_per_second": 25000.0, "megabytes_per_second": 12.5}.
+        """
+        return {
+            "rows": self.rows,
+            "rejected": self.rejected,
+            "reasons": dict(self.reasons),
+            "seconds": self.seconds,
+            "rows_per_second": self.rows_per_second(),
+            "megabytes_per_second": self.bytes / self.seconds / 1e6 if self.seconds > 0 else 0.0,
+        }
+
+
+"""
+Purpose: Read a CSV file and build a columnar table of AirQuality records from its pollutant columns.
+Input type: file (str path to CSV), cache (bool), engine (str "csv" or "mmap"), aqi (bool),
+quarantine (str path or None), report (ParseReport or None), schema (schema.Schema or None)
+Output type: AirQualityTable (indexable and iterable like a list[AirQuality])
+Example: ozone_pm25_air_quality("ozone_pm25_data.csv") -> AirQualityTable with one row per CSV line
+Example: ozone_pm25_air_quality("ozone_pm25_data.csv", cache=True) -> same table, memory-mapped from
+"ozone_pm25_data.csv.aqcache" when that file is still up to date (see table_cache.py)
+Example: ozone_pm25_air_quality("ozone_pm25_data.csv", engine="mmap") -> same table, read with the
+memory-mapped column scanner (see scanner.py), which is faster on wide files
+Example: ozone_pm25_air_quality("ozone_pm25_data.csv", aqi=True) -> same table with every record's aqi
+computed from its PM2.5 and ozone readings (see aqi.py)
+Example: ozone_pm25_air_quality("ozone_pm25_data.csv", quarantine="bad_rows.csv", report=report) -> same
+table without the malformed rows, which are appended to bad_rows.csv and counted in report
+Example: ozone_pm25_air_quality("no2_data.csv", schema=Schema(pollutants={"no2": "NO2 Mean"})) -> table
+whose "no2" column holds the "NO2 Mean" readings (table.column("no2"))
+Notes: Resolves the header once (see schema.py); blank numeric fields become None. Bad rows are skipped
+(see parse_csv): the mmap engine converts fields the same way and hands a file with a malformed row to
+parse_csv. The binary cache is only used with the default schema, and only by the engine that wrote it;
+it keeps the rejected rows, so a cached load counts them in report and writes them to quarantine too.
+"""
+def ozone_pm25_air_quality(file, cache=False, engine="csv", aqi=False, quarantine=None, report=None,
+                           schema=None):
+    if engine not in ("csv", "mmap"):
+        raise ValueError("unknown engine: " + str(engine))
+    cache = cache and schema is None
+    rejects = []
+    if cache:
+        table = load_cached_table(file, engine, rejects)
+        if table is not None:
+            if report is not None:
+                report.rows += len(table)
+                for line, reason, parts in rejects:
+                    report.reject(reason)
+            if rejects and quarantine is not None:
+                write_quarantine(quarantine, file, rejects)
+            if aqi:
+                fill_aqi(table)
+            return table
+    if engine == "csv":
+        table = parse_csv(file, quarantine, report, schema, rejects)
+    else:
+        table = _scan(file, quarantine, report, schema, rejects)
+    if aqi:
+        fill_aqi(table)
+    if cache:
+        try:
+            save_cached_table(file, table, engine, rejects)
+        except OSError:
+            pass
+    return table
+
+
+def _scan(file, quarantine, report, schema, rejects):
+    """mmap engine: scan_table, or parse_csv (which skips and reports bad rows) when the file has any."""
+    started = time.perf_counter()
+    try:
+        table = scan_table(file, schema)
+    except (ValueError, IndexError):
+        return parse_csv(file, quarantine, report, schema, rejects)
+    if report is not None:
+        report.rows += len(table)
+        report.seconds += time.perf_counter() - started
+        report.bytes += os.path.getsize(file)
+    return table
+
+
+"""
+Purpose: Parse a CSV file into a new AirQualityTable (no caching), skipping malformed rows.
+Input type: file (str path to CSV), quarantine (str path or None), report (ParseReport or None),
+schema (schema.Schema or None for the default), rejects (list or None, see iter_air_quality)
+Output type: AirQualityTable
+Example: parse_csv("data.csv", quarantine="bad_rows.csv") -> table of the good rows
+Notes: The header is resolved once; every pollutant column it names is loaded. Rows are read in batches of BATCH_ROWS and each numeric column is converted for the whole batch,
+parsing each distinct string once. A row is rejected when it is too short, has a reading that is
+not a finite number (sentinels like "NA" are missing, not bad) or a date schema.parse_date cannot read. Rejected rows are
+appended to the quarantine CSV as (file, line, reason, original row) and counted in the report.
+Line numbers count one line per row (the header is line 1), so they shift after a quoted field that
+contains a newline.
+"""
+def parse_csv(file, quarantine=None, report=None, schema=None, rejects=None):
+    report = ParseReport() if report is None else report
+    started = time.perf_counter()
+    table = AirQualityTable()
+    numbers = {}
+    known_dates = set()
+    rejects = [] if rejects is None else rejects
+    with open(file, "r", newline="") as file_handle:
+        reader = csv.reader(file_handle)
+        header = next(reader, None)
+        columns = (schema or DEFAULT_SCHEMA).resolve(header) if header is not None else LEGACY_COLUMNS
+        for pollutant in columns.pollutants:
+            table.add_column(pollutant)
+        first_line = 2
+        while True:
+            batch = list(islice(reader, BATCH_ROWS))
+            if not batch:
+                break
+            _parse_batch(table, batch, columns, first_line, numbers, known_dates, rejects, report)
+            first_line += len(batch)
+    report.seconds += time.perf_counter() - started
+    report.bytes += os.path.getsize(file)
+    if rejects and quarantine is not None:
+        write_quarantine(quarantine, file, rejects)
+    return table
+
+
+def _parse_batch(table, batch, columns, first_line, numbers, known_dates, rejects, report):
+    """Validate and convert one batch of rows (the first on line first_line), appending good rows to
+    table and (line, reason, row) tuples to rejects. numbers and known_dates are the memos of
+    schema.convert_column and schema.bad_dates."""
+    width = columns.width
+    short = [index for index, parts in enumerate(batch) if len(parts) < width]
+    rows = [parts for parts in batch if len(parts) >= width] if short else batch
+    cities = [parts[columns.city] for parts in rows]
+    dates = [parts[columns.date] for parts in rows]
+    converted = {pollutant: convert_column([parts[index] for parts in rows], numbers)
+                 for pollutant, index in columns.pollutants.items()}
+    unreadable = bad_dates(dates, known_dates)
+    if short or unreadable or any(None in values for values in converted.values()):
+        # Rare path: find each bad row's line, then drop it from the columns
+        lines = [first_line + index for index, parts in enumerate(batch) if len(parts) >= width]
+        found = [(first_line + index, "short row", batch[index]) for index in short]
+        numbers_ok = [None not in values for values in zip(*converted.values())] if converted else [True] * len(rows)
+        keep = []
+        for index, (ok, date) in enumerate(zip(numbers_ok, dates)):
+            if not ok:
+                found.append((lines[index], "bad number", rows[index]))
+            elif date in unreadable:
+                found.append((lines[index], "bad date", rows[index]))
+            keep.append(ok and date not in unreadable)
+        for line, reason, parts in sorted(found, key=lambda reject: reject[0]):
+            rejects.append((line, reason, parts))
+            report.reject(reason)
+        cities = [value for value, ok in zip(cities, keep) if ok]
+        dates = [value for value, ok in zip(dates, keep) if ok]
+        for pollutant, values in converted.items():
+            converted[pollutant] = [value for value, ok in zip(values, keep) if ok]
+    missing = array("d", [math.nan]) * len(cities)
+    table.city_ids.extend(array("i", map(table.city_id, cities)))
+    table.date_ids.extend(array("i", map(table.date_id, dates)))
+    for pollutant in table.pollutants():
+        values = converted.get(pollutant)
+        table.column(pollutant).extend(missing if values is None else array("d", values))
+    table.aqi_values.extend(missing)
+    report.rows += len(cities)
+
+
+"""
+Purpose: Append rejected rows to a quarantine CSV (the header is written when the file is new).
+Input type: path (str), source (str CSV the rows came from), rejects (list of (line, reason, row fields))
+Output type: None
+Example: write_quarantine("bad_rows.csv", "data.csv", [(12, "short row", ["01/01/24", "x"])])
+"""
+def write_quarantine(path, source, rejects):
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as handle:
+        writer = csv.writer(handle)
+        if new_file:
+            writer.writerow(QUARANTINE_HEADER)
+        for line, reason, parts in rejects:
+            writer.writerow([source, line, reason] + list(parts))
+
 
 """
-Purpose: Read a CSV file and build a list of AirQuality records using PM2.5 and ozone columns.
-Input type: file (str path to CSV)
-Output type: list[AirQuality]
-Example: ozone_pm25_air_quality("ozone_pm25_data.csv") -> [AirQuality(...), ...]
-Notes: Skips header row; blank numeric fields become None.
+Purpose: Stream a CSV file without loading it all into memory, skipping malformed rows like parse_csv.
+Input type: path (str path to CSV), chunk_size (int or None), report (ParseReport or None),
+rejects (list or None: receives a (line, reason, row fields) tuple per skipped row, for write_quarantine)
+Output type: iterator of AirQuality, or of AirQualityTable batches when chunk_size is given
+Example: for record in iter_air_quality("ozone_pm25_data.csv"): ...
+Example: for batch in iter_air_quality("ozone_pm25_data.csv", chunk_size=50000): ... (each batch has at most 50000 rows)
+Notes: Columns are resolved from the header like parse_csv (default schema). Only one batch is held at a time, so memory stays flat no matter how big the file is.
+The analysis functions take any iterable of records, so a record stream can be passed to them directly;
+a batch stream can be flattened with itertools.chain.from_iterable.
 """
-def ozone_pm25_air_quality(file):
-    pm25_ozone_air_quality = []
-    with open(file, "r") as file_handle:
+def iter_air_quality(path, chunk_size=None, report=None, rejects=None):
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    with open(path, "r", newline="") as file_handle:
         reader = csv.reader(file_handle)
-        next(reader)
-        for parts in reader:
-            date = parts[0]
-            city = parts[7]
-            pm25 = parts[4]
-            ozone = parts[24]
-            pm25 = float(pm25) if pm25 != "" else None
-            ozone = float(ozone) if ozone != "" else None
-            record = AirQuality(city, date, pm25, ozone)
-            pm25_ozone_air_quality.append(record)
-    return pm25_ozone_air_quality
+        header = next(reader, None)
+        if header is None:
+            # Empty file: nothing to yield (an empty file in a glob must not stop the run)
+            return
+        columns = DEFAULT_SCHEMA.resolve(header)
+        batches = _table_batches(reader, columns, 2, chunk_size or BATCH_ROWS, report, rejects)
+        if chunk_size is None:
+            for batch in batches:
+                yield from batch
+        else:
+            yield from batches
+
+
+def _table_batches(reader, columns, first_line, chunk_size, report, rejects):
+    """Yield an AirQualityTable of the good rows among every chunk_size rows of a csv.reader (rows on
+    line first_line onward), converting them BATCH_ROWS at a time with _parse_batch."""
+    report = ParseReport() if report is None else report
+    rejects = [] if rejects is None else rejects
+    numbers = {}
+    known_dates = set()
+    while True:
+        table = AirQualityTable()
+        for pollutant in columns.pollutants:
+            table.add_column(pollutant)
+        read = 0
+        while read < chunk_size:
+            batch = list(islice(reader, min(BATCH_ROWS, chunk_size - read)))
+            if not batch:
+                break
+            _parse_batch(table, batch, columns, first_line, numbers, known_dates, rejects, report)
+            first_line += len(batch)
+            read += len(batch)
+        if len(table) > 0:
+            yield table
+        if read < chunk_size:
+            return
+
+
+"""
+Purpose: Yield AirQuality records for the lines that start inside [start, end) of a CSV file, skipping
+malformed rows like parse_csv.
+Input type: path (str), start (int), end (int), report (ParseReport or None), rejects (list or None,
+see iter_air_quality)
+Output type: iterator of AirQuality
+Notes: start must be the first byte of a line. Used by parallel.py (shards) and incremental.py (new rows).
+The header row is read once more to resolve the columns. Rejected rows get their line number in the
+whole file (counted once the range is done, and only when a row was rejected).
+"""
+def iter_byte_range(path, start, end, report=None, rejects=None):
+    columns = read_columns(path)
+    rejects = [] if rejects is None else rejects
+    before = len(rejects)
+    # Lines are numbered from 1 at start while reading; rejects are renumbered at the end
+    first_line = 1
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        position = start
+        lines = []
+        while position < end:
+            line = handle.readline()
+            if not line:
+                break
+            position += len(line)
+            lines.append(line.decode("utf-8"))
+            if len(lines) >= 10000:
+                for batch in _table_batches(csv.reader(lines), columns, first_line, len(lines), report, rejects):
+                    yield from batch
+                first_line += len(lines)
+                lines = []
+        if lines:
+            for batch in _table_batches(csv.reader(lines), columns, first_line, len(lines), report, rejects):
+                yield from batch
+    if len(rejects) > before:
+        lines_before = _count_lines(path, start)
+        for index in range(before, len(rejects)):
+            line, reason, parts = rejects[index]
+            rejects[index] = (lines_before + line, reason, parts)
+
 
+def _count_lines(path, end):
+    """Count the newlines in the first `end` bytes of a file, a block at a time."""
+    count = 0
+    with open(path, "rb") as handle:
+        while end > 0:
+            block = handle.read(min(end, 1 << 20))
+            if not block:
+                break
+            count += block.count(b"\n")
+            end -= len(block)
+    return count
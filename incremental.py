@@ -0,0 +1,173 @@
+"""Incremental Aggregates
+Purpose: Keep per-city totals in a state file and fold in only the rows appended to each CSV since
+the last run, so a daily update costs O(new rows) instead of O(all rows).
+The state remembers, for every CSV, the byte offset up to which rows were read and a hash of the
+file's first bytes. If a file shrinks or its beginning changes it was rewritten, not appended to,
+and the state is rebuilt from scratch. The state also remembers the list of files it covers and is
+rebuilt when a run names a different list.
+A final row without a trailing newline is counted, like a full read does. If the next run finds that
+row continued (the file grew but does not start a new line there) it was still being written, and the
+state is rebuilt. Malformed new rows are skipped like parse_csv does (see refresh).
+Example: state = load_state("aggregates.json", metrics); refresh(state, ["ozone_pm25_data.csv"]); save_state(state, "aggregates.json")
+"""
+import hashlib
+import json
+import os
+
+from aggregation import AggregationEngine, AggregateResult, PollutantAccumulator
+from file_handling import iter_byte_range, write_quarantine, ParseReport
+
+STATE_VERSION = 2
+HEAD_BYTES = 4096
+
+
+class AggregateState:
+    """Totals plus how far into each CSV file they reach."""
+    def __init__(self, metrics):
+        """Purpose: Start an empty state for the given engine metrics.
+        Input: iterable of metric names (see aggregation.AggregationEngine).
+        Output: None.
+        Example: AggregateState(["pm25_averages", "pm25_unhealthy"])
+        """
+        self.engine = AggregationEngine(metrics, backend="python")
+        self.result = self.engine.run([])
+        # path -> {"offset": int, "head": str}
+        self.files = {}
+        # Absolute paths of the files the totals cover, in run order
+        self.paths = []
+
+
+"""
+Purpose: Fold new records into the state's totals.
+Input type: AggregateState, iterable of AirQuality
+Output type: int (number of records added)
+Example: update(state, [AirQuality("LA", "01/03/25", 12.0, 0.05)]) -> 1
+"""
+def update(state, new_records):
+    return state.engine.feed(state.result, new_records)
+
+
+def _head_hash(path, length):
+    with open(path, "rb") as handle:
+        return hashlib.blake2b(handle.read(min(length, HEAD_BYTES)), digest_size=16).hexdigest()
+
+
+def _resume_offset(path, offset):
+    """Return where the new rows start, or None when the last counted line was continued (not appended to)."""
+    with open(path, "rb") as handle:
+        handle.seek(offset - 1)
+        tail = handle.read(3)
+    if tail[:1] == b"\n":
+        return offset
+    # The last run counted a final line that had no newline yet; new rows must start on a new line
+    for newline in (b"\n", b"\r\n"):
+        if tail[1:].startswith(newline):
+            return offset + len(newline)
+    return None
+
+
+"""
+Purpose: Fold the rows appended to one CSV file since the last update into the state.
+Input type: AggregateState, str path, report (file_handling.ParseReport or None), rejects (list or None:
+receives the skipped rows, see file_handling.iter_air_quality)
+Output type: int (number of new records), or None if the file was rewritten and the state must be rebuilt
+Example: update_from_file(state, "ozone_pm25_data.csv") -> 120
+"""
+def update_from_file(state, path, report=None, rejects=None):
+    key = os.path.abspath(path)
+    end = os.path.getsize(path)
+    seen = state.files.get(key)
+    if seen is None:
+        with open(path, "rb") as handle:
+            handle.readline()
+            start = handle.tell()
+    else:
+        start = seen["offset"]
+        if end < start or _head_hash(path, start) != seen["head"]:
+            return None
+        if start < end:
+            start = _resume_offset(path, start)
+            if start is None:
+                return None
+    added = update(state, iter_byte_range(path, start, end, report, rejects))
+    state.files[key] = {"offset": end, "head": _head_hash(path, end)}
+    return added
+
+
+"""
+Purpose: Bring the state up to date with a list of CSV files, rebuilding it if any file was rewritten
+or the list is not the one the state was built from.
+Input type: AggregateState, list[str] paths, report (file_handling.ParseReport or None: receives the
+counts of the rows read), quarantine (str path or None: CSV that collects the skipped rows)
+Output type: AggregateState (the same object, or a fresh one after a rebuild)
+Example: state = refresh(state, ["ozone_pm25_data.csv"], quarantine="bad_rows.csv")
+"""
+def refresh(state, paths, report=None, quarantine=None):
+    keys = [os.path.abspath(path) for path in paths]
+    if state.paths != keys:
+        state = AggregateState(state.engine.metrics)
+        state.paths = keys
+    run_report = ParseReport()
+    rejects = [[] for _ in paths]
+    for position, path in enumerate(paths):
+        if update_from_file(state, path, run_report, rejects[position]) is None:
+            # A rebuild reads every row again, so the counts start over too
+            state = AggregateState(state.engine.metrics)
+            state.paths = keys
+            run_report = ParseReport()
+            rejects = [[] for _ in paths]
+            for rebuild_position, rebuild_path in enumerate(paths):
+                update_from_file(state, rebuild_path, run_report, rejects[rebuild_position])
+            break
+    if report is not None:
+        report.merge(run_report)
+    if quarantine is not None:
+        for path, file_rejects in zip(paths, rejects):
+            if file_rejects:
+                write_quarantine(quarantine, path, file_rejects)
+    return state
+
+
+"""
+Purpose: Write the state to a JSON file (atomically, through a temporary file).
+Input type: AggregateState, str path
+Output type: None
+"""
+def save_state(state, path):
+    data = {
+        "version": STATE_VERSION,
+        "metrics": sorted(state.engine.metrics),
+        "row_count": state.result.row_count,
+        "paths": state.paths,
+        "files": state.files,
+        "accumulators": {name: acc.to_dict() for name, acc in state.result.accumulators.items()},
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+
+"""
+Purpose: Read a state file, or start an empty state when it is missing or was made for other metrics
+(refresh rebuilds it when it was made for other files).
+Input type: str path, iterable of metric names
+Output type: AggregateState
+"""
+def load_state(path, metrics):
+    state = AggregateState(metrics)
+    try:
+        with open(path) as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return state
+    if data.get("version") != STATE_VERSION or set(data.get("metrics", [])) != state.engine.metrics:
+        return state
+    accumulators = {}
+    for name, saved in data["accumulators"].items():
+        accumulators[name] = PollutantAccumulator.from_dict(saved)
+    state.result = AggregateResult(accumulators, set(state.engine.metrics))
+    state.result.row_count = data["row_count"]
+    state.paths = data["paths"]
+    state.files = data["files"]
+    return state
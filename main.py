@@ -5,112 +5,380 @@ Purpose: Load daily air quality records (PM2.5 and ozone) for California cities
 3. Worst 3 cities by average Ozone.
 4. Top 3 cities by unhealthy PM2.5 day counts.
 5. Top 3 cities by unhealthy Ozone day counts.
-Input: Optional command line argument with CSV filename (defaults to 'ozone_pm25_data.csv').
+6. With --aqi: worst 3 cities by average AQI and top 3 cities by unhealthy AQI days.
+7. For any other pollutant column the file has (NO2, CO, PM10; see schema.py): worst 3 cities by
+   average and top 3 cities by unhealthy days.
+Input: Optional command line arguments with one or more CSV filenames or glob patterns like 'data/*.csv'
+(defaults to 'ozone_pm25_data.csv').
+Options: --workers N parses and aggregates on N processes (see parallel.py).
+         --async reads all files concurrently with a bounded prefetch queue (see async_loader.py);
+         --prefetch N sets how many parsed batches may wait in that queue.
+         --state FILE keeps running totals in FILE and only reads rows added since the last run (see incremental.py).
+         --db FILE loads the CSV files into a SQLite database once (reloading only changed files) and
+         answers the report with SQL GROUP BY queries (see sqlite_store.py).
+         --quarantine FILE appends rows that could not be parsed (short rows, non-numeric readings,
+         unreadable dates) to FILE with their line numbers; such rows are always skipped (in every
+         loading mode) and counted on stderr whenever they are read (--state and --db only read new or
+         changed rows).
+         --no-cache always parses the CSV text instead of using the binary cache (see table_cache.py).
+         --engine mmap reads the CSV with the memory-mapped column scanner (see scanner.py).
+         --profile writes stage timings, row counts and allocation counts as JSON to stderr;
+         --profile-out FILE writes them to FILE instead. Without either, AQ_PROFILE=1 profiles to stderr
+         and AQ_PROFILE=FILE to FILE (empty, 0 or false leave profiling off).
+         --aqi computes each day's EPA AQI from PM2.5 and ozone at load time (see aqi.py) and adds AQI
+         rankings to the report (single-process loading only).
+         --cprofile FILE also dumps full cProfile statistics to FILE (read with pstats).
+         serve [CSV files] [--port N] keeps the data loaded and answers report requests over local HTTP,
+         reloading when the files change (see server.py).
 Output: Printed lines to the console.
 Example: python main.py ozone_pm25_data.csv
+Example: python main.py serve ozone_pm25_data.csv --port 8000
+Example: python main.py county1.csv county2.csv --workers 4
 Author: Drew
 """
+import argparse
+import cProfile
+import glob
+import os
 import sys
-from file_handling import ozone_pm25_air_quality
+from file_handling import ozone_pm25_air_quality, ParseReport
+from aggregation import AggregationEngine
+from categories import AQI, BREAKPOINTS
+from ranking import top_k
+from parallel import parallel_aggregate
+from async_loader import load_files
+from incremental import load_state, refresh, save_state
+from sqlite_store import SQLiteStore
+import result_cache
+from result_cache import dataset_fingerprint
+from schema import read_columns
+from instrumentation import profiler, profile_destination, PROFILE_ENV
 from pm25_functions import (
-    calculate_pm25_city_averages,
-    count_unhealthy_pm25_days,
-    rank_cities_by_pm25,
-    get_pm25_statistics,
     get_pm25_category,
     get_pm25_distribution,
 )
 from ozone_functions import (
-    ozone_averages,
-    unhealthy_ozone_days,
-    city_ranks_by_ozone,
-    ozone_statistics,
     ozone_category,
     ozone_distribution,
 )
 
 
-def main(csv_path):
+REPORT_METRICS = [
+    "pm25_statistics", "pm25_averages", "pm25_unhealthy",
+    "ozone_statistics", "ozone_averages", "ozone_unhealthy",
+]
+AQI_METRICS = ["aqi_averages", "aqi_unhealthy"]
+
+
+"""
+Purpose: List the report metrics for a table's pollutant columns beyond PM2.5 and ozone.
+Input type: AirQualityTable (anything else has no extra columns)
+Output type: list[str]
+Example: extra_metrics(table) -> ["no2_averages", "no2_unhealthy"] for a file with an NO2 column
+"""
+def extra_metrics(records):
+    metrics = []
+    for pollutant in getattr(records, "extra_values", ()):
+        if pollutant in BREAKPOINTS:
+            metrics += [pollutant + "_averages", pollutant + "_unhealthy"]
+    return metrics
+
+
+"""
+Purpose: List the report metrics for the pollutant columns beyond PM2.5 and ozone named in any of the files' headers.
+Input type: paths (list[str])
+Output type: list[str] (each pollutant once, in order of first appearance)
+Example: header_metrics(["pm.csv", "no2.csv"]) -> ["no2_averages", "no2_unhealthy"]
+Notes: Read from the headers before loading, so every loader counts a pollutant that only later files have.
+"""
+def header_metrics(paths):
+    metrics = []
+    for path in paths:
+        for pollutant in read_columns(path).pollutants:
+            if pollutant not in ("pm25", "ozone") and pollutant in BREAKPOINTS and pollutant + "_averages" not in metrics:
+                metrics += [pollutant + "_averages", pollutant + "_unhealthy"]
+    return metrics
+
+
+"""
+Purpose: Load the CSV files and compute every total the report needs.
+Input type: paths (list[str]), workers (int), cache (bool), engine (str "csv" or "mmap"), aqi (bool),
+quarantine (str path or None)
+Output type: aggregation.AggregateResult
+Notes: One scan through the engine when workers is 1; otherwise parallel.parallel_aggregate.
+With aqi, the loader fills each record's AQI and the AQI totals are collected in the same scan.
+Extra pollutant columns of any of the files (see header_metrics) are summarized in the same scan too;
+files without such a column simply add no readings of it.
+Malformed rows are skipped (and written to quarantine); when there are any, their count is printed to
+stderr (see print_rejects) so the report itself is unchanged. The same holds for the other loaders.
+"""
+def load_result(paths, workers=1, cache=True, engine="csv", aqi=False, quarantine=None):
+    parse_report = ParseReport()
+    if workers > 1:
+        with profiler.stage("parallel_aggregate"):
+            result = parallel_aggregate(paths, REPORT_METRICS + header_metrics(paths), workers, parse_report,
+                                        quarantine)
+        profiler.count("rows", result.row_count)
+        report_rejects(parse_report, quarantine)
+        return result
+    # One scan computes every total the report needs; later files continue the same running totals
+    metrics = REPORT_METRICS + AQI_METRICS if aqi else REPORT_METRICS
+    aggregator = AggregationEngine(metrics + header_metrics(paths), backend="auto")
+    result = None
+    for path in paths:
+        with profiler.stage("load"):
+            records = ozone_pm25_air_quality(path, cache=cache, engine=engine, aqi=aqi, quarantine=quarantine,
+                                             report=parse_report)
+        profiler.count("rows", len(records))
+        with profiler.stage("aggregate"):
+            if result is None:
+                result = aggregator.run(records)
+            else:
+                aggregator.feed(result, records)
+    report_rejects(parse_report, quarantine)
+    return result
+
+
+"""
+Purpose: Count the skipped rows in the profile and, when there are any, tell the user (see print_rejects).
+Input type: ParseReport, quarantine (str path or None)
+Output type: None
+"""
+def report_rejects(parse_report, quarantine=None):
+    profiler.count("rejected_rows", parse_report.rejected)
+    if parse_report.rejected:
+        print_rejects(parse_report, quarantine)
+
+
+"""
+Purpose: Tell the user (on stderr) how many rows were skipped, why, and how fast the files parsed.
+Input type: ParseReport, quarantine (str path or None)
+Output type: None
+Example: print_rejects(report, "bad.csv") prints
+"Skipped 2 malformed rows (short row: 1, bad number: 1); see bad.csv. Parsed 250000 rows/s."
+Notes: The rate is left out when the loader did not time the parsing (streamed or parallel reads).
+"""
+def print_rejects(parse_report, quarantine=None):
+    reasons = ", ".join(reason + ": " + str(count) for reason, count in parse_report.reasons.items())
+    where = "; see " + quarantine if quarantine is not None else "; use --quarantine FILE to keep them"
+    rate = ""
+    if parse_report.seconds > 0:
+        rate = " Parsed " + str(int(parse_report.rows_per_second())) + " rows/s."
+    sys.stderr.write("Skipped " + str(parse_report.rejected) + " malformed rows (" + reasons + ")" + where
+                     + "." + rate + "\n")
+
+
+"""
+Purpose: Expand glob patterns in the command line paths (plain paths are kept even if missing,
+so a missing file is still reported).
+Input type: list[str]
+Output type: list[str]
+Example: expand_paths(["data/*.csv"]) -> ["data/a.csv", "data/b.csv"]
+"""
+def expand_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+"""
+Purpose: Read every file concurrently and aggregate batches as they arrive (see async_loader.py).
+Input type: paths (list[str]), prefetch (int), quarantine (str path or None)
+Output type: aggregation.AggregateResult
+"""
+def load_async_result(paths, prefetch=4, quarantine=None):
+    parse_report = ParseReport()
+    with profiler.stage("async_load_aggregate"):
+        result = load_files(paths, REPORT_METRICS + header_metrics(paths), prefetch=prefetch, report=parse_report,
+                            quarantine=quarantine)
+    profiler.count("rows", result.row_count)
+    report_rejects(parse_report, quarantine)
+    return result
+
+
+"""
+Purpose: Update the saved running totals with rows appended to the CSV files, and save them again.
+Input type: paths (list[str]), state_path (str), quarantine (str path or None)
+Output type: aggregation.AggregateResult
+"""
+def load_incremental_result(paths, state_path, quarantine=None):
+    parse_report = ParseReport()
+    with profiler.stage("incremental_update"):
+        state = load_state(state_path, REPORT_METRICS + header_metrics(paths))
+        rows_before = state.result.row_count
+        state = refresh(state, paths, parse_report, quarantine)
+        save_state(state, state_path)
+    profiler.count("rows", max(state.result.row_count - rows_before, 0))
+    report_rejects(parse_report, quarantine)
+    return state.result
+
+
+"""
+Purpose: Bring the SQLite store up to date with the CSV files and answer the report with SQL queries.
+Input type: paths (list[str]), db_path (str), engine (str "csv" or "mmap"), aqi (bool),
+quarantine (str path or None)
+Output type: aggregation.AggregateResult
+Notes: Rows are only parsed (and malformed ones reported) for files that changed since they were stored.
+Extra pollutant columns named in the headers (see header_metrics) are stored and reported like in load_result.
+"""
+def load_store_result(paths, db_path, engine="csv", aqi=False, quarantine=None):
+    parse_report = ParseReport()
+    with SQLiteStore(db_path) as store:
+        with profiler.stage("store_load"):
+            for path in paths:
+                store.load_csv(path, engine=engine, aqi=aqi, quarantine=quarantine, report=parse_report)
+        with profiler.stage("store_aggregate"):
+            metrics = REPORT_METRICS + AQI_METRICS if aqi else REPORT_METRICS
+            result = AggregationEngine(metrics + header_metrics(paths)).run(store)
+    profiler.count("rows", result.row_count)
+    report_rejects(parse_report, quarantine)
+    return result
+
+
+"""
+Purpose: Return the report's rankings as data, memoized in a result cache, for callers (like a
+dashboard) that ask about the same files again and again with different top-k and city filters.
+Input type: csv_path (str or list[str], glob patterns allowed), k (int), cities (iterable of str or None
+for every city), cache (result_cache.ResultCache or None for result_cache.default_cache), engine (str)
+Output type: dict with "records", "cities", and lists of (city, value) for "pm25_worst", "ozone_worst",
+"pm25_unhealthy" and "ozone_unhealthy"
+Example: summarize("ozone_pm25_data.csv", k=5, cities=["Fresno", "Bakersfield"])["pm25_worst"]
+Notes: The aggregate totals are cached per dataset, so a new k or filter only re-ranks; an identical
+request is one cache lookup. Changing any file changes the fingerprint, so stale answers are never used.
+"""
+def summarize(csv_path, k=3, cities=None, cache=None, engine="csv"):
+    cache = result_cache.default_cache if cache is None else cache
+    paths = expand_paths([csv_path] if isinstance(csv_path, str) else csv_path)
+    dataset = dataset_fingerprint(paths)
+    wanted = None if cities is None else tuple(sorted(set(cities)))
+    return cache.get_or_compute(("summary", dataset, k, wanted),
+                                lambda: _summary(cache, paths, dataset, k, wanted, engine))
+
+
+def _summary(cache, paths, dataset, k, wanted, engine):
+    result = cache.get_or_compute(("aggregate", dataset, tuple(REPORT_METRICS)),
+                                  lambda: load_result(paths, engine=engine))
+    return rank_summary(result, k, wanted)
+
+
+"""
+Purpose: Rank an aggregate result for summarize and the report server.
+Input type: aggregation.AggregateResult (with REPORT_METRICS), k (int), cities (collection of str or None)
+Output type: dict (see summarize)
+"""
+def rank_summary(result, k=3, cities=None):
+    def keep(mapping):
+        if cities is None:
+            return mapping
+        return {city: value for city, value in mapping.items() if city in cities}
+
+    pm25_avgs = keep(result.city_averages("pm25"))
+    ozone_avgs = keep(result.city_averages("ozone"))
+    return {
+        "records": result.row_count,
+        "cities": len(pm25_avgs),
+        "pm25_worst": top_k(pm25_avgs, k, key=lambda data: data["avg_pm25"]),
+        "ozone_worst": top_k(ozone_avgs, k, key=lambda data: data["avg_ozone"]),
+        "pm25_unhealthy": top_k(keep(result.unhealthy_days("pm25")), k),
+        "ozone_unhealthy": top_k(keep(result.unhealthy_days("ozone")), k),
+    }
+
+
+def main(csv_path, workers=1, cache=True, state_path=None, engine="csv", use_async=False, prefetch=4, aqi=False,
+         db_path=None, quarantine=None):
+    paths = expand_paths([csv_path] if isinstance(csv_path, str) else csv_path)
+    if not paths:
+        print("No CSV files match: " + str(csv_path))
+        return
     try:
-        records = ozone_pm25_air_quality(csv_path)
-    except FileNotFoundError:
-        print("File not found: " + csv_path)
+        if db_path is not None:
+            result = load_store_result(paths, db_path, engine, aqi, quarantine)
+        elif state_path is not None:
+            result = load_incremental_result(paths, state_path, quarantine)
+        elif use_async:
+            result = load_async_result(paths, prefetch, quarantine)
+        else:
+            result = load_result(paths, workers, cache, engine, aqi, quarantine)
+    except FileNotFoundError as error:
+        print("File not found: " + str(error.filename))
         return
+    print_report(result)
 
-    pm25_stats = get_pm25_statistics(records)
-    ozone_stats = ozone_statistics(records)
-    pm25_avgs = calculate_pm25_city_averages(records)
-    ozone_avgs = ozone_averages(records)
 
-    pm25_ranked = rank_cities_by_pm25(pm25_avgs)
-    ozone_ranked = city_ranks_by_ozone(ozone_avgs)
+"""
+Purpose: Print the report for an aggregate result.
+Input type: aggregation.AggregateResult (with REPORT_METRICS)
+Output type: None (prints)
+Notes: The sections of a pollutant no file had a column for (or only missing readings) are left out.
+"""
+def print_report(result):
+    has_pm25 = result.has_values("pm25")
+    has_ozone = result.has_values("ozone")
     pm25_top3 = []
     ozone_top3 = []
-    for i in range(len(pm25_ranked)):
-        if i < 3:
-            pm25_top3.append(pm25_ranked[i])
-    for i in range(len(ozone_ranked)):
-        if i < 3:
-            ozone_top3.append(ozone_ranked[i])
+    if has_pm25:
+        pm25_stats = result.statistics("pm25")
+        pm25_avgs = result.city_averages("pm25")
+        with profiler.stage("rank_pm25_averages"):
+            pm25_top3 = top_k(pm25_avgs, 3, key=lambda data: data["avg_pm25"])
+    if has_ozone:
+        ozone_stats = result.statistics("ozone")
+        ozone_avgs = result.city_averages("ozone")
+        with profiler.stage("rank_ozone_averages"):
+            ozone_top3 = top_k(ozone_avgs, 3, key=lambda data: data["avg_ozone"])
 
     # Cleanest lists removed to keep output minimal
 
-    print("Records: " + str(pm25_stats['count']) + ", Cities: " + str(len(pm25_avgs)))
-    print("PM2.5 - min/max/avg: " + str(pm25_stats))
-    print("Ozone  - min/max/avg: " + str(ozone_stats))
+    if has_pm25:
+        print("Records: " + str(pm25_stats['count']) + ", Cities: " + str(len(pm25_avgs)))
+        print("PM2.5 - min/max/avg: " + str(pm25_stats))
+    elif has_ozone:
+        print("Records: " + str(ozone_stats['count']) + ", Cities: " + str(len(ozone_avgs)))
+    else:
+        print("Records: " + str(result.row_count))
+    if has_ozone:
+        print("Ozone  - min/max/avg: " + str(ozone_stats))
 
-    print("\nWorst 3 cities by average PM2.5:")
-    for city, avg_pm in pm25_top3:
-        print(" - " + str(city) + ": " + str(round(avg_pm, 3)) + " ug/m3 (" + str(get_pm25_category(avg_pm)) + ")")
+    if has_pm25:
+        print("\nWorst 3 cities by average PM2.5:")
+        for city, avg_pm in pm25_top3:
+            print(" - " + str(city) + ": " + str(round(avg_pm, 3)) + " ug/m3 (" + str(get_pm25_category(avg_pm)) + ")")
 
-    print("\nWorst 3 cities by average Ozone:")
-    for city, avg_o3 in ozone_top3:
-        print(" - " + str(city) + ": " + str(round(avg_o3, 3)) + " ppm (" + str(ozone_category(avg_o3)) + ")")
+    if has_ozone:
+        print("\nWorst 3 cities by average Ozone:")
+        for city, avg_o3 in ozone_top3:
+            print(" - " + str(city) + ": " + str(round(avg_o3, 3)) + " ppm (" + str(ozone_category(avg_o3)) + ")")
 
-    pm25_unhealthy = count_unhealthy_pm25_days(records)
-    ozone_unhealthy = unhealthy_ozone_days(records)
     # Top cities by unhealthy days
-    top_pm25_unhealthy = []
-    for city in pm25_unhealthy:
-        top_pm25_unhealthy.append((city, pm25_unhealthy[city]))
-    # Sort descending
-    for i in range(len(top_pm25_unhealthy)):
-        for j in range(i + 1, len(top_pm25_unhealthy)):
-            if top_pm25_unhealthy[i][1] < top_pm25_unhealthy[j][1]:
-                top_pm25_unhealthy[i], top_pm25_unhealthy[j] = top_pm25_unhealthy[j], top_pm25_unhealthy[i]
-    tmp_pm_unhealthy = []
-    for i in range(len(top_pm25_unhealthy)):
-        if i < 3:
-            tmp_pm_unhealthy.append(top_pm25_unhealthy[i])
-    top_pm25_unhealthy = tmp_pm_unhealthy
-    
-    top_ozone_unhealthy = []
-    for city in ozone_unhealthy:
-        top_ozone_unhealthy.append((city, ozone_unhealthy[city]))
-    # Sort descending
-    for i in range(len(top_ozone_unhealthy)):
-        for j in range(i + 1, len(top_ozone_unhealthy)):
-            if top_ozone_unhealthy[i][1] < top_ozone_unhealthy[j][1]:
-                top_ozone_unhealthy[i], top_ozone_unhealthy[j] = top_ozone_unhealthy[j], top_ozone_unhealthy[i]
-    tmp_o3_unhealthy = []
-    for i in range(len(top_ozone_unhealthy)):
-        if i < 3:
-            tmp_o3_unhealthy.append(top_ozone_unhealthy[i])
-    top_ozone_unhealthy = tmp_o3_unhealthy
-
-    print("\nTop 3 cities by unhealthy PM2.5 days:")
-    for city, days in top_pm25_unhealthy:
-        print(" - " + str(city) + ": " + str(days) + " days")
+    if has_pm25:
+        with profiler.stage("rank_pm25_unhealthy"):
+            top_pm25_unhealthy = top_k(result.unhealthy_days("pm25"), 3)
+        print("\nTop 3 cities by unhealthy PM2.5 days:")
+        for city, days in top_pm25_unhealthy:
+            print(" - " + str(city) + ": " + str(days) + " days")
 
-    print("\nTop 3 cities by unhealthy Ozone days:")
-    for city, days in top_ozone_unhealthy:
-        print(" - " + str(city) + ": " + str(days) + " days")
+    if has_ozone:
+        with profiler.stage("rank_ozone_unhealthy"):
+            top_ozone_unhealthy = top_k(result.unhealthy_days("ozone"), 3)
+        print("\nTop 3 cities by unhealthy Ozone days:")
+        for city, days in top_ozone_unhealthy:
+            print(" - " + str(city) + ": " + str(days) + " days")
+
+    if "aqi_averages" in result.metrics and result.has_values("aqi"):
+        print_aqi_report(result)
+    print_extra_report(result)
 
     # Category distributions across all daily records
     # Category distributions removed to keep output short
 
     # Brief, data-driven insight
     # Insight block removed for minimal output
+    if not (has_pm25 or has_ozone):
+        return
     print("\nSocial Responsibility Insight:")
     # Build short lists for mention
     pm_focus = []
@@ -121,13 +389,113 @@ def main(csv_path):
         o3_focus.append(ozone_top3[i][0])
     pm_list = ", ".join(pm_focus)
     o3_list = ", ".join(o3_focus)
-    print(" - Higher particulate (PM2.5) averages in: " + pm_list)
-    print(" - Higher ozone averages in: " + o3_list)
+    if has_pm25:
+        print(" - Higher particulate (PM2.5) averages in: " + pm_list)
+    if has_ozone:
+        print(" - Higher ozone averages in: " + o3_list)
     print(" - These communities may face greater respiratory and heart stress on bad air days.")
     print(" - Results suggest focusing mitigation (emissions cuts, wildfire smoke response, alerts) on these areas.")
     print(" - Even simple analysis helps highlight where cleaner air efforts could have more impact.")
 
 
-if __name__ == "__main__":
-    csv_path = sys.argv[1] if len(sys.argv) > 1 else "ozone_pm25_data.csv"
-    main(csv_path)
+"""
+Purpose: Print the AQI rankings (only when the result has AQI totals, see --aqi).
+Input type: aggregation.AggregateResult
+Output type: None (prints)
+"""
+def print_aqi_report(result):
+    with profiler.stage("rank_aqi_averages"):
+        aqi_top3 = top_k(result.city_averages("aqi"), 3, key=lambda data: data["avg_aqi"])
+    with profiler.stage("rank_aqi_unhealthy"):
+        top_aqi_unhealthy = top_k(result.unhealthy_days("aqi"), 3)
+
+    print("\nWorst 3 cities by average AQI:")
+    for city, avg_aqi in aqi_top3:
+        print(" - " + str(city) + ": " + str(round(avg_aqi, 1)) + " (" + AQI.label(avg_aqi) + ")")
+
+    print("\nTop 3 cities by unhealthy AQI days:")
+    for city, days in top_aqi_unhealthy:
+        print(" - " + str(city) + ": " + str(days) + " days")
+
+
+"""
+Purpose: Print rankings for the pollutants beyond PM2.5, ozone and AQI that the result has totals for.
+Input type: aggregation.AggregateResult
+Output type: None (prints; nothing when the files only have PM2.5 and ozone)
+"""
+def print_extra_report(result):
+    for pollutant in result.accumulators:
+        if (pollutant in ("pm25", "ozone", "aqi") or pollutant + "_averages" not in result.metrics
+                or not result.has_values(pollutant)):
+            continue
+        name = pollutant.upper()
+        breakpoints = BREAKPOINTS[pollutant]
+        with profiler.stage("rank_" + pollutant + "_averages"):
+            top3 = top_k(result.city_averages(pollutant), 3, key=lambda data: data["avg_" + pollutant])
+        with profiler.stage("rank_" + pollutant + "_unhealthy"):
+            top_unhealthy = top_k(result.unhealthy_days(pollutant), 3)
+
+        print("\nWorst 3 cities by average " + name + ":")
+        for city, average in top3:
+            print(" - " + str(city) + ": " + str(round(average, 3)) + " (" + breakpoints.label(average) + ")")
+
+        print("\nTop 3 cities by unhealthy " + name + " days:")
+        for city, days in top_unhealthy:
+            print(" - " + str(city) + ": " + str(days) + " days")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Summarize daily PM2.5 and ozone readings.")
+    parser.add_argument("csv_paths", nargs="*", default=["ozone_pm25_data.csv"])
+    parser.add_argument("--workers", type=int, default=1, help="processes used to parse and aggregate")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="read all files concurrently and aggregate batches as they arrive")
+    parser.add_argument("--prefetch", type=int, default=4, help="parsed batches allowed to wait (with --async)")
+    parser.add_argument("--state", dest="state_path", default=None,
+                        help="JSON file of running totals; only rows appended since the last run are read")
+    parser.add_argument("--db", dest="db_path", default=None,
+                        help="SQLite database that keeps the loaded rows and answers the report with SQL")
+    parser.add_argument("--quarantine", default=None,
+                        help="CSV file that collects rows which could not be parsed, with their line numbers")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="parse the CSV text even if a binary cache exists")
+    parser.add_argument("--engine", choices=["csv", "mmap"], default="csv",
+                        help="CSV reader: csv.reader or the memory-mapped column scanner")
+    parser.add_argument("--aqi", action="store_true",
+                        help="compute each day's AQI from PM2.5 and ozone and rank cities by it")
+    parser.add_argument("--profile", action="store_true", help="write a JSON timing summary to stderr")
+    parser.add_argument("--profile-out", dest="profile_out", default=None,
+                        help="write the JSON timing summary to this file instead of stderr")
+    parser.add_argument("--cprofile", default=None, help="dump cProfile statistics to this file")
+    args = parser.parse_args(argv)
+    if args.aqi and not args.db_path and (args.workers > 1 or args.use_async or args.state_path):
+        parser.error("--aqi works with single-process loading only (not --workers, --async or --state)")
+    # args.profile becomes where the summary goes: None (off), "-" (stderr) or a file path
+    if args.profile_out is not None:
+        args.profile = args.profile_out
+    elif args.profile:
+        args.profile = "-"
+    else:
+        args.profile = profile_destination(os.environ.get(PROFILE_ENV))
+    return args
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["serve"]:
+    # Imported here because server.py imports this module for the report helpers
+    from server import serve_main
+    serve_main(sys.argv[2:])
+elif __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.profile:
+        profiler.enable()
+    run_profile = cProfile.Profile() if args.cprofile else None
+    if run_profile is not None:
+        run_profile.enable()
+    main(args.csv_paths, workers=args.workers, cache=args.cache, state_path=args.state_path,
+         engine=args.engine, use_async=args.use_async, prefetch=args.prefetch, aqi=args.aqi,
+         db_path=args.db_path, quarantine=args.quarantine)
+    if run_profile is not None:
+        run_profile.disable()
+        run_profile.dump_stats(args.cprofile)
+    if args.profile:
+        profiler.write_summary(args.profile)
@@ -0,0 +1,162 @@
+"""NumPy Backend
+Purpose: Vectorized versions of the per-record loops, used when NumPy is installed and the
+records are an AirQualityTable. Per-city totals use np.bincount group reductions and categories
+use np.searchsorted over the category limits. Results are identical to the pure-Python path:
+sums are exact (see exact_sum.py), built from the count of each distinct (city, value) pair.
+Notes: NumPy is optional. When it is missing HAVE_NUMPY is False and callers fall back to Python.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from categories import NO_DATA
+from exact_sum import exact
+from sketches import KLLSketch
+
+HAVE_NUMPY = np is not None
+
+
+"""
+Purpose: Return one pollutant column of a table as a float64 NumPy array (no copy; NaN = missing).
+Input type: AirQualityTable, str pollutant ("pm25", "ozone", "aqi" or another column like "no2")
+Output type: numpy.ndarray
+Example: column(table, "pm25") -> array([10., 20., nan])
+"""
+def column(table, pollutant):
+    return np.frombuffer(table.column(pollutant), dtype=np.float64)
+
+
+"""
+Purpose: Return the table's integer city codes as a NumPy array (no copy).
+Input type: AirQualityTable
+Output type: numpy.ndarray of C ints
+Example: city_codes(table) -> array([0, 0, 1], dtype=int32)
+"""
+def city_codes(table):
+    return np.frombuffer(table.city_ids, dtype=np.intc)
+
+
+"""
+Purpose: Give the category index of every value using binary search over the category limits.
+Index i means "value <= limits[i]"; len(limits) means above every limit.
+Input type: numpy.ndarray of floats, sequence of float limits (ascending)
+Output type: numpy.ndarray of ints
+Example: category_indexes(np.array([8.0, 25.0, 60.0]), [12, 35.4, 55.4]) -> array([0, 1, 3])
+"""
+def category_indexes(values, limits):
+    return np.searchsorted(np.asarray(limits, dtype=np.float64), values, side="left")
+
+
+"""
+Purpose: Give the category label of every value (NaN becomes "No Data").
+Input type: numpy.ndarray of floats, categories.Breakpoints
+Output type: numpy.ndarray of str labels
+Example: categorize(np.array([8.0, np.nan]), categories.PM25) -> array(["Good", "No Data"])
+"""
+def categorize(values, breakpoints):
+    labels = list(breakpoints.labels) + [NO_DATA]
+    indexes = category_indexes(values, breakpoints.limits)
+    indexes[np.isnan(values)] = len(labels) - 1
+    return np.asarray(labels, dtype=object)[indexes]
+
+
+def _first_seen_order(keys):
+    """Return the distinct keys ordered by where each first appears (dict insertion order)."""
+    distinct, first = np.unique(keys, return_index=True)
+    return distinct[np.argsort(first, kind="stable")]
+
+
+"""
+Purpose: Fill aggregation accumulators straight from a table's columns instead of looping over records.
+Input type: dict pollutant -> aggregation.PollutantAccumulator, AirQualityTable
+Output type: None (the accumulators are filled in place)
+Example: fill_accumulators(engine.accumulators(), table)
+"""
+def fill_accumulators(accumulators, table):
+    names = table.city_names
+    all_codes = city_codes(table)
+    for pollutant in accumulators:
+        if not table.has_column(pollutant):
+            continue
+        accumulator = accumulators[pollutant]
+        values = column(table, pollutant)
+        present = ~np.isnan(values)
+        values = values[present]
+        codes = all_codes[present]
+        if len(values) == 0:
+            continue
+        accumulator.count = int(len(values))
+        if accumulator.track_sums:
+            sums = _exact_sums(codes, values, len(names))
+            accumulator.total = sum(sums)
+        # Whole-number columns (AQI) come back as ints, like the record views give them
+        as_value = int if accumulator.integer else float
+        accumulator.low = as_value(values.min())
+        accumulator.high = as_value(values.max())
+        if accumulator.track_cities:
+            size = len(names)
+            counts = np.bincount(codes, minlength=size)
+            lows = np.full(size, np.inf)
+            highs = np.full(size, -np.inf)
+            np.minimum.at(lows, codes, values)
+            np.maximum.at(highs, codes, values)
+            for code in _first_seen_order(codes).tolist():
+                accumulator.cities[names[code]] = [
+                    sums[code], int(counts[code]), as_value(lows[code]), as_value(highs[code])
+                ]
+        if accumulator.track_unhealthy:
+            bad_codes = codes[values >= accumulator.unhealthy_at]
+            if len(bad_codes) > 0:
+                bad_counts = np.bincount(bad_codes)
+                for code in _first_seen_order(bad_codes).tolist():
+                    accumulator.unhealthy[names[code]] = int(bad_counts[code])
+        if accumulator.track_distribution:
+            labels = accumulator.breakpoints.labels
+            indexes = category_indexes(values, accumulator.breakpoints.limits)
+            label_counts = np.bincount(indexes, minlength=len(labels))
+            for index in _first_seen_order(indexes).tolist():
+                accumulator.distribution[labels[index]] = int(label_counts[index])
+        if accumulator.track_quantiles:
+            _fill_sketches(accumulator, names, codes, values)
+        if accumulator.track_distinct:
+            _fill_counters(accumulator, table, codes, present)
+
+
+def _exact_sums(codes, values, size):
+    """Exact sum per city code: each distinct (code, value) pair is converted once and scaled by its count."""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    width = len(distinct)
+    pairs, repeats = np.unique(codes.astype(np.int64) * width + inverse.reshape(-1), return_counts=True)
+    units = [exact(value) for value in distinct.tolist()]
+    sums = [0] * size
+    for pair, repeat in zip(pairs.tolist(), repeats.tolist()):
+        code, index = divmod(pair, width)
+        sums[code] += repeat * units[index]
+    return sums
+
+
+def _fill_sketches(accumulator, names, codes, values):
+    """Feed the quantile sketches whole runs of values, each city's in row order (same result as add)."""
+    # Sketches take Python floats, so integer columns (AQI) go in as ints like the record views
+    as_list = (lambda array: array.astype(np.int64).tolist()) if accumulator.integer else np.ndarray.tolist
+    accumulator.sketch.extend(as_list(values))
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    sorted_values = values[order]
+    for code in _first_seen_order(codes).tolist():
+        start, end = np.searchsorted(sorted_codes, [code, code + 1])
+        sketch = accumulator.city_sketches.get(names[code])
+        if sketch is None:
+            sketch = accumulator.city_sketches[names[code]] = KLLSketch()
+        sketch.extend(as_list(sorted_values[start:end]))
+
+
+def _fill_counters(accumulator, table, codes, present):
+    """Distinct counters ignore repeats, so each (city, date) pair only needs adding once."""
+    date_codes = np.frombuffer(table.date_ids, dtype=np.intc)[present]
+    pairs = codes.astype(np.int64) * len(table.date_names) + date_codes
+    distinct_pairs = _first_seen_order(pairs)
+    for pair in distinct_pairs.tolist():
+        city, date = divmod(pair, len(table.date_names))
+        accumulator.add_distinct(table.city_names[city], table.date_names[date])
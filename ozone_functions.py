@@ -1,10 +1,15 @@
 """
 Ozone Analysis Functions
 Functions for analyzing ground-level ozone data.
+Functions that take records accept any iterable of AirQuality (a list, an AirQualityTable,
+or a stream from file_handling.iter_air_quality) and read it only once.
 Author: Shishir
 """
 
 from data import AirQuality
+from aggregation import AggregationEngine
+from ranking import rank_all
+from categories import OZONE
 
 """
 Purpose: When given a list of AirQuality records, return a dictionary mapping each city to its average ozone level and record count.
@@ -14,22 +19,7 @@ Example input: [AirQuality("LA", "01/01/25", 10.0, 0.060), AirQuality("LA", "01/
 Output given the example input: {"LA": {"avg_ozone": 0.055, "ozone_count": 2}, "SF": {"avg_ozone": 0.040, "ozone_count": 1}}
 """
 def ozone_averages(records):
-    city_data = {}
-    for record in records:
-        if record.ozone is not None:
-            if record.city not in city_data:
-                city_data[record.city] = {"ozone_sum": 0, "ozone_count": 0}
-            city_data[record.city]["ozone_sum"] += record.ozone
-            city_data[record.city]["ozone_count"] += 1
-
-    city_averages = {}
-    for city in city_data:
-        data = city_data[city]
-        city_averages[city] = {
-            "avg_ozone": data["ozone_sum"] / data["ozone_count"],
-            "ozone_count": data["ozone_count"]
-        }
-    return city_averages
+    return AggregationEngine(["ozone_averages"]).run(records).city_averages("ozone")
 
 
 """
@@ -40,13 +30,7 @@ Example input: [AirQuality("LA", "01/01/25", 10.0, 0.090), AirQuality("LA", "01/
 Output given the example input: {"LA": 1, "SF": 1}
 """
 def unhealthy_ozone_days(records):
-    city_unhealthy = {}
-    for record in records:
-        if record.ozone_unhealthy():
-            if record.city not in city_unhealthy:
-                city_unhealthy[record.city] = 0
-            city_unhealthy[record.city] += 1
-    return city_unhealthy
+    return AggregationEngine(["ozone_unhealthy"]).run(records).unhealthy_days("ozone")
 
 
 """
@@ -57,17 +41,7 @@ Example input: {"LA": {"avg_ozone": 0.060}, "SF": {"avg_ozone": 0.040}, "SD": {"
 Output given the example input: [("LA", 0.060), ("SD", 0.050), ("SF", 0.040)]
 """
 def city_ranks_by_ozone(city_averages):
-    cities_with_ozone = []
-    for city in city_averages:
-        data = city_averages[city]
-        cities_with_ozone.append((city, data["avg_ozone"]))
-
-    # Bubble sort descending by average ozone
-    for i in range(len(cities_with_ozone)):
-        for j in range(i + 1, len(cities_with_ozone)):
-            if cities_with_ozone[i][1] < cities_with_ozone[j][1]:
-                cities_with_ozone[i], cities_with_ozone[j] = cities_with_ozone[j], cities_with_ozone[i]
-    return cities_with_ozone
+    return rank_all(city_averages, key=lambda data: data["avg_ozone"])
 
 
 """
@@ -78,16 +52,7 @@ Example input: [AirQuality("LA", "01/01/25", 10.0, 0.040), AirQuality("LA", "01/
 Output given the example input: {"min": 0.040, "max": 0.060, "avg": 0.050, "count": 3}
 """
 def ozone_statistics(records):
-    ozone_values = []
-    for record in records:
-        if record.ozone is not None:
-            ozone_values.append(record.ozone)
-    return {
-        "min": min(ozone_values),
-        "max": max(ozone_values),
-        "avg": sum(ozone_values) / len(ozone_values),
-        "count": len(ozone_values)
-    }
+    return AggregationEngine(["ozone_statistics"]).run(records).statistics("ozone")
 
 
 """
@@ -98,16 +63,7 @@ Example input: 0.050 -> "Good"
 Example input: 0.075 -> "Moderate"
 """
 def ozone_category(value):
-    if value is None:
-        return "No Data"
-    elif value <= 0.054:
-        return "Good"
-    elif value <= 0.070:
-        return "Moderate"
-    elif value <= 0.085:
-        return "Unhealthy for Sensitive Groups"
-    else:
-        return "Unhealthy"
+    return OZONE.label(value)
 
 
 """
@@ -118,11 +74,16 @@ Example input: [AirQuality("A", "d", 10.0, 0.040), AirQuality("A", "d2", 11.0, 0
 Output given the example input: {"Good": 1, "Moderate": 1, "Unhealthy": 1}
 """
 def ozone_distribution(records):
-    distribution = {}
-    for record in records:
-        if record.ozone is not None:
-            category = record.ozone_level_category()
-            if category not in distribution:
-                distribution[category] = 0
-            distribution[category] += 1
-    return distribution
\ No newline at end of file
+    return AggregationEngine(["ozone_distribution"]).run(records).distribution("ozone")
+
+
+"""
+Purpose: When given a list of AirQuality records, return approximate ozone quantiles (by default the median and 98th percentile) overall and for each city, using bounded-memory sketches (see sketches.py).
+Input type: list[AirQuality], fractions (list of floats 0..1)
+Output type: dict with "overall" (dict fraction -> value) and "cities" (dict city -> dict fraction -> value)
+Example input: [AirQuality("A", "d", 10.0, 0.040), AirQuality("A", "d2", 11.0, 0.075), AirQuality("B", "d", 8.0, 0.090)]
+Output given the example input: {"overall": {0.5: 0.075, 0.98: 0.090}, "cities": {"A": {0.5: 0.040, 0.98: 0.075}, "B": {0.5: 0.090, 0.98: 0.090}}}
+"""
+def ozone_quantiles(records, fractions=(0.5, 0.98)):
+    result = AggregationEngine(["ozone_quantiles"]).run(records)
+    return {"overall": result.quantiles("ozone", fractions), "cities": result.city_quantiles("ozone", fractions)}
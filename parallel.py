@@ -0,0 +1,92 @@
+"""Parallel Aggregation
+Purpose: Parse and aggregate large or many CSV files on several processes.
+The input is split into shards (whole files, or byte ranges that start and end on line boundaries),
+each shard is parsed and aggregated in a ProcessPoolExecutor worker, and only the compact per-city
+totals come back to be merged in shard order.
+Example: result = parallel_aggregate(["a.csv", "b.csv"], ["pm25_averages"], workers=4)
+Notes: Rows are split on newlines, so quoted fields must not contain line breaks. Malformed rows are
+skipped like parse_csv does; workers send them back with their totals, and the parent writes them to
+the quarantine file in shard order.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregation import AggregationEngine
+from file_handling import iter_byte_range, write_quarantine, ParseReport
+
+"""
+Purpose: Split one CSV file (after its header) into about `shards` byte ranges that each start on a line.
+Input type: path (str), shards (int)
+Output type: list[tuple] of (start, end) byte offsets
+Example: byte_ranges("big.csv", 3) -> [(57, 41000), (41000, 82013), (82013, 123000)]
+"""
+def byte_ranges(path, shards):
+    size = os.path.getsize(path)
+    with open(path, "rb") as handle:
+        handle.readline()
+        first = handle.tell()
+        starts = [first]
+        step = max((size - first) // max(shards, 1), 1)
+        for i in range(1, shards):
+            target = first + i * step
+            if target <= starts[-1]:
+                continue
+            if target >= size:
+                break
+            # Move to the start of the next full line
+            handle.seek(target - 1)
+            handle.readline()
+            position = handle.tell()
+            if position > starts[-1] and position < size:
+                starts.append(position)
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+def _aggregate_shard(shard):
+    """Worker: aggregate one (path, start, end, metrics) shard and return the small result, with the
+    shard's ParseReport and rejected rows."""
+    path, start, end, metrics = shard
+    report = ParseReport()
+    rejects = []
+    result = AggregationEngine(metrics, backend="python").run(iter_byte_range(path, start, end, report, rejects))
+    return result, report, rejects
+
+
+"""
+Purpose: Split the files into shards for `workers` processes.
+Input type: paths (list[str]), metrics (list[str]), workers (int)
+Output type: list[tuple] of (path, start, end, metrics), in file order then byte order
+Notes: With at least as many files as workers each file is one shard; otherwise big files are cut into byte ranges.
+"""
+def plan_shards(paths, metrics, workers):
+    per_file = 1 if len(paths) >= workers else -(-workers // len(paths))
+    shards = []
+    for path in paths:
+        for start, end in byte_ranges(path, per_file):
+            shards.append((path, start, end, list(metrics)))
+    return shards
+
+
+"""
+Purpose: Aggregate CSV files across `workers` processes and merge the partial results.
+Input type: paths (list[str]), metrics (list[str] of AggregationEngine metric names), workers (int),
+report (file_handling.ParseReport or None: receives the row and reject counts),
+quarantine (str path or None: CSV that collects the rejected rows, see file_handling.write_quarantine)
+Output type: aggregation.AggregateResult (same answers as a serial AggregationEngine run over the files in order)
+Example: parallel_aggregate(["ozone_pm25_data.csv"], ["pm25_statistics"], 4).statistics("pm25")
+"""
+def parallel_aggregate(paths, metrics, workers, report=None, quarantine=None):
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(2, "No such file or directory", path)
+    shards = plan_shards(paths, metrics, workers)
+    result = AggregationEngine(metrics).run([])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard, (partial, shard_report, rejects) in zip(shards, executor.map(_aggregate_shard, shards)):
+            result.merge(partial)
+            if report is not None:
+                report.merge(shard_report)
+            if rejects and quarantine is not None:
+                write_quarantine(quarantine, shard[0], rejects)
+    return result
@@ -1,10 +1,15 @@
 """
 PM2.5 Analysis Functions
 Functions for analyzing PM2.5 air quality data.
+Functions that take records accept any iterable of AirQuality (a list, an AirQualityTable,
+or a stream from file_handling.iter_air_quality) and read it only once.
 Author: Drew
 """
 
 from data import AirQuality
+from aggregation import AggregationEngine
+from ranking import rank_all
+from categories import PM25
 
 
 """
@@ -15,24 +20,7 @@ Example input: [AirQuality("LA", "01/01/25", 15.0, 0.05), AirQuality("LA", "01/0
 Output given the example input: {"LA": {"avg_pm25": 17.5, "pm25_count": 2}, "SF": {"avg_pm25": 10.0, "pm25_count": 1}}
 """
 def calculate_pm25_city_averages(records):
-    city_data = {}
-    
-    for record in records:
-        if record.pm25 is not None:
-            if record.city not in city_data:
-                city_data[record.city] = {"pm25_sum": 0, "pm25_count": 0}
-            city_data[record.city]["pm25_sum"] += record.pm25
-            city_data[record.city]["pm25_count"] += 1
-    
-    city_averages = {}
-    for city in city_data:
-        data = city_data[city]
-        city_averages[city] = {
-            "avg_pm25": data["pm25_sum"] / data["pm25_count"],
-            "pm25_count": data["pm25_count"]
-        }
-    
-    return city_averages
+    return AggregationEngine(["pm25_averages"]).run(records).city_averages("pm25")
 
 
 """
@@ -43,15 +31,7 @@ Example input: [AirQuality("LA", "01/01/25", 60.0, 0.07), AirQuality("LA", "01/0
 Output given the example input: {"LA": 2}
 """
 def count_unhealthy_pm25_days(records):
-    city_unhealthy = {}
-    
-    for record in records:
-        if record.pm_unhealthy():
-            if record.city not in city_unhealthy:
-                city_unhealthy[record.city] = 0
-            city_unhealthy[record.city] += 1
-    
-    return city_unhealthy
+    return AggregationEngine(["pm25_unhealthy"]).run(records).unhealthy_days("pm25")
 
 
 """
@@ -62,18 +42,7 @@ Example input: {"LA": {"avg_pm25": 25.0}, "SF": {"avg_pm25": 10.0}, "SD": {"avg_
 Output given the example input: [("LA", 25.0), ("SD", 15.0), ("SF", 10.0)]
 """
 def rank_cities_by_pm25(city_averages):
-    cities_with_pm25 = []
-    for city in city_averages:
-        data = city_averages[city]
-        cities_with_pm25.append((city, data["avg_pm25"]))
-    
-    # Sort by avg_pm25 descending (worst first)
-    for i in range(len(cities_with_pm25)):
-        for j in range(i + 1, len(cities_with_pm25)):
-            if cities_with_pm25[i][1] < cities_with_pm25[j][1]:
-                cities_with_pm25[i], cities_with_pm25[j] = cities_with_pm25[j], cities_with_pm25[i]
-    
-    return cities_with_pm25
+    return rank_all(city_averages, key=lambda data: data["avg_pm25"])
 
 
 """
@@ -86,14 +55,7 @@ Example input: 8.0
 Output given the example input: "Good"
 """
 def get_pm25_category(value):
-    if value <= 12:
-        return "Good"
-    elif value <= 35.4:
-        return "Moderate"
-    elif value <= 55.4:
-        return "Unhealthy for Sensitive Groups"
-    else:
-        return "Unhealthy"
+    return PM25.label(value)
 
 
 """
@@ -104,17 +66,7 @@ Example input: [AirQuality("LA", "01/01/25", 10.0, 0.05), AirQuality("LA", "01/0
 Output given the example input: {"min": 10.0, "max": 30.0, "avg": 20.0, "count": 3}
 """
 def get_pm25_statistics(records):
-    pm25_values = []
-    for record in records:
-        if record.pm25 is not None:
-            pm25_values.append(record.pm25)
-    
-    return {
-        "min": min(pm25_values),
-        "max": max(pm25_values),
-        "avg": sum(pm25_values) / len(pm25_values),
-        "count": len(pm25_values)
-    }
+    return AggregationEngine(["pm25_statistics"]).run(records).statistics("pm25")
 
 
 """
@@ -125,13 +77,16 @@ Example input: [AirQuality("LA", "01/01/25", 8.0, 0.05), AirQuality("LA", "01/02
 Output given the example input: {"Good": 1, "Moderate": 1, "Unhealthy for Sensitive Groups": 0, "Unhealthy": 1}
 """
 def get_pm25_distribution(records):
-    distribution = {}
-    
-    for record in records:
-        if record.pm25 is not None:
-            category = record.pm_level_category()
-            if category not in distribution:
-                distribution[category] = 0
-            distribution[category] += 1
-    
-    return distribution
+    return AggregationEngine(["pm25_distribution"]).run(records).distribution("pm25")
+
+
+"""
+Purpose: This function, when given a list of AirQuality records, returns approximate PM2.5 quantiles (by default the median and 98th percentile) overall and for each city, using bounded-memory sketches (see sketches.py).
+Input type: list[AirQuality], fractions (list of floats 0..1)
+Output type: dict with "overall" (dict fraction -> value) and "cities" (dict city -> dict fraction -> value)
+Example input: [AirQuality("LA", "01/01/25", 10.0, 0.05), AirQuality("LA", "01/02/25", 30.0, 0.06), AirQuality("SF", "01/01/25", 20.0, 0.05)]
+Output given the example input: {"overall": {0.5: 20.0, 0.98: 30.0}, "cities": {"LA": {0.5: 10.0, 0.98: 30.0}, "SF": {0.5: 20.0, 0.98: 20.0}}}
+"""
+def get_pm25_quantiles(records, fractions=(0.5, 0.98)):
+    result = AggregationEngine(["pm25_quantiles"]).run(records)
+    return {"overall": result.quantiles("pm25", fractions), "cities": result.city_quantiles("pm25", fractions)}
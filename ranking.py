@@ -0,0 +1,46 @@
+"""Ranking Functions
+Purpose: Rank cities (or any named items) by a value without quadratic sorting.
+top_k uses heapq.nlargest/nsmallest, which is O(n log k); rank_all is a full stable sort.
+Ties keep the mapping's original order in both.
+"""
+import heapq
+
+"""
+Purpose: Turn a mapping into (name, score) pairs, where score is key(value) or the value itself.
+Input type: dict, function or None
+Output type: list[tuple]
+Example: scored_items({"LA": {"avg_pm25": 25.0}}, lambda d: d["avg_pm25"]) -> [("LA", 25.0)]
+"""
+def scored_items(mapping, key=None):
+    if key is None:
+        return list(mapping.items())
+    return [(name, key(mapping[name])) for name in mapping]
+
+
+"""
+Purpose: Return the k best (name, score) pairs, highest first when reverse is True, lowest first otherwise.
+Input type: dict, int, function or None, bool
+Output type: list[tuple]
+Example input: top_k({"A": 3, "B": 9, "C": 5}, 2)
+Output given the example input: [("B", 9), ("C", 5)]
+"""
+def top_k(mapping, k, key=None, reverse=True):
+    items = scored_items(mapping, key)
+    if k >= len(items):
+        return sorted(items, key=lambda item: item[1], reverse=reverse)
+    if k <= 0:
+        return []
+    if reverse:
+        return heapq.nlargest(k, items, key=lambda item: item[1])
+    return heapq.nsmallest(k, items, key=lambda item: item[1])
+
+
+"""
+Purpose: Return every (name, score) pair sorted by score (stable), highest first when reverse is True.
+Input type: dict, function or None, bool
+Output type: list[tuple]
+Example input: rank_all({"A": 3, "B": 9, "C": 5})
+Output given the example input: [("B", 9), ("C", 5), ("A", 3)]
+"""
+def rank_all(mapping, key=None, reverse=True):
+    return sorted(scored_items(mapping, key), key=lambda item: item[1], reverse=reverse)
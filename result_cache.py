@@ -0,0 +1,151 @@
+"""Result Cache
+Purpose: Remember analysis results so repeat questions about an unchanged dataset are answered
+without loading or aggregating again.
+Keys include a dataset fingerprint (absolute path, size and modification time of every file), so a
+changed file never returns an old answer. Entries live in a least-recently-used memory tier bounded by
+their pickled size, and optionally in an on-disk tier (one pickle file per entry) that survives restarts.
+Hit, miss, disk-hit and eviction counters are kept for monitoring.
+Example: cache = ResultCache(max_bytes=64 << 20, disk_dir=".aq_results")
+         averages = cache.get_or_compute(("pm25_averages", dataset_fingerprint(paths)), compute)
+Notes: Cached values are returned as stored (not copied) so memory hits take microseconds; do not
+modify them. The disk tier unpickles files, so only point it at a directory you trust.
+"""
+from collections import OrderedDict
+from hashlib import blake2b
+import os
+import pickle
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+"""
+Purpose: Describe a set of data files well enough to notice when any of them changes.
+Input type: paths (list[str]), row_count (int or None, added when the caller already knows it)
+Output type: tuple (hashable, usable inside cache keys)
+Example: dataset_fingerprint(["data.csv"]) -> (("/home/me/data.csv", 1048576, 1718000000000000000),)
+Notes: Only os.stat is called, so fingerprinting costs microseconds; the row count follows from the
+file contents, so size and modification time already cover it.
+"""
+def dataset_fingerprint(paths, row_count=None):
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    if row_count is not None:
+        parts.append(("rows", row_count))
+    return tuple(parts)
+
+
+class ResultCache:
+    """Size-bounded LRU cache of analysis results with an optional disk tier."""
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        """Purpose: Create an empty cache.
+        Inputs: max_bytes (int, total pickled size kept in memory), disk_dir (str or None for memory only).
+        Output: None.
+        Example: ResultCache(16 << 20, disk_dir="cache")
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest() + ".pkl")
+
+    def _remember(self, key, value, size):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            # Larger than the whole memory tier; keep it on disk only
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """Purpose: Return the cached value for key (memory first, then disk), or default.
+        Input: hashable key (tuples of str/int are safe for the disk tier), default value.
+        Output: the value.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.disk_dir is not None:
+            try:
+                with open(self._disk_path(key), "rb") as handle:
+                    data = handle.read()
+                stored_key, value = pickle.loads(data)
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+                stored_key = None
+            # The file name is a hash, so check the full key too
+            if stored_key == key:
+                self.disk_hits += 1
+                self._remember(key, value, len(data))
+                return value
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Purpose: Store value under key in memory (evicting least recently used entries) and on disk.
+        Input: hashable key, picklable value.
+        Output: None.
+        """
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, value, len(data))
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            temp_path = path + ".tmp"
+            try:
+                with open(temp_path, "wb") as handle:
+                    handle.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                pass
+
+    def get_or_compute(self, key, compute):
+        """Purpose: Return the cached value for key, computing and storing it on a miss.
+        Input: hashable key, function with no arguments.
+        Output: the value.
+        Example: cache.get_or_compute(("stats", fingerprint), lambda: get_pm25_statistics(records))
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Purpose: Drop every entry from memory and disk (counters are kept)."""
+        self.entries.clear()
+        self.bytes = 0
+        if self.disk_dir is not None:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+    def stats(self):
+        """Purpose: Return the counters.
+        Output: dict like {"hits": 10, "disk_hits": 1, "misses": 2, "evictions": 0, "entries": 2, "bytes": 5120}.
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+
+default_cache = ResultCache()
@@ -0,0 +1,167 @@
+"""Rolling Windows
+Purpose: Per-city rolling averages, minima and maxima over a window of days, plus 3-year design values.
+A SlidingWindow keeps a running sum for the mean and two monotonic deques for the minimum and
+maximum, so each new reading costs O(1) amortized instead of rescanning the whole window (O(n*w)).
+The loader's readings are already daily (24-hour PM2.5 means, daily max 8-hour ozone), so windows
+are measured in whole calendar days; a window of 1 day is the reading itself.
+Results are streamed one row at a time; no window is ever copied out.
+Example: for city, date, stats in rolling(records, "pm25", 7): print(city, date, stats["avg"])
+         design_values(records, "ozone") -> {"Fresno": {2024: 0.081}}
+"""
+from collections import deque
+from datetime import date
+import heapq
+
+from time_index import TimeIndex, parse_date
+
+OZONE_DESIGN_RANK = 4
+
+
+class SlidingWindow:
+    """Readings from the last `span` ordinals (days, or years for design values), with O(1) updates."""
+    def __init__(self, span):
+        """Purpose: Create an empty window.
+        Input: span (int) - a reading at ordinal t stays in the window until a reading at t + span arrives.
+        Output: None.
+        Example: window = SlidingWindow(7)
+        """
+        if span < 1:
+            raise ValueError("window span must be at least 1")
+        self.span = span
+        self.items = deque()
+        self.maxima = deque()
+        self.minima = deque()
+        self.total = 0.0
+
+    def push(self, ordinal, value):
+        """Purpose: Move the window to end at `ordinal`, then add `value` (None only moves the window).
+        Inputs: ordinal (int, never smaller than the last one pushed), value (float or None).
+        Output: None.
+        """
+        self.evict(ordinal)
+        if value is None or value != value:
+            return
+        self.items.append((ordinal, value))
+        self.total += value
+        # Keep maxima decreasing and minima increasing; the front of each is the current answer
+        maxima = self.maxima
+        while maxima and maxima[-1][1] <= value:
+            maxima.pop()
+        maxima.append((ordinal, value))
+        minima = self.minima
+        while minima and minima[-1][1] >= value:
+            minima.pop()
+        minima.append((ordinal, value))
+
+    def evict(self, ordinal):
+        """Purpose: Drop readings that are `span` or more ordinals older than `ordinal`."""
+        cutoff = ordinal - self.span
+        items = self.items
+        while items and items[0][0] <= cutoff:
+            self.total -= items.popleft()[1]
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        while self.minima and self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+        if not items:
+            # Start again from zero so rounding error from old readings cannot pile up
+            self.total = 0.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def statistics(self):
+        """Purpose: Return the window's min, max, average and count, or None when it is empty.
+        Output: dict like {"min": 15.0, "max": 20.0, "avg": 17.5, "count": 2} (same keys as city_statistics).
+        """
+        if not self.items:
+            return None
+        count = len(self.items)
+        return {"min": self.minima[0][1], "max": self.maxima[0][1], "avg": self.total / count, "count": count}
+
+
+"""
+Purpose: Stream rolling window statistics from records that already arrive in date order.
+Input type: records (iterable of AirQuality with each city's rows in date order, e.g. a file read top to bottom), pollutant
+(str "pm25", "ozone" or "aqi"), days (int window length)
+Output type: iterator of (city, date, statistics dict or None), one per record
+Example: next(rolling_sorted(iter_air_quality("data.csv"), "ozone", 8)) -> ("A", "01/01/2024", {...})
+Notes: Only one window per city is held, so memory does not grow with the number of records.
+"""
+def rolling_sorted(records, pollutant, days):
+    windows = {}
+    ordinals = {}
+    for record in records:
+        window = windows.get(record.city)
+        if window is None:
+            window = windows[record.city] = SlidingWindow(days)
+        ordinal = ordinals.get(record.date)
+        if ordinal is None:
+            ordinal = ordinals[record.date] = parse_date(record.date)
+        window.push(ordinal, record.value(pollutant))
+        yield record.city, record.date, window.statistics()
+
+
+"""
+Purpose: Stream rolling window statistics per city for records in any order.
+Input type: records (AirQualityTable, other iterable of AirQuality, or a time_index.TimeIndex), pollutant
+(str), days (int), city (str or None for every city)
+Output type: iterator of (city, date, statistics dict or None), city by city, each city in date order
+Example: list(rolling(table, "pm25", 2, city="A"))[-1] -> ("A", "01/02/2024", {"min": 10.0, "max": 20.0, "avg": 15.0, "count": 2})
+Notes: Sorting reuses time_index.TimeIndex, which orders each city's rows by date once.
+"""
+def rolling(records, pollutant, days, city=None):
+    index = records if isinstance(records, TimeIndex) else TimeIndex(records)
+    table = index.table
+    values = table.column(pollutant)
+    date_ids = table.date_ids
+    date_names = table.date_names
+    cities = list(index.cities) if city is None else [city]
+    for name in cities:
+        series = index.series(name)
+        window = SlidingWindow(days)
+        for row, ordinal in zip(series.rows, series.dates):
+            window.push(ordinal, values[row])
+            yield name, date_names[date_ids[row]], window.statistics()
+
+
+"""
+Purpose: Compute 3-year design values per city.
+Ozone: average over `years` years of each year's 4th-highest daily max 8-hour reading.
+PM2.5 (and AQI): average over `years` years of each year's mean.
+Input type: records (same as rolling), pollutant (str), years (int)
+Output type: dict city -> {last year of the window: design value}, only for windows where every year has data
+Example: design_values(table, "ozone") -> {"Fresno": {2024: 0.081, 2025: 0.079}}
+Notes: Values are not truncated the way EPA reports them (0.001 ppm, 0.1 ug/m3); round for display.
+PM2.5 uses plain annual means rather than EPA's quarterly-weighted means.
+"""
+def design_values(records, pollutant, years=3):
+    index = records if isinstance(records, TimeIndex) else TimeIndex(records)
+    table = index.table
+    values = table.column(pollutant)
+    result = {}
+    for name, series in index.cities.items():
+        yearly = {}
+        for row, ordinal in zip(series.rows, series.dates):
+            value = values[row]
+            if value == value:
+                year = date.fromordinal(ordinal).year
+                yearly.setdefault(year, []).append(value)
+        window = SlidingWindow(years)
+        city_values = {}
+        for year in sorted(yearly):
+            readings = yearly[year]
+            if pollutant == "ozone":
+                if len(readings) < OZONE_DESIGN_RANK:
+                    window.evict(year)
+                    continue
+                annual = heapq.nlargest(OZONE_DESIGN_RANK, readings)[-1]
+            else:
+                annual = sum(readings) / len(readings)
+            window.push(year, annual)
+            if len(window) == years:
+                city_values[year] = window.statistics()["avg"]
+        if city_values:
+            result[name] = city_values
+    return result
+
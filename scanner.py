@@ -0,0 +1,205 @@
+"""Projection Scanner
+Purpose: Read only the needed columns of a CSV file straight from a memory map.
+The mapping is cut into blocks of about BLOCK_BYTES that end on a line break, and each block is split
+into lines with one C call. When every line of a block has the same number of fields, each line is split
+only as far as it must be from each end: columns in the first half from the left, columns in the second
+half with rsplit from the right. On a 26-column EPA-style row that asks for 4 columns (0, 4, 7, 24) this
+creates 12 field objects instead of 26, and nothing is done per row in Python beyond the list
+comprehensions. Blocks with ragged lines are split from the left only (a short line raises IndexError,
+like indexing a csv.reader row). Fields stay as bytes: float() parses bytes directly, and scan_table
+decodes each distinct city and date only once. A file containing a quote character is read line by line,
+and the quoted lines go to csv.reader (joined with the following lines when a quoted field spans a line
+break), so quoting still works.
+Example: for date, pm25, city, ozone in scan_columns("ozone_pm25_data.csv", [0, 4, 7, 24]): ...
+Notes: A regular expression that captured only the wanted fields was tried first; CPython's regex
+engine was slower than csv.reader on wide rows, while bytes.split runs in C and beats both. Yielding
+one row at a time from a generator cost more than csv.reader itself, hence the blocks.
+"""
+from array import array
+import csv
+from itertools import islice
+import math
+import mmap
+import operator
+
+from data import AirQualityTable
+from schema import convert_column, parse_date, read_columns
+
+# Rows converted together (as in file_handling.py), for files read line by line
+BATCH_ROWS = 512
+# Bytes of unquoted lines split together (a block always ends on a line break)
+BLOCK_BYTES = 1 << 16
+_count_commas = operator.methodcaller("count", b",")
+
+
+def _quoted_row(line, columns):
+    """Project one (possibly multi-line) quoted row with csv.reader."""
+    parts = next(csv.reader([line.decode("utf-8")]))
+    return tuple(parts[column].encode("utf-8") for column in columns)
+
+
+def _split_block(block, columns):
+    """Return the requested columns (lists of bytes) of a block of unquoted lines."""
+    if b"\r" in block:
+        block = block.replace(b"\r\n", b"\n")
+    lines = block.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    widths = set(map(_count_commas, lines))
+    if len(widths) == 1:
+        width = widths.pop() + 1
+        if width > max(columns):
+            return _split_uniform(lines, columns, width)
+    # Ragged block: split every line from the left as far as the last requested column
+    max_split = max(columns) + 1
+    split = [line.split(b",", max_split) for line in lines]
+    return [[parts[column] for parts in split] for column in columns]
+
+
+def _split_uniform(lines, columns, width):
+    """Split lines that all have `width` fields from whichever end is nearer each requested column."""
+    left = [column for column in columns if column <= width - 1 - column]
+    right = [column for column in columns if column > width - 1 - column]
+    fields = {}
+    if left:
+        max_split = max(left) + 1
+        split = [line.split(b",", max_split) for line in lines]
+        for column in left:
+            fields[column] = [parts[column] for parts in split]
+    if right:
+        # rsplit keeps everything before the leftmost requested column in one piece
+        max_split = width - min(right)
+        split = [line.rsplit(b",", max_split) for line in lines]
+        for column in right:
+            fields[column] = [parts[column - width] for parts in split]
+    return [fields[column] for column in columns]
+
+
+def _line_rows(mapping, position, columns):
+    """Yield the requested fields of each row from position on, one line at a time (for quoted files)."""
+    pick = operator.itemgetter(*columns)
+    single = len(columns) == 1
+    max_split = max(columns) + 1
+    size = len(mapping)
+    find = mapping.find
+    while position < size:
+        end = find(b"\n", position)
+        if end == -1:
+            end = size
+        line = mapping[position:end]
+        position = end + 1
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        if b'"' in line:
+            # Keep adding lines while a quoted field is still open
+            while line.count(b'"') % 2 == 1 and position < size:
+                end = find(b"\n", position)
+                if end == -1:
+                    end = size
+                line += b"\n" + mapping[position:end]
+                position = end + 1
+            yield _quoted_row(line, columns)
+            continue
+        fields = pick(line.split(b",", max_split))
+        yield (fields,) if single else fields
+
+
+"""
+Purpose: Yield the requested columns of a CSV file's data rows, a block of rows at a time.
+Input type: path (str), columns (list[int]), skip_header (bool)
+Output type: iterator of lists with one list of bytes per requested column (all the same length)
+Example: next(scan_blocks("data.csv", [7, 4])) -> [[b"Fresno", ...], [b"12.5", ...]]
+Notes: Rows shorter than the highest requested column raise IndexError, like indexing a csv.reader row.
+"""
+def scan_blocks(path, columns, skip_header=True):
+    columns = tuple(columns)
+    with open(path, "rb") as handle:
+        try:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+    with mapping:
+        size = len(mapping)
+        position = 0
+        if skip_header:
+            position = mapping.find(b"\n") + 1
+            if position == 0:
+                return
+        if mapping.find(b'"', position) != -1:
+            rows = _line_rows(mapping, position, columns)
+            while True:
+                batch = list(islice(rows, BATCH_ROWS))
+                if not batch:
+                    return
+                yield [list(fields) for fields in zip(*batch)]
+        while position < size:
+            end = mapping.find(b"\n", min(position + BLOCK_BYTES, size - 1))
+            end = size if end == -1 else end + 1
+            yield _split_block(mapping[position:end], columns)
+            position = end
+
+
+"""
+Purpose: Yield the requested columns of every data row of a CSV file, as byte strings.
+Input type: path (str), columns (list[int]), skip_header (bool)
+Output type: iterator of tuples of bytes, in the order the columns were requested
+Example: next(scan_columns("data.csv", [7, 4])) -> (b"Fresno", b"12.5")
+Notes: Rows shorter than the highest requested column raise IndexError, like indexing a csv.reader row.
+"""
+def scan_columns(path, columns, skip_header=True):
+    for fields in scan_blocks(path, columns, skip_header):
+        yield from zip(*fields)
+
+
+"""
+Purpose: Build an AirQualityTable from a CSV file using scan_blocks instead of csv.reader.
+Input type: path (str), schema (schema.Schema or None for the default)
+Output type: AirQualityTable (same contents as file_handling.parse_csv)
+Example: scan_table("ozone_pm25_data.csv") -> AirQualityTable
+Notes: The header is resolved like parse_csv. Rows are converted a block at a time with
+schema.convert_column, so sentinels like "NA" or "-999" are missing exactly as in parse_csv.
+A reading that is not a finite number or a date parse_date cannot read raises ValueError, and a short
+row raises IndexError (ozone_pm25_air_quality then reads the file with parse_csv, which skips and
+reports such rows).
+"""
+def scan_table(path, schema=None):
+    columns = read_columns(path, schema)
+    table = AirQualityTable()
+    for pollutant in columns.pollutants:
+        table.add_column(pollutant)
+    targets = [table.column(pollutant) for pollutant in columns.pollutants]
+    absent = [table.column(pollutant) for pollutant in table.pollutants() if pollutant not in columns.pollutants]
+    absent.append(table.aqi_values)
+    city_codes = {}
+    date_codes = {}
+    numbers = {}
+
+    def date_code(text):
+        parse_date(text)
+        return table.date_id(text)
+
+    wanted = [columns.date, columns.city] + list(columns.pollutants.values())
+    for fields in scan_blocks(path, wanted):
+        table.date_ids.extend(array("i", _codes(fields[0], date_codes, date_code)))
+        table.city_ids.extend(array("i", _codes(fields[1], city_codes, table.city_id)))
+        for target, texts in zip(targets, fields[2:]):
+            values = convert_column(texts, numbers)
+            if None in values:
+                raise ValueError("bad number in " + path)
+            target.extend(array("d", values))
+        missing = array("d", [math.nan]) * len(fields[0])
+        for target in absent:
+            target.extend(missing)
+    return table
+
+
+def _codes(names, codes, code_of):
+    """Integer codes of byte-string names, decoding each distinct name once."""
+    result = []
+    for name in names:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = code_of(name.decode("utf-8"))
+        result.append(code)
+    return result
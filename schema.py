@@ -0,0 +1,218 @@
+"""Column Schema
+Purpose: Find the date, city and pollutant columns of a CSV file by their header names, once per file,
+instead of hard-coding positions. Any number of pollutant columns can be loaded; each becomes a column of
+the AirQualityTable and can be aggregated with the breakpoint table of the same name (see categories.py).
+Header names are matched without regard to case or surrounding spaces, and each field may list several
+names. A file whose header names none of the date, city, PM2.5 or ozone columns (placeholder or missing
+headers) is read with the fixed positions of the original export (date 0, PM2.5 4, city 7, ozone 24);
+when only some of them are named, each unnamed one still falls back to its fixed position if the header
+is wide enough and that position is not taken by a named column.
+Reading fields are converted the same way by every reader (convert_column): sentinels like "NA" or
+"-999" are missing, and anything else that is not a finite number makes the row malformed. So does a
+date in none of DATE_FORMATS (bad_dates), which the time index and city series could not place.
+Example: columns = DEFAULT_SCHEMA.resolve(["Date", "Site", "Daily Max 1-hour NO2 Concentration", "Local Site Name"])
+         columns.date -> 0; columns.city -> 3; columns.pollutants -> {"no2": 2}
+Example: Schema(pollutants={"so2": "Daily Max 1-hour SO2 Concentration"}) loads only SO2
+(register its breakpoints with categories.register_pollutant to aggregate it).
+"""
+import csv
+from datetime import datetime
+import math
+
+DATE_HEADERS = ("Date",)
+CITY_HEADERS = ("Local Site Name", "City")
+# Pollutant -> header names it may appear under (EPA daily export names first)
+POLLUTANT_HEADERS = {
+    "pm25": ("Daily Mean PM2.5 Concentration", "PM2.5"),
+    "ozone": ("Daily Max 8-hour Ozone Concentration", "Ozone"),
+    "no2": ("Daily Max 1-hour NO2 Concentration", "NO2"),
+    "co": ("Daily Max 8-hour CO Concentration", "CO"),
+    "pm10": ("Daily Mean PM10 Concentration", "PM10"),
+}
+# Field values that mean "no reading" (compared after stripping spaces)
+MISSING_VALUES = frozenset(("", "NA", "N/A", "n/a", "NaN", "nan", "null", "NULL", "None", "-", "--", "-999", "-999.0"))
+# The same values as bytes, for the memory-mapped scanner (str and bytes never compare equal)
+MISSING_FIELDS = MISSING_VALUES | frozenset(value.encode("ascii") for value in MISSING_VALUES)
+DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d")
+
+
+def _names(headers):
+    return (headers,) if isinstance(headers, str) else tuple(headers)
+
+
+class Columns:
+    """Positions of the wanted fields in one file's rows."""
+    def __init__(self, date, city, pollutants):
+        """Purpose: Store resolved positions.
+        Inputs: date int, city int, pollutants dict pollutant -> int (file order of the schema).
+        Output: None.
+        Example: Columns(0, 7, {"pm25": 4, "ozone": 24}).width -> 25
+        """
+        self.date = date
+        self.city = city
+        self.pollutants = pollutants
+        # Rows need at least this many fields
+        self.width = max([date, city] + list(pollutants.values())) + 1
+
+    def __eq__(self, other):
+        return isinstance(other, Columns) and (self.date, self.city, self.pollutants) == (
+            other.date, other.city, other.pollutants)
+
+    def __repr__(self):
+        return "Columns(" + repr(self.date) + ", " + repr(self.city) + ", " + repr(self.pollutants) + ")"
+
+
+LEGACY_COLUMNS = Columns(0, 7, {"pm25": 4, "ozone": 24})
+
+
+class Schema:
+    """Which header names hold the date, the city and each pollutant."""
+    def __init__(self, date=DATE_HEADERS, city=CITY_HEADERS, pollutants=None):
+        """Purpose: Describe the columns to load.
+        Inputs: date and city (str or tuple of accepted header names), pollutants (dict pollutant ->
+        header name or tuple of names; None means POLLUTANT_HEADERS).
+        Output: None.
+        Example: Schema(city="County Name", pollutants={"pm25": "PM2.5", "pm10": "PM10"})
+        """
+        self.date = _names(date)
+        self.city = _names(city)
+        source = POLLUTANT_HEADERS if pollutants is None else pollutants
+        self.pollutants = {pollutant: _names(headers) for pollutant, headers in source.items()}
+
+    def resolve(self, header):
+        """Purpose: Find this schema's columns in a header row.
+        Input: list[str] (the first CSV row).
+        Output: Columns (pollutants whose header is absent, and whose legacy position is not usable, are left out).
+        Raises ValueError when the date or city column cannot be found.
+        Example: Schema().resolve(["col" + str(i) for i in range(25)]) -> LEGACY_COLUMNS
+        Example: a 25-field header naming only "Date" and "PM2.5" (at 4) still gets city 7 and ozone 24
+        """
+        positions = {}
+        for index, name in enumerate(header):
+            positions.setdefault(name.strip().lower(), index)
+
+        def find(names):
+            for name in names:
+                index = positions.get(name.strip().lower())
+                if index is not None:
+                    return index
+            return None
+
+        date = find(self.date)
+        city = find(self.city)
+        pollutants = {}
+        for pollutant, names in self.pollutants.items():
+            index = find(names)
+            if index is not None:
+                pollutants[pollutant] = index
+        core_found = date is not None or city is not None or "pm25" in pollutants or "ozone" in pollutants
+        if not core_found:
+            # Original export layout with placeholder headers: fixed positions, plus any named extras
+            legacy = {pollutant: LEGACY_COLUMNS.pollutants[pollutant]
+                      for pollutant in ("pm25", "ozone") if pollutant in self.pollutants}
+            legacy.update(pollutants)
+            return Columns(LEGACY_COLUMNS.date, LEGACY_COLUMNS.city, legacy)
+        # Some fields are named: fill each unnamed one from its legacy position when that is free
+        taken = set(pollutants.values()) | {date, city}
+
+        def legacy(position):
+            if position < len(header) and position not in taken:
+                taken.add(position)
+                return position
+            return None
+
+        if date is None:
+            date = legacy(LEGACY_COLUMNS.date)
+        if city is None:
+            city = legacy(LEGACY_COLUMNS.city)
+        for pollutant in ("pm25", "ozone"):
+            if pollutant in self.pollutants and pollutant not in pollutants:
+                position = legacy(LEGACY_COLUMNS.pollutants[pollutant])
+                if position is not None:
+                    pollutants[pollutant] = position
+        if date is None:
+            raise ValueError("no date column (looked for " + ", ".join(self.date) + ")")
+        if city is None:
+            raise ValueError("no city column (looked for " + ", ".join(self.city) + ")")
+        return Columns(date, city, pollutants)
+
+
+DEFAULT_SCHEMA = Schema()
+
+
+"""
+Purpose: Read a CSV file's header row and resolve a schema against it.
+Input type: path (str), schema (Schema or None for DEFAULT_SCHEMA)
+Output type: Columns (LEGACY_COLUMNS for an empty file)
+Example: read_columns("ozone_pm25_data.csv") -> Columns(0, 7, {"pm25": 4, "ozone": 24})
+"""
+def read_columns(path, schema=None):
+    with open(path, "r", newline="") as handle:
+        header = next(csv.reader(handle), None)
+    if header is None:
+        return LEGACY_COLUMNS
+    return (schema or DEFAULT_SCHEMA).resolve(header)
+
+
+"""
+Purpose: Convert one column of reading fields to floats, parsing each distinct field once.
+Input type: texts (list of str, or of bytes from scanner.py), numbers (dict memo shared across calls)
+Output type: list of float (NaN = missing, see MISSING_VALUES) or None (not a finite number: the row is bad)
+Example: convert_column(["12.5", "NA", "x"], {}) -> [12.5, nan, None]
+"""
+def convert_column(texts, numbers):
+    values = []
+    append = values.append
+    for text in texts:
+        value = numbers.get(text)
+        if value is None and text not in numbers:
+            stripped = text.strip()
+            if stripped in MISSING_FIELDS:
+                value = math.nan
+            else:
+                try:
+                    value = float(stripped)
+                except ValueError:
+                    value = None
+                if value is not None and (value != value or value in (math.inf, -math.inf)):
+                    value = None
+            if len(numbers) < 1 << 20:
+                numbers[text] = value
+        append(value)
+    return values
+
+
+"""
+Purpose: Turn a date string (or an ordinal day number) into an ordinal day number.
+Input type: str like "08/15/2024", "08/15/24" or "2024-08-15", or int
+Output type: int (datetime.date.toordinal)
+Example: parse_date("01/02/2024") - parse_date("01/01/2024") -> 1
+"""
+def parse_date(text):
+    if isinstance(text, int):
+        return text
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).toordinal()
+        except ValueError:
+            pass
+    raise ValueError("unrecognized date: " + repr(text))
+
+
+"""
+Purpose: Find the date fields parse_date cannot read, parsing each distinct field once.
+Input type: texts (list of str), known (set of fields already found good, shared across calls)
+Output type: set of str (the bad fields; empty when every date parses)
+Example: bad_dates(["01/02/2024", "Jan 2 2024"], set()) -> {"Jan 2 2024"}
+"""
+def bad_dates(texts, known):
+    bad = set()
+    for text in set(texts).difference(known):
+        try:
+            parse_date(text)
+        except ValueError:
+            bad.add(text)
+        else:
+            if len(known) < 1 << 20:
+                known.add(text)
+    return bad
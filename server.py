@@ -0,0 +1,215 @@
+"""Report Server
+Purpose: Keep the dataset and its aggregates loaded in one long-running process and answer report
+and query requests over local HTTP, instead of paying interpreter startup and a full CSV parse per report.
+Requests are handled on threads (ThreadingHTTPServer). Each request reads one immutable Snapshot, and a
+watcher thread swaps in a new Snapshot when any CSV's size or modification time changes (hot reload),
+so clients never see a half-built dataset.
+Endpoints (GET, JSON unless noted):
+    /report                          the same text main.py prints (text/plain)
+    /summary?k=5&city=A&city=B       top-k rankings, optionally limited to some cities (see main.summarize)
+    /city?name=A&pollutant=pm25&start=01/01/2024&end=01/31/2024
+                                     count, average and unhealthy days for one city and date range
+    /health                          rows, cities, load time, reload count and the last failed reload
+Run: python main.py serve ozone_pm25_data.csv --port 8000
+Example: curl 'http://127.0.0.1:8000/summary?k=5'
+Notes: Binds to 127.0.0.1 by default; there is no authentication, so do not expose it beyond the machine.
+A reload that fails (a file missing, half written or without a date column) keeps the old Snapshot; the
+error is printed to stderr once and shown in /health until a reload succeeds.
+"""
+import argparse
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import itertools
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from aggregation import AggregationEngine
+from data import AirQualityTable
+from file_handling import ozone_pm25_air_quality
+import main as report
+from result_cache import dataset_fingerprint
+from time_index import TimeIndex
+
+DEFAULT_PORT = 8000
+DEFAULT_POLL_SECONDS = 1.0
+
+
+class Snapshot:
+    """Everything the server answers from, built once per version of the files and never changed."""
+    def __init__(self, paths, engine="csv", aqi=False):
+        """Purpose: Load the files and compute the report totals, the report text and a time index.
+        Inputs: paths (list[str]), engine (str "csv" or "mmap"), aqi (bool).
+        Output: None.
+        """
+        self.fingerprint = dataset_fingerprint(paths)
+        if len(paths) == 1:
+            table = ozone_pm25_air_quality(paths[0], cache=True, engine=engine, aqi=aqi)
+        else:
+            tables = [ozone_pm25_air_quality(path, cache=True, engine=engine, aqi=aqi) for path in paths]
+            table = AirQualityTable.from_records(itertools.chain.from_iterable(tables))
+        metrics = report.REPORT_METRICS + report.AQI_METRICS if aqi else report.REPORT_METRICS
+        metrics = metrics + report.extra_metrics(table)
+        self.result = AggregationEngine(metrics, backend="auto").run(table)
+        self.index = TimeIndex(table)
+        text = io.StringIO()
+        # Only the loading thread prints, so swapping sys.stdout here cannot catch a request's output
+        with contextlib.redirect_stdout(text):
+            report.print_report(self.result)
+        self.report_text = text.getvalue()
+        self.loaded_at = time.time()
+
+
+class ReportServer(ThreadingHTTPServer):
+    """HTTP server holding the current Snapshot and reloading it when the files change."""
+    daemon_threads = True
+
+    def __init__(self, paths, host="127.0.0.1", port=DEFAULT_PORT, engine="csv", aqi=False,
+                 poll_seconds=DEFAULT_POLL_SECONDS):
+        """Purpose: Load the dataset and bind the socket (port 0 picks a free port).
+        Inputs: paths (list[str]), host (str), port (int), engine (str), aqi (bool), poll_seconds (float).
+        Output: None.
+        Example: ReportServer(["data.csv"], port=0).server_address -> ("127.0.0.1", 54321)
+        """
+        self.paths = paths
+        self.engine = engine
+        self.aqi = aqi
+        self.poll_seconds = poll_seconds
+        self.snapshot = Snapshot(paths, engine, aqi)
+        self.reloads = 0
+        self.last_error = None
+        self.stopping = threading.Event()
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        super().__init__((host, port), ReportHandler)
+        self.watcher.start()
+
+    def reload_if_changed(self):
+        """Purpose: Build a new Snapshot if any file changed; keep serving the old one if loading fails.
+        Output: bool (True when a new Snapshot was swapped in).
+        Notes: A failure is printed to stderr when it first happens (not on every poll) and kept in
+        last_error for /health.
+        """
+        try:
+            if dataset_fingerprint(self.paths) == self.snapshot.fingerprint:
+                return False
+            snapshot = Snapshot(self.paths, self.engine, self.aqi)
+        except (OSError, ValueError, IndexError) as error:
+            # A file being rewritten can be missing or half written; try again on the next poll
+            if str(error) != self.last_error:
+                print("Reload failed, still serving the data loaded at "
+                      + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.snapshot.loaded_at))
+                      + ": " + str(error), file=sys.stderr)
+            self.last_error = str(error)
+            return False
+        self.snapshot = snapshot
+        self.reloads += 1
+        self.last_error = None
+        return True
+
+    def _watch(self):
+        while not self.stopping.wait(self.poll_seconds):
+            self.reload_if_changed()
+
+    def server_close(self):
+        self.stopping.set()
+        super().server_close()
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """Answers one request from the server's current Snapshot."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        snapshot = self.server.snapshot
+        try:
+            if url.path == "/report":
+                self._send(200, snapshot.report_text, "text/plain; charset=utf-8")
+            elif url.path == "/summary":
+                cities = set(query["city"]) if "city" in query else None
+                k = int(query.get("k", ["3"])[0])
+                self._send_json(200, report.rank_summary(snapshot.result, k, cities))
+            elif url.path == "/city":
+                self._send_json(200, city_answer(snapshot.index, query))
+            elif url.path == "/health":
+                self._send_json(200, {
+                    "rows": snapshot.result.row_count,
+                    "cities": len(snapshot.index.cities),
+                    "loaded_at": snapshot.loaded_at,
+                    "reloads": self.server.reloads,
+                    "last_error": self.server.last_error,
+                })
+            else:
+                self._send_json(404, {"error": "unknown path: " + url.path})
+        except (KeyError, ValueError) as error:
+            self._send_json(400, {"error": str(error.args[0]) if error.args else type(error).__name__})
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data), "application/json")
+
+    def _send(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet; one line per request would slow a busy server
+        pass
+
+
+"""
+Purpose: Answer a /city query from a TimeIndex.
+Input type: TimeIndex, dict of query parameters (lists of str, as parse_qs gives them)
+Output type: dict with city, pollutant, count, average and unhealthy_days
+Example: city_answer(index, {"name": ["A"], "pollutant": ["pm25"]}) -> {"city": "A", ..., "average": 15.0, ...}
+"""
+def city_answer(index, query):
+    if "name" not in query:
+        raise ValueError("missing city name")
+    city = query["name"][0]
+    pollutant = query.get("pollutant", ["pm25"])[0]
+    if pollutant not in index.pollutants():
+        raise ValueError("unknown pollutant: " + pollutant)
+    start = query.get("start", [None])[0]
+    end = query.get("end", [None])[0]
+    return {
+        "city": city,
+        "pollutant": pollutant,
+        "count": index.count(city, pollutant, start, end),
+        "average": index.average(city, pollutant, start, end),
+        "unhealthy_days": index.unhealthy_days(city, pollutant, start, end),
+    }
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Serve air quality reports over local HTTP.")
+    parser.add_argument("csv_paths", nargs="*", default=["ozone_pm25_data.csv"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS, help="seconds between file change checks")
+    parser.add_argument("--engine", choices=["csv", "mmap"], default="csv")
+    parser.add_argument("--aqi", action="store_true", help="compute AQI and include its rankings in /report")
+    args = parser.parse_args(argv)
+    paths = report.expand_paths(args.csv_paths)
+    try:
+        server = ReportServer(paths, args.host, args.port, args.engine, args.aqi, args.poll)
+    except FileNotFoundError as error:
+        print("File not found: " + str(error.filename))
+        return
+    except (OSError, ValueError, IndexError) as error:
+        print("Could not load " + ", ".join(paths) + ": " + str(error), file=sys.stderr)
+        return
+    host, port = server.server_address[:2]
+    print("Serving " + str(server.snapshot.result.row_count) + " records on http://" + host + ":" + str(port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
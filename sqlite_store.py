@@ -0,0 +1,224 @@
+"""SQLite Store
+Purpose: Keep loaded readings in a local SQLite database and answer the report aggregations with
+SQL GROUP BY queries, so repeat questions do not re-read the CSV or loop over records in Python.
+Each CSV is bulk-loaded once (executemany inside one transaction) and reloaded only when its
+fingerprint (size, modification time, content hash; see table_cache.py) changes.
+Readings are indexed on (city, date). Pollutant columns beyond PM2.5, ozone and AQI (see schema.py)
+are added to the readings table the first time a file has them; rows of other files leave them NULL. AggregationEngine.run accepts a store and pushes statistics,
+averages, unhealthy counts and distributions down to SQL; the result has the same shapes as a scan.
+A database can hold many files. Once load_csv has been called on a store, its queries cover only the
+files named in those calls (in call order), like a scan over the same files; a store with no
+load_csv calls answers over everything stored.
+Example: store = SQLiteStore("air.db"); store.load_csv("ozone_pm25_data.csv")
+         calculate_pm25_city_averages(store) -> {"LA": {"avg_pm25": 17.5, "pm25_count": 2}, ...}
+Notes: Sums are not taken from SQL SUM (which rounds in whatever order SQLite visits the rows): each
+city's distinct values are counted with GROUP BY and added exactly (see exact_sum.py), so averages match
+a Python scan bit for bit, like counts, min/max and categories.
+"""
+import json
+import os
+import sqlite3
+
+from categories import BREAKPOINTS
+from data import AirQuality
+from exact_sum import exact
+from file_handling import ozone_pm25_air_quality
+from table_cache import source_fingerprint
+
+BATCH_ROWS = 50000
+# Pollutant columns every database has; extra ones are added by load_csv
+POLLUTANTS = ("pm25", "ozone", "aqi")
+# Stored in each source's fingerprint, so files stored before extra pollutant columns existed are reloaded
+STORE_VERSION = 2
+# Metric kinds that can be answered with GROUP BY; the others need the rows themselves
+PUSHED_DOWN = ("statistics", "averages", "unhealthy", "distribution")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, path TEXT UNIQUE, fingerprint TEXT);
+CREATE TABLE IF NOT EXISTS cities (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS readings (
+    source_id INTEGER, city_id INTEGER, date TEXT, pm25 REAL, ozone REAL, aqi REAL
+);
+CREATE INDEX IF NOT EXISTS readings_city_date ON readings (city_id, date);
+CREATE INDEX IF NOT EXISTS readings_source ON readings (source_id);
+"""
+
+
+def _category_case(pollutant, breakpoints):
+    """SQL expression giving the category number of a value (value <= limit, like Breakpoints.index)."""
+    parts = ["CASE"]
+    for index, limit in enumerate(breakpoints.limits):
+        parts.append("WHEN " + pollutant + " <= " + repr(float(limit)) + " THEN " + str(index))
+    parts.append("ELSE " + str(len(breakpoints.limits)) + " END")
+    return " ".join(parts)
+
+
+class SQLiteStore:
+    """Readings from one or more CSV files in a SQLite database, queried with pushed-down aggregates."""
+    def __init__(self, path=":memory:"):
+        """Purpose: Open (or create) the database.
+        Input: path (str file name, or ":memory:").
+        Output: None.
+        Example: SQLiteStore("air.db")
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        # Sources named by load_csv on this connection, in call order (queries are limited to them)
+        self.source_ids = []
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def load_csv(self, csv_path, engine="csv", aqi=False, quarantine=None, report=None):
+        """Purpose: Bulk-load one CSV file (skipped when the stored copy is still up to date) and add it
+        to the files this store's queries cover.
+        Inputs: csv_path (str), engine (str "csv" or "mmap"), aqi (bool: also compute AQI, see aqi.py),
+        quarantine (str path or None) and report (file_handling.ParseReport or None) for the rows that
+        could not be parsed (see file_handling.parse_csv).
+        Output: bool (True when rows were (re)loaded).
+        Example: store.load_csv("ozone_pm25_data.csv") -> True, then False on the next run
+        """
+        key = os.path.abspath(csv_path)
+        fingerprint = json.dumps({"source": source_fingerprint(csv_path), "aqi": aqi, "version": STORE_VERSION},
+                                 sort_keys=True)
+        row = self.connection.execute("SELECT id, fingerprint FROM sources WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[1] == fingerprint:
+            self._select(row[0])
+            return False
+        table = ozone_pm25_air_quality(csv_path, engine=engine, aqi=aqi, quarantine=quarantine, report=report)
+        with self.connection:
+            if row is None:
+                source_id = self.connection.execute(
+                    "INSERT INTO sources (path, fingerprint) VALUES (?, ?)", (key, fingerprint)).lastrowid
+            else:
+                source_id = row[0]
+                self.connection.execute("DELETE FROM readings WHERE source_id = ?", (source_id,))
+                self.connection.execute("UPDATE sources SET fingerprint = ? WHERE id = ?", (fingerprint, source_id))
+            self._insert_table(source_id, table)
+        self._select(source_id)
+        return True
+
+    def _select(self, source_id):
+        if source_id not in self.source_ids:
+            self.source_ids.append(source_id)
+
+    def _scope(self):
+        """SQL condition keeping the rows of the selected sources (every row when none were selected)."""
+        if not self.source_ids:
+            return "1"
+        return "readings.source_id IN (" + ", ".join(str(source_id) for source_id in self.source_ids) + ")"
+
+    def _row_order(self):
+        """SQL expression ordering rows like a scan over the selected sources, file by file in call order."""
+        if not self.source_ids:
+            return "readings.rowid"
+        cases = " ".join("WHEN " + str(source_id) + " THEN " + str(rank)
+                         for rank, source_id in enumerate(self.source_ids))
+        return "(CASE readings.source_id " + cases + " END) * " + str(1 << 40) + " + readings.rowid"
+
+    def pollutants(self):
+        """Purpose: List the pollutant columns of the readings table (core ones first, then extras as added).
+        Output: list[str].
+        Example: store.pollutants() -> ["pm25", "ozone", "aqi", "no2"]
+        """
+        rows = self.connection.execute("PRAGMA table_info(readings)").fetchall()
+        return [row[1] for row in rows if row[1] not in ("source_id", "city_id", "date")]
+
+    def _add_columns(self, pollutants):
+        """Add a REAL column for each pollutant the readings table does not have yet."""
+        stored = self.pollutants()
+        for pollutant in pollutants:
+            if pollutant in stored:
+                continue
+            if not pollutant.isidentifier() or pollutant in ("source_id", "city_id", "date"):
+                raise ValueError("cannot store pollutant column: " + repr(pollutant))
+            self.connection.execute("ALTER TABLE readings ADD COLUMN " + pollutant + " REAL")
+
+    def _insert_table(self, source_id, table):
+        connection = self.connection
+        connection.executemany("INSERT OR IGNORE INTO cities (name) VALUES (?)", ((name,) for name in table.city_names))
+        ids = dict(connection.execute("SELECT name, id FROM cities"))
+        city_ids = [ids[name] for name in table.city_names]
+        date_names = table.date_names
+        pollutants = list(POLLUTANTS) + list(table.extra_values)
+        self._add_columns(pollutants)
+        insert = ("INSERT INTO readings (source_id, city_id, date, " + ", ".join(pollutants) + ") VALUES (?, ?, ?"
+                  + ", ?" * len(pollutants) + ")")
+        rows = zip(table.city_ids, table.date_ids, *[table.column(pollutant) for pollutant in pollutants])
+        batch = []
+        for city, date, *values in rows:
+            # NaN (missing) is stored as NULL so SQL aggregates skip it
+            batch.append((source_id, city_ids[city], date_names[date],
+                          *[value if value == value else None for value in values]))
+            if len(batch) == BATCH_ROWS:
+                connection.executemany(insert, batch)
+                batch = []
+        if batch:
+            connection.executemany(insert, batch)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM readings WHERE " + self._scope()).fetchone()[0]
+
+    def __iter__(self):
+        """Purpose: Yield every selected reading as an AirQuality, in file order (for metrics SQL cannot answer)."""
+        extras = self.pollutants()[len(POLLUTANTS):]
+        query = ("SELECT cities.name, date, " + ", ".join(POLLUTANTS + tuple(extras)) + " FROM readings "
+                 "JOIN cities ON cities.id = readings.city_id WHERE " + self._scope()
+                 + " ORDER BY " + self._row_order())
+        for city, date, pm25, ozone, aqi, *values in self.connection.execute(query):
+            readings = dict(zip(extras, values)) if extras else None
+            yield AirQuality(city, date, pm25, ozone, None if aqi is None else int(aqi), readings)
+
+    def fill_accumulators(self, accumulators):
+        """Purpose: Fill aggregation accumulators with GROUP BY queries instead of a scan.
+        Input: dict pollutant -> aggregation.PollutantAccumulator (only pushed-down kinds tracked).
+        Output: None (the accumulators are filled in place).
+        Notes: Groups come back in order of each city's (or category's) first row, like a scan.
+        """
+        scope = self._scope()
+        first_row = "MIN(" + self._row_order() + ")"
+        stored = self.pollutants()
+        for pollutant, accumulator in accumulators.items():
+            if pollutant not in stored:
+                raise ValueError("unknown pollutant: " + str(pollutant))
+            as_value = int if accumulator.integer else float
+            count, low, high = self.connection.execute(
+                "SELECT COUNT(" + pollutant + "), MIN(" + pollutant + "), MAX(" + pollutant
+                + ") FROM readings WHERE " + scope).fetchone()
+            if count == 0:
+                continue
+            # Exact sums per city from the count of each distinct value
+            sums = {}
+            query = ("SELECT city_id, " + pollutant + ", COUNT(*) FROM readings WHERE " + scope + " AND "
+                     + pollutant + " IS NOT NULL GROUP BY city_id, " + pollutant)
+            for city_id, value, repeat in self.connection.execute(query):
+                sums[city_id] = sums.get(city_id, 0) + repeat * exact(value)
+            accumulator.count = count
+            accumulator.total = sum(sums.values())
+            accumulator.low = as_value(low)
+            accumulator.high = as_value(high)
+            if accumulator.track_cities:
+                query = ("SELECT city_id, cities.name, COUNT(" + pollutant + "), MIN(" + pollutant
+                         + "), MAX(" + pollutant + ") FROM readings JOIN cities ON cities.id = readings.city_id "
+                         "WHERE " + scope + " AND " + pollutant + " IS NOT NULL GROUP BY city_id ORDER BY " + first_row)
+                for city_id, city, city_count, city_low, city_high in self.connection.execute(query):
+                    accumulator.cities[city] = [sums[city_id], city_count, as_value(city_low), as_value(city_high)]
+            if accumulator.track_unhealthy:
+                query = ("SELECT cities.name, COUNT(*) FROM readings JOIN cities ON cities.id = readings.city_id "
+                         "WHERE " + scope + " AND " + pollutant + " >= ? GROUP BY city_id ORDER BY " + first_row)
+                for city, days in self.connection.execute(query, (accumulator.unhealthy_at,)):
+                    accumulator.unhealthy[city] = days
+            if accumulator.track_distribution:
+                labels = accumulator.breakpoints.labels
+                query = ("SELECT " + _category_case(pollutant, BREAKPOINTS[pollutant]) + " AS category, COUNT(*) "
+                         "FROM readings WHERE " + scope + " AND " + pollutant + " IS NOT NULL GROUP BY category ORDER BY "
+                         + first_row)
+                for index, days in self.connection.execute(query):
+                    accumulator.distribution[labels[index]] = days
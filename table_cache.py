@@ -0,0 +1,152 @@
+"""Table Cache
+Purpose: Save a parsed AirQualityTable next to its CSV as a compact binary file, and memory-map it
+on later runs instead of parsing the CSV text again.
+File layout: 8-byte magic, 8-byte header length, JSON header (source fingerprint, the engine that
+parsed the CSV, city and date code tables, column offsets, the rows the parser rejected), then each
+column's raw bytes aligned to 8 bytes. Pollutant columns beyond
+PM2.5 and ozone (AirQualityTable.extra_values) are stored as "<pollutant>_values" columns too.
+The cache is ignored (and rewritten) when the CSV's size, modification time or content hash changes,
+or when it was written by another parsing engine. Rejected rows are kept so a cached load can still
+report and quarantine them.
+Example: table = load_cached_table("ozone_pm25_data.csv")  # None when missing or stale
+"""
+from array import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from data import AirQualityTable
+
+MAGIC = b"AQCACHE2"
+COLUMNS = (("city_ids", "i"), ("date_ids", "i"), ("pm25_values", "d"), ("ozone_values", "d"), ("aqi_values", "d"))
+HASH_SAMPLE = 1 << 16
+
+"""
+Purpose: Return the cache file path used for a CSV file.
+Input type: str
+Output type: str
+Example: cache_path("data.csv") -> "data.csv.aqcache"
+"""
+def cache_path(csv_path):
+    return csv_path + ".aqcache"
+
+
+"""
+Purpose: Describe a CSV file well enough to notice when it changes.
+Input type: str path
+Output type: dict with size, mtime_ns and hash
+Notes: The hash covers the size plus the first and last 64 KiB, so checking a multi-GB file stays cheap;
+edits that keep the same size and modification time in the middle of the file are not detected.
+"""
+def source_fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=16)
+    with open(csv_path, "rb") as handle:
+        digest.update(handle.read(HASH_SAMPLE))
+        if stat.st_size > HASH_SAMPLE:
+            handle.seek(max(stat.st_size - HASH_SAMPLE, HASH_SAMPLE))
+            digest.update(handle.read(HASH_SAMPLE))
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest.hexdigest()}
+
+
+"""
+Purpose: Write a table's columns to the cache file for `csv_path`.
+Input type: csv_path (str), table (AirQualityTable), engine (str: the engine that parsed it, "csv" or "mmap"),
+rejects (list of (line, reason, row fields) for the rows the parser skipped, see file_handling.parse_csv)
+Output type: str (the cache file path)
+Notes: Written to a temporary file first and renamed, so a crash never leaves a half-written cache.
+"""
+def save_cached_table(csv_path, table, engine="csv", rejects=()):
+    sources = [(name, typecode, getattr(table, name)) for name, typecode in COLUMNS]
+    sources += [(pollutant + "_values", "d", data) for pollutant, data in table.extra_values.items()]
+    columns = []
+    offset = 0
+    for name, typecode, data in sources:
+        nbytes = len(data) * array(typecode).itemsize
+        columns.append([name, typecode, array(typecode).itemsize, offset, nbytes])
+        offset += nbytes + (-nbytes % 8)
+    header = json.dumps({
+        "source": source_fingerprint(csv_path),
+        "engine": engine,
+        "rows": len(table),
+        "city_names": table.city_names,
+        "date_names": table.date_names,
+        "columns": columns,
+        "extra": list(table.extra_values),
+        "rejects": [[line, reason, list(parts)] for line, reason, parts in rejects],
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+    path = cache_path(csv_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack("<Q", len(header)))
+        handle.write(header)
+        for (name, typecode, data), (_, _, _, _, nbytes) in zip(sources, columns):
+            handle.write(data.tobytes() if nbytes else b"")
+            handle.write(b"\0" * (-nbytes % 8))
+    os.replace(temp_path, path)
+    return path
+
+
+"""
+Purpose: Memory-map the cache for `csv_path` and return it as an AirQualityTable, or None if there is
+no cache or it no longer matches the CSV (or was written by another engine).
+Input type: csv_path (str), engine (str "csv" or "mmap"), rejects (list or None: receives the saved
+(line, reason, row fields) tuples of the rows the parser skipped)
+Output type: AirQualityTable or None
+Notes: Columns are copy-on-write memoryviews over the mapping, so nothing is copied up front; values can
+be changed in place but rows cannot be appended to a cached table.
+"""
+def load_cached_table(csv_path, engine="csv", rejects=None):
+    path = cache_path(csv_path)
+    try:
+        with open(path, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size < len(MAGIC) + 8:
+                return None
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+    except OSError:
+        return None
+    table, header = _map_table(csv_path, mapping, engine)
+    if table is None:
+        # Stale or unreadable: the views over the mapping went away with _map_table, so it can be closed
+        mapping.close()
+        return None
+    if rejects is not None:
+        rejects.extend((line, reason, parts) for line, reason, parts in header.get("rejects", []))
+    return table
+
+
+def _map_table(csv_path, mapping, engine):
+    """Return (AirQualityTable over the mapping, header), or (None, None) if the cache does not match."""
+    if mapping[:len(MAGIC)] != MAGIC:
+        return None, None
+    header_length = struct.unpack("<Q", mapping[len(MAGIC):len(MAGIC) + 8])[0]
+    data_start = len(MAGIC) + 8 + header_length
+    try:
+        header = json.loads(mapping[len(MAGIC) + 8:data_start].decode("utf-8"))
+        if header["source"] != source_fingerprint(csv_path) or header.get("engine") != engine:
+            return None, None
+    except (ValueError, KeyError, OSError):
+        return None, None
+    table = AirQualityTable()
+    table.city_names = header["city_names"]
+    table.city_lookup = {name: code for code, name in enumerate(table.city_names)}
+    table.date_names = header["date_names"]
+    table.date_lookup = {name: code for code, name in enumerate(table.date_names)}
+    extra = {pollutant + "_values": pollutant for pollutant in header.get("extra", [])}
+    view = memoryview(mapping)
+    for name, typecode, itemsize, offset, nbytes in header["columns"]:
+        if itemsize != array(typecode).itemsize or data_start + offset + nbytes > len(mapping):
+            return None, None
+        column = view[data_start + offset:data_start + offset + nbytes].cast(typecode)
+        if len(column) != header["rows"]:
+            return None, None
+        if name in extra:
+            table.extra_values[extra[name]] = column
+        else:
+            setattr(table, name, column)
+    table.cache_mapping = mapping
+    return table, header
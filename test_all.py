@@ -1,6 +1,17 @@
+import asyncio
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from data import AirQuality
-from file_handling import ozone_pm25_air_quality
+from urllib.request import urlopen
+from data import AirQuality, AirQualityTable
+from file_handling import ozone_pm25_air_quality, iter_air_quality, ParseReport
 from pm25_functions import (
     calculate_pm25_city_averages,
     count_unhealthy_pm25_days,
@@ -8,6 +19,7 @@ from pm25_functions import (
     get_pm25_category,
     get_pm25_statistics,
     get_pm25_distribution,
+    get_pm25_quantiles,
 )
 from ozone_functions import (
     ozone_averages,
@@ -17,7 +29,52 @@ from ozone_functions import (
     ozone_category,
     ozone_distribution,
 )
-from dictionary import combined_dictionary
+from dictionary import combined_dictionary, city_series
+from aggregation import AggregationEngine
+import numpy_backend
+from ranking import top_k, rank_all
+from parallel import parallel_aggregate, byte_ranges
+from table_cache import load_cached_table, cache_path
+from incremental import load_state, save_state, refresh, update_from_file
+from scanner import scan_columns
+from time_index import TimeIndex, parse_date
+from benchmarks.synthetic import write_synthetic_csv
+from instrumentation import Profiler, profile_destination
+from async_loader import aggregate_files
+from categories import PM25, OZONE, BREAKPOINTS, Breakpoints, register_pollutant
+from schema import LEGACY_COLUMNS, Schema
+from aggregation import summarize_pollutants
+import aqi
+from sqlite_store import SQLiteStore
+from result_cache import ResultCache
+import main as report
+from server import ReportServer
+from sketches import KLLSketch, HyperLogLog
+from aggregation import PollutantAccumulator
+from rolling import rolling, rolling_sorted, design_values, SlidingWindow
+
+def write_sample_csv(path, rows):
+    """Write (date, city, pm25, ozone) rows in the 25-column layout the loader expects."""
+    with open(path, "w") as handle:
+        handle.write(",".join("col" + str(i) for i in range(25)) + "\n")
+        for date, city, pm25, ozone in rows:
+            parts = [""] * 25
+            parts[0] = date
+            parts[4] = pm25
+            parts[7] = city
+            parts[24] = ozone
+            handle.write(",".join(parts) + "\n")
+
+
+SAMPLE_ROWS = [
+    ("01/01/2024", "A", "10.0", "0.040"),
+    ("01/02/2024", "A", "20.0", "0.060"),
+    ("01/01/2024", "B", "30.0", "0.050"),
+    ("01/02/2024", "B", "", "0.055"),
+    ("01/01/2024", "C", "60.0", "0.090"),
+    ("01/02/2024", "C", "58.0", ""),
+]
+
 
 class TestAllFunctions(unittest.TestCase):
     def setUp(self):
@@ -56,6 +113,7 @@ class TestAllFunctions(unittest.TestCase):
         self.assertEqual(stats['min'],0.040)
         self.assertEqual(stats['max'],0.090)
 
+    @unittest.skipUnless(os.path.exists('ozone_pm25_data.csv'), "ozone_pm25_data.csv is not in this checkout")
     def test_dict_and_loader(self):
         d = combined_dictionary(self.records)
         self.assertIn('A', d)
@@ -67,5 +125,609 @@ class TestAllFunctions(unittest.TestCase):
         self.assertTrue(hasattr(first,'pm25'))
         self.assertTrue(hasattr(first,'ozone'))
 
+    def test_shared_breakpoints(self):
+        self.assertEqual([PM25.label(v) for v in (12.0, 12.1, 35.4, 55.4, 55.45, None)],
+                         ['Good', 'Moderate', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'No Data'])
+        self.assertEqual(OZONE.categorize_many([0.054, float('nan'), 0.054, 0.086]),
+                         ['Good', 'No Data', 'Good', 'Unhealthy'])
+        self.assertEqual(AirQuality('X', 'd', None, None, 301).aqi_category(), 'Hazardous')
+        self.assertTrue(AirQuality('X', 'd', None, None, 151).aqi_unhealthy())
+        table = AirQualityTable.from_records(self.records)
+        self.assertEqual(get_pm25_distribution(table), get_pm25_distribution(self.records))
+        self.assertEqual(list(PM25.count_categories(table.pm25_values)), ['Good', 'Moderate', 'Unhealthy'])
+
+    def test_engine_single_pass(self):
+        engine = AggregationEngine(["pm25_averages", "pm25_distribution", "ozone_unhealthy"])
+        result = engine.run(iter(self.records))
+        self.assertEqual(result.row_count, 5)
+        self.assertEqual(result.city_averages('pm25'), calculate_pm25_city_averages(self.records))
+        self.assertEqual(result.distribution('pm25'), get_pm25_distribution(self.records))
+        self.assertEqual(result.unhealthy_days('ozone'), {'C': 1})
+        self.assertEqual(result.city_statistics('pm25')['A']['max'], 20.0)
+        with self.assertRaises(KeyError):
+            result.statistics('ozone')
+
+
+    @unittest.skipUnless(numpy_backend.HAVE_NUMPY, "NumPy not installed")
+    def test_numpy_backend_matches_python(self):
+        table = AirQualityTable.from_records(self.records)
+        metrics = ["pm25_statistics", "pm25_averages", "pm25_unhealthy", "pm25_distribution",
+                   "ozone_averages", "ozone_unhealthy", "ozone_distribution"]
+        slow = AggregationEngine(metrics, backend="python").run(table)
+        fast = AggregationEngine(metrics, backend="numpy").run(table)
+        for pollutant in ("pm25", "ozone"):
+            self.assertEqual(fast.city_averages(pollutant), slow.city_averages(pollutant))
+            self.assertEqual(fast.unhealthy_days(pollutant), slow.unhealthy_days(pollutant))
+            self.assertEqual(fast.distribution(pollutant), slow.distribution(pollutant))
+        self.assertEqual(fast.statistics("pm25"), slow.statistics("pm25"))
+
+    def test_ranking(self):
+        counts = {'A': 3, 'B': 9, 'C': 5, 'D': 9}
+        self.assertEqual(top_k(counts, 2), [('B', 9), ('D', 9)])
+        self.assertEqual(top_k(counts, 2, reverse=False), [('A', 3), ('C', 5)])
+        self.assertEqual(rank_all(counts), [('B', 9), ('D', 9), ('C', 5), ('A', 3)])
+        self.assertEqual(top_k(counts, 10), rank_all(counts))
+
+
+class SampleFileTestCase(unittest.TestCase):
+    """Base for tests that work on a small CSV file in a temporary directory."""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "sample.csv")
+        write_sample_csv(self.csv_path, SAMPLE_ROWS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestAirQualityTable(SampleFileTestCase):
+    def test_table_views_match_rows(self):
+        table = ozone_pm25_air_quality(self.csv_path)
+        self.assertIsInstance(table, AirQualityTable)
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table.city_names, ['A', 'B', 'C'])
+        self.assertIsNone(table[3].pm25)
+        self.assertIsNone(table[-1].ozone)
+        self.assertEqual([r.city for r in table], ['A', 'A', 'B', 'B', 'C', 'C'])
+        self.assertFalse(hasattr(table[0], '__dict__'))
+        self.assertEqual([vars_of(r) for r in table[1:5:2]], [vars_of(table[1]), vars_of(table[3])])
+        self.assertEqual(table[-2:][0].city, 'C')
+        avgs = calculate_pm25_city_averages(table)
+        self.assertAlmostEqual(avgs['C']['avg_pm25'], 59.0)
+        self.assertEqual(combined_dictionary(table)['B']['pm25'], [30.0, None])
+
+    def test_streaming_matches_table(self):
+        table = ozone_pm25_air_quality(self.csv_path)
+        self.assertEqual(get_pm25_statistics(iter_air_quality(self.csv_path)),
+                         get_pm25_statistics(table))
+        batches = list(iter_air_quality(self.csv_path, chunk_size=4))
+        self.assertEqual([len(b) for b in batches], [4, 2])
+        stream = itertools.chain.from_iterable(iter_air_quality(self.csv_path, chunk_size=4))
+        self.assertEqual(ozone_distribution(stream), ozone_distribution(table))
+        empty_path = os.path.join(self.tmp.name, "empty.csv")
+        open(empty_path, "w").close()
+        self.assertEqual(list(iter_air_quality(empty_path)), [])
+        self.assertEqual(list(iter_air_quality(empty_path, chunk_size=4)), [])
+
+    def test_city_series_columns_and_correlation(self):
+        series = city_series(ozone_pm25_air_quality(self.csv_path))
+        self.assertEqual(list(series), ["A", "B", "C"])
+        b = series["B"]
+        self.assertEqual(list(b.dates), [parse_date("01/01/2024"), parse_date("01/02/2024")])
+        self.assertEqual(b.pm25[0], 30.0)
+        self.assertEqual(b.missing("pm25"), bytearray([0, 1]))
+        self.assertIsNone(b.correlation())
+        self.assertAlmostEqual(series["A"].correlation(), 1.0)
+        self.assertAlmostEqual(series["A"].covariance(), 0.1)
+        self.assertEqual(len(series["C"]), 2)
+
+
+class TestLoaders(SampleFileTestCase):
+    def test_binary_cache_round_trip_and_invalidation(self):
+        self.assertIsNone(load_cached_table(self.csv_path))
+        parsed = ozone_pm25_air_quality(self.csv_path, cache=True)
+        self.assertTrue(os.path.exists(cache_path(self.csv_path)))
+        cached = load_cached_table(self.csv_path)
+        self.assertEqual([vars_of(r) for r in cached], [vars_of(r) for r in parsed])
+        with open(self.csv_path, "a") as handle:
+            handle.write("01/03/2024" + "," * 24 + "\n")
+        self.assertIsNone(load_cached_table(self.csv_path))
+        self.assertEqual(len(ozone_pm25_air_quality(self.csv_path, cache=True)), 7)
+
+    def test_mmap_engine_matches_csv_reader(self):
+        rows = SAMPLE_ROWS + [("01/03/2024", 'San, "Jose"\nNorth', "12.5", "0.041"),
+                              ("01/04/2024", "D, E", "1.0", "0.010")]
+        with open(self.csv_path, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["header"])
+            for date, city, pm25, ozone in rows:
+                parts = [""] * 25
+                parts[0], parts[4], parts[7], parts[24] = date, pm25, city, ozone
+                writer.writerow(parts)
+        fast = ozone_pm25_air_quality(self.csv_path, engine="mmap")
+        slow = ozone_pm25_air_quality(self.csv_path)
+        self.assertEqual([vars_of(r) for r in fast], [vars_of(r) for r in slow])
+        self.assertEqual(fast[-1].city, "D, E")
+        self.assertEqual(next(scan_columns(self.csv_path, [7])), (b"A",))
+        # Unquoted CRLF rows, all the same width and then one row with an extra field
+        for last in ("", ",extra"):
+            rows = [[str(row)] * 25 for row in range(3)]
+            with open(self.csv_path, "w", newline="") as handle:
+                handle.write("header\r\n" + "".join(",".join(row) + "\r\n" for row in rows[:2]))
+                handle.write(",".join(rows[2]) + last + "\r\n")
+            self.assertEqual(list(scan_columns(self.csv_path, [0, 7, 24])),
+                             [(b"0", b"0", b"0"), (b"1", b"1", b"1"), (b"2", b"2", b"2")])
+
+    def test_malformed_rows_are_quarantined(self):
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[:2] + [
+            ("01/03/2024", "A", "NA", "-999"),
+            ("01/04/2024", "A", "abc", "0.050"),
+            ("01/05/2024", "A", "12.0", "0.050x"),
+            ("01/06/2024", "A", "inf", "0.050"),
+        ] + SAMPLE_ROWS[2:])
+        with open(self.csv_path, "a") as handle:
+            handle.write("01/07/2024,short,row\n")
+        quarantine = os.path.join(self.tmp.name, "bad.csv")
+        parse_report = ParseReport()
+        table = ozone_pm25_air_quality(self.csv_path, quarantine=quarantine, report=parse_report)
+        self.assertEqual(len(table), 7)
+        self.assertEqual(vars_of(table[2]), ("A", "01/03/2024", None, None, None))
+        self.assertEqual((parse_report.rows, parse_report.rejected), (7, 4))
+        self.assertEqual(parse_report.reasons, {"bad number": 3, "short row": 1})
+        with open(quarantine, newline="") as handle:
+            rows = list(csv.reader(handle))
+        self.assertEqual([row[1:3] for row in rows[1:]],
+                         [["5", "bad number"], ["6", "bad number"], ["7", "bad number"], ["12", "short row"]])
+        self.assertEqual(rows[-1][3:], ["01/07/2024", "short", "row"])
+        self.assertGreater(parse_report.to_dict()["rows_per_second"], 0)
+        # The mmap engine reads sentinels the same way and falls back to parse_csv for the bad rows
+        scanned = ozone_pm25_air_quality(self.csv_path, engine="mmap")
+        self.assertEqual([vars_of(r) for r in scanned], [vars_of(r) for r in table])
+        ozone_pm25_air_quality(self.csv_path, cache=True, engine="mmap")
+        self.assertIsNone(load_cached_table(self.csv_path))
+        self.assertIsNotNone(load_cached_table(self.csv_path, "mmap"))
+        # A cache hit reports and quarantines the same rows as the parse that wrote the cache
+        cached_report = ParseReport()
+        cached_quarantine = os.path.join(self.tmp.name, "cached_bad.csv")
+        ozone_pm25_air_quality(self.csv_path, cache=True, engine="mmap", quarantine=cached_quarantine,
+                               report=cached_report)
+        self.assertEqual((cached_report.rows, cached_report.reasons), (7, parse_report.reasons))
+        with open(cached_quarantine, newline="") as handle:
+            self.assertEqual(list(csv.reader(handle)), rows)
+
+    def test_every_loader_skips_and_quarantines_bad_rows(self):
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[:2] + [("01/03/2024", "A", "abc", "0.050")] + SAMPLE_ROWS[2:]
+                         + [("Jan 2 2024", "C", "99.0", "0.099")])
+        metrics = ["pm25_statistics", "pm25_averages", "ozone_statistics"]
+        table = ozone_pm25_air_quality(self.csv_path)
+        expected = AggregationEngine(metrics).run(table)
+        self.assertEqual(expected.statistics("pm25")["max"], 60.0)
+        self.assertEqual(len(TimeIndex(table).query(city="C")), 2)
+        runs = {
+            "mmap": lambda report, quarantine: AggregationEngine(metrics).run(ozone_pm25_air_quality(
+                self.csv_path, engine="mmap", quarantine=quarantine, report=report)),
+            "workers": lambda report, quarantine: parallel_aggregate([self.csv_path], metrics, 2, report, quarantine),
+            "async": lambda report, quarantine: asyncio.run(
+                aggregate_files([self.csv_path], metrics, report=report, quarantine=quarantine)),
+            "state": lambda report, quarantine: refresh(
+                load_state(os.path.join(self.tmp.name, "state.json"), metrics), [self.csv_path],
+                report, quarantine).result,
+        }
+        for mode, run in runs.items():
+            quarantine = os.path.join(self.tmp.name, mode + ".csv")
+            parse_report = ParseReport()
+            result = run(parse_report, quarantine)
+            self.assertEqual(result.city_averages("pm25"), expected.city_averages("pm25"), mode)
+            self.assertEqual(result.statistics("ozone"), expected.statistics("ozone"), mode)
+            self.assertEqual((parse_report.rows, parse_report.rejected), (6, 2), mode)
+            with open(quarantine, newline="") as handle:
+                self.assertEqual([row[1:3] for row in csv.reader(handle)][1:],
+                                 [["4", "bad number"], ["9", "bad date"]], mode)
+
+    def test_header_schema_loads_any_pollutant_columns(self):
+        with open(self.csv_path, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["NO2", "Local Site Name", "Date", "SO2 Mean", "Daily Mean PM2.5 Concentration", "PM10"])
+            writer.writerow(["41.0", "A", "01/01/2024", "3.0", "10.0", "60"])
+            writer.writerow(["", "A", "01/02/2024", "4.0", "20.0", "300"])
+            writer.writerow(["400.0", "B", "01/01/2024", "5.0", "30.0", "20"])
+        table = ozone_pm25_air_quality(self.csv_path, cache=True)
+        self.assertEqual(table.pollutants(), ["pm25", "ozone", "no2", "pm10"])
+        self.assertEqual(table[1].value("no2"), None)
+        self.assertEqual((table[1].pm25, table[1].ozone, table[1].value("pm10")), (20.0, None, 300.0))
+        cached = ozone_pm25_air_quality(self.csv_path, cache=True)
+        scanned = ozone_pm25_air_quality(self.csv_path, engine="mmap")
+        self.assertEqual([r.readings for r in cached], [r.readings for r in table])
+        self.assertEqual([r.readings for r in scanned], [r.readings for r in table])
+        result = summarize_pollutants(table)
+        self.assertEqual(result.city_averages("no2"), {"A": {"avg_no2": 41.0, "no2_count": 1},
+                                                       "B": {"avg_no2": 400.0, "no2_count": 1}})
+        self.assertEqual(result.unhealthy_days("no2"), {"B": 1})
+        self.assertEqual(result.unhealthy_days("pm10"), {"A": 1})
+        self.assertEqual(result.distribution("pm10"), {"Moderate": 1, "Unhealthy": 1, "Good": 1})
+        records = summarize_pollutants(list(table), ["no2", "pm10"])
+        self.assertEqual(records.city_averages("pm10"), result.city_averages("pm10"))
+        self.assertEqual(records.distribution("no2"), result.distribution("no2"))
+        register_pollutant("so2", Breakpoints((35, 75, 185), ("Good", "Moderate", "USG", "Unhealthy"), 186))
+        self.addCleanup(BREAKPOINTS.pop, "so2")
+        custom = ozone_pm25_air_quality(self.csv_path, schema=Schema(pollutants={"so2": "SO2 Mean"}))
+        self.assertEqual(custom.pollutants(), ["pm25", "ozone", "so2"])
+        self.assertEqual(summarize_pollutants(custom).statistics("so2")["avg"], 4.0)
+        with self.assertRaises(ValueError):
+            Schema(date="Day").resolve(["Day", "NO2"])
+
+    def test_files_with_different_pollutant_columns(self):
+        def write(name, header, rows):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "w", newline="") as handle:
+                csv.writer(handle).writerows([header] + rows)
+            return path
+
+        ozone = write("ozone.csv", ["Date", "City", "PM2.5", "Ozone"],
+                      [["01/01/2024", "A", "10", "0.05"], ["01/02/2024", "B", "40", "0.08"]])
+        no2 = write("no2.csv", ["Date", "City", "PM2.5", "NO2"],
+                    [["01/01/2024", "A", "12", "400"], ["01/02/2024", "C", "5", "30"]])
+        for paths in ([ozone, no2], [no2, ozone]):
+            for workers in (1, 2):
+                result = report.load_result(paths, workers=workers, cache=False)
+                self.assertEqual(result.statistics("pm25")["count"], 4)
+                self.assertEqual(result.statistics("ozone")["count"], 2)
+                self.assertEqual(result.unhealthy_days("no2"), {"A": 1})
+            stored = report.load_store_result(paths, os.path.join(self.tmp.name, "air.db"))
+            self.assertEqual(stored.city_averages("no2"), result.city_averages("no2"))
+            self.assertEqual(stored.unhealthy_days("no2"), {"A": 1})
+        text = io.StringIO()
+        with contextlib.redirect_stdout(text):
+            report.main([no2], cache=False)
+        self.assertIn("Worst 3 cities by average NO2:", text.getvalue())
+        self.assertNotIn("Ozone", text.getvalue())
+        # Only some fields named: the others still come from the original export's positions
+        header = ["Date", "", "", "", "PM2.5"] + [""] * 20
+        self.assertEqual(Schema().resolve(header), LEGACY_COLUMNS)
+        header[7] = "City"
+        header[24] = "NO2"
+        self.assertEqual(Schema().resolve(header).pollutants, {"no2": 24, "pm25": 4})
+
+
+class TestAggregation(SampleFileTestCase):
+    def test_city_code_fold_matches_record_loop(self):
+        metrics = ["pm25_statistics", "pm25_averages", "pm25_unhealthy", "ozone_distribution", "pm25_quantiles"]
+        engine = AggregationEngine(metrics, backend="python")
+        table = ozone_pm25_air_quality(self.csv_path)
+        by_code = engine.run(table)
+        engine.feed(by_code, table)
+        by_record = engine.run(list(table))
+        engine.feed(by_record, list(table))
+        self.assertEqual(by_code.accumulators["pm25"].to_dict(), by_record.accumulators["pm25"].to_dict())
+        self.assertEqual(by_code.distribution("ozone"), by_record.distribution("ozone"))
+        self.assertEqual(list(by_code.unhealthy_days("pm25").items()), [("C", 4)])
+        self.assertEqual(list(by_code.city_averages("pm25")), ["A", "B", "C"])
+
+    def test_aqi_fill_matches_scalar_and_numpy(self):
+        self.assertEqual(aqi.pm25_aqi(12.0), 50)
+        self.assertEqual(aqi.pm25_aqi(12.09), 50)
+        self.assertEqual(aqi.ozone_aqi(0.078), 126)
+        self.assertIsNone(aqi.ozone_aqi(0.25))
+        self.assertIsNone(aqi.combined_aqi(None, None))
+        table = ozone_pm25_air_quality(self.csv_path, aqi=True)
+        expected = [42, 68, 89, 51, 161, 152]
+        self.assertEqual([record.aqi for record in table], expected)
+        self.assertEqual(AggregationEngine(["aqi_unhealthy"]).run(table).unhealthy_days("aqi"), {"C": 2})
+        if numpy_backend.HAVE_NUMPY:
+            numpy_backend.HAVE_NUMPY = False
+            try:
+                table = ozone_pm25_air_quality(self.csv_path, aqi=True)
+            finally:
+                numpy_backend.HAVE_NUMPY = True
+            self.assertEqual([record.aqi for record in table], expected)
+
+    def test_sketch_metrics_merge_and_round_trip(self):
+        table = ozone_pm25_air_quality(self.csv_path)
+        quantiles = get_pm25_quantiles(table)
+        self.assertEqual(quantiles["overall"], {0.5: 30.0, 0.98: 60.0})
+        self.assertEqual(quantiles["cities"]["C"], {0.5: 58.0, 0.98: 60.0})
+        engine = AggregationEngine(["pm25_quantiles", "pm25_distinct"])
+        distinct = engine.run(table).distinct("pm25")
+        self.assertEqual((distinct["cities"], distinct["dates"]), (3, 2))
+        self.assertEqual(distinct["city_dates"], {"A": 2, "B": 1, "C": 2})
+        merged = parallel_aggregate([self.csv_path] * 2, ["pm25_distinct"], workers=2)
+        self.assertEqual(merged.distinct("pm25")["city_dates"], {"A": 2, "B": 1, "C": 2})
+        accumulator = engine.run(table).accumulators["pm25"]
+        restored = PollutantAccumulator.from_dict(accumulator.to_dict())
+        self.assertEqual(restored.city_quantiles([0.5]), accumulator.city_quantiles([0.5]))
+        # Past the exact range the rank error stays within the documented ~1.7% after a merge
+        values = [(i * 7919) % 20000 for i in range(20000)]
+        first, second = KLLSketch(), KLLSketch(seed=7)
+        first.extend(values[:10000])
+        second.extend(values[10000:])
+        first.merge(second)
+        self.assertLess(sum(len(level) for level in first.compactors), 3 * 200)
+        for fraction in (0.5, 0.98):
+            self.assertLess(abs(first.quantile(fraction) - fraction * 20000), 0.017 * 20000)
+        counter = HyperLogLog()
+        for i in range(10000):
+            counter.add(i)
+        self.assertLess(abs(counter.count() - 10000), 0.05 * 10000)
+
+
+class TestParallelAndAsync(SampleFileTestCase):
+    def test_parallel_matches_serial(self):
+        metrics = ["pm25_statistics", "pm25_averages", "pm25_unhealthy", "ozone_distribution"]
+        serial = AggregationEngine(metrics).run(ozone_pm25_air_quality(self.csv_path))
+        merged = parallel_aggregate([self.csv_path, self.csv_path], metrics, workers=3)
+        self.assertEqual(len(byte_ranges(self.csv_path, 3)), 3)
+        self.assertEqual(merged.row_count, 2 * serial.row_count)
+        self.assertEqual(merged.unhealthy_days('pm25'), {'C': 4})
+        self.assertEqual(merged.distribution('ozone'),
+                         {k: 2 * v for k, v in serial.distribution('ozone').items()})
+        self.assertEqual(list(merged.city_averages('pm25')), list(serial.city_averages('pm25')))
+        self.assertEqual(merged.statistics('pm25')['avg'], serial.statistics('pm25')['avg'])
+        # Shard sums are exact, so any split merges to the single-pass answer bit for bit
+        records = [AirQuality('A', 'd', value, None) for value in (0.1, 0.2, 0.3, 1e16, 1.0, -1e16)]
+        whole = AggregationEngine(metrics).run(records)
+        for split in range(1, len(records)):
+            shards = AggregationEngine(metrics).run(records[:split])
+            shards.merge(AggregationEngine(metrics).run(records[split:]))
+            self.assertEqual(shards.statistics('pm25'), whole.statistics('pm25'))
+            self.assertEqual(shards.city_averages('pm25'), whole.city_averages('pm25'))
+        self.assertEqual(whole.statistics('pm25')['avg'], 1.6 / 6)
+
+    def test_distribution_only_matches_across_paths(self):
+        metrics = ["ozone_distribution"]
+        table = ozone_pm25_air_quality(self.csv_path)
+        expected = {'Good': 2, 'Moderate': 2, 'Unhealthy': 1}
+        results = {
+            "table": AggregationEngine(metrics).run(table),
+            "records": AggregationEngine(metrics).run(list(table)),
+            "parallel": parallel_aggregate([self.csv_path], metrics, workers=2),
+            "async": asyncio.run(aggregate_files([self.csv_path], metrics, chunk_size=2)),
+        }
+        for path, result in results.items():
+            self.assertEqual(result.distribution('ozone'), expected, path)
+
+    def test_async_loader_overlaps_slow_reads(self):
+        def slow_batches(path, chunk_size):
+            for batch in iter_air_quality(path, chunk_size):
+                time.sleep(0.2)
+                yield batch
+
+        metrics = ["pm25_averages", "ozone_unhealthy"]
+        paths = [self.csv_path] * 3
+        start = time.perf_counter()
+        result = asyncio.run(aggregate_files(paths, metrics, prefetch=2, chunk_size=3,
+                                             concurrency=3, batch_source=slow_batches))
+        elapsed = time.perf_counter() - start
+        # 3 files x 2 batches x 0.2 s would take 1.2 s one after another
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(result.row_count, 18)
+        self.assertEqual(result.unhealthy_days('ozone'), {'C': 3})
+        self.assertEqual(result.city_averages('pm25')['A']['pm25_count'], 6)
+
+
+class TestIncrementalState(SampleFileTestCase):
+    def test_incremental_state_matches_full_run(self):
+        metrics = ["pm25_averages", "pm25_unhealthy", "ozone_statistics"]
+        state_path = os.path.join(self.tmp.name, "state.json")
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[:3])
+        state = refresh(load_state(state_path, metrics), [self.csv_path])
+        save_state(state, state_path)
+        write_sample_csv(self.csv_path, SAMPLE_ROWS)
+        state = load_state(state_path, metrics)
+        self.assertEqual(update_from_file(state, self.csv_path), 3)
+        self.assertEqual(update_from_file(state, self.csv_path), 0)
+        full = AggregationEngine(metrics).run(ozone_pm25_air_quality(self.csv_path))
+        self.assertEqual(state.result.city_averages('pm25'), full.city_averages('pm25'))
+        self.assertEqual(state.result.unhealthy_days('pm25'), full.unhealthy_days('pm25'))
+        self.assertEqual(state.result.statistics('ozone'), full.statistics('ozone'))
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[4:])
+        self.assertIsNone(update_from_file(state, self.csv_path))
+        self.assertEqual(refresh(state, [self.csv_path]).result.row_count, 2)
+        # A state built for other files is rebuilt, not reused
+        other_path = os.path.join(self.tmp.name, "other.csv")
+        write_sample_csv(other_path, SAMPLE_ROWS[:1])
+        state = refresh(load_state(state_path, metrics), [self.csv_path, other_path])
+        self.assertEqual(state.result.row_count, 3)
+        save_state(state, state_path)
+        self.assertEqual(refresh(load_state(state_path, metrics), [other_path]).result.row_count, 1)
+
+    def test_incremental_state_counts_final_line_without_newline(self):
+        metrics = ["pm25_statistics"]
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[:2])
+        with open(self.csv_path) as handle:
+            text = handle.read().rstrip("\n")
+        with open(self.csv_path, "w") as handle:
+            handle.write(text)
+        state = refresh(load_state(os.path.join(self.tmp.name, "state.json"), metrics), [self.csv_path])
+        self.assertEqual(state.result.row_count, 2)
+        self.assertEqual(update_from_file(state, self.csv_path), 0)
+        with open(self.csv_path, "a") as handle:
+            handle.write("\n" + ",".join(["01/03/2024", "", "", "", "40.0", "", "", "A"] + [""] * 17) + "\n")
+        self.assertEqual(update_from_file(state, self.csv_path), 1)
+        self.assertEqual(state.result.statistics('pm25')['max'], 40.0)
+        # A final line that was still being written is continued: rebuild instead of miscounting
+        with open(self.csv_path, "w") as handle:
+            handle.write(text[:-1])
+        state = refresh(state, [self.csv_path])
+        with open(self.csv_path, "a") as handle:
+            handle.write(text[-1:] + "\n")
+        self.assertIsNone(update_from_file(state, self.csv_path))
+        self.assertEqual(refresh(state, [self.csv_path]).result.statistics('pm25'),
+                         AggregationEngine(metrics).run(ozone_pm25_air_quality(self.csv_path)).statistics('pm25'))
+
+
+class TestTimeQueries(SampleFileTestCase):
+    def test_time_index_range_queries(self):
+        write_sample_csv(self.csv_path, SAMPLE_ROWS + [("12/31/2023", "C", "70.0", "0.020")])
+        index = TimeIndex(ozone_pm25_air_quality(self.csv_path))
+        self.assertEqual(parse_date("2024-01-02") - parse_date("01/01/24"), 1)
+        self.assertEqual([r.date for r in index.query(city="C")], ["12/31/2023", "01/01/2024", "01/02/2024"])
+        self.assertEqual(len(index.query(start="01/02/2024", end="01/02/2024")), 3)
+        self.assertAlmostEqual(index.average("C", "pm25", "01/01/2024", "01/31/2024"), 59.0)
+        self.assertEqual(index.unhealthy_days("C", "pm25", end="01/01/2024"), 2)
+        self.assertEqual(index.count("B", "pm25"), 1)
+        self.assertIsNone(index.average("A", "pm25", start="02/01/2024"))
+        self.assertEqual(list(index.series("C").dates), [parse_date("12/31/2023"), parse_date("01/01/2024"),
+                                                         parse_date("01/02/2024")])
+        with self.assertRaises(KeyError):
+            index.series("Z")
+
+    def test_unreadable_dates_are_skipped_and_averages_exact(self):
+        records = [AirQuality("A", "01/0%d/2024" % day, value, None) for day, value in
+                   enumerate((0.1, 0.2, 0.3, 1e16, 1.0, -1e16), 1)] + [AirQuality("A", "Jan 9 2024", 5.0, None)]
+        parse_report = ParseReport()
+        index = TimeIndex(records, parse_report)
+        self.assertEqual((index.skipped, parse_report.reasons), (1, {"bad date": 1}))
+        self.assertEqual(index.count("A", "pm25"), 6)
+        # Same answer as the engine's exact sums, where a running float sum would give 0.0
+        self.assertEqual(index.average("A", "pm25"), 1.6 / 6)
+        self.assertEqual(index.average("A", "pm25", end="01/03/2024"), 0.2)
+        series = city_series(records, parse_report)
+        self.assertEqual(list(series["A"].pm25), [0.1, 0.2, 0.3, 1e16, 1.0, -1e16])
+        self.assertEqual(parse_report.rejected, 2)
+
+    def test_rolling_windows_and_design_values(self):
+        table = ozone_pm25_air_quality(self.csv_path)
+        windows = list(rolling(table, "pm25", 2))
+        self.assertEqual(windows[1], ("A", "01/02/2024", {"min": 10.0, "max": 20.0, "avg": 15.0, "count": 2}))
+        self.assertEqual(windows[3][2], {"min": 30.0, "max": 30.0, "avg": 30.0, "count": 1})
+        self.assertEqual(list(rolling_sorted(iter_air_quality(self.csv_path), "pm25", 2)), windows)
+        self.assertEqual(list(rolling(table, "ozone", 1, city="C"))[1][2], None)
+        window = SlidingWindow(3)
+        for day, value in enumerate([5.0, 1.0, 4.0, 3.0, 2.0]):
+            window.push(day, value)
+        self.assertEqual(window.statistics(), {"min": 2.0, "max": 4.0, "avg": 3.0, "count": 3})
+        path = os.path.join(self.tmp.name, "years.csv")
+        write_synthetic_csv(path, cities=2, days=3 * 365 + 1, missing_rate=0.0)
+        values = design_values(ozone_pm25_air_quality(path), "ozone")
+        self.assertEqual(sorted(values), ["Site 0", "Site 1"])
+        self.assertEqual(sorted(values["Site 0"]), [2022])
+
+
+class TestStoresAndServer(SampleFileTestCase):
+    def test_sqlite_store_pushes_down_group_by(self):
+        db_path = os.path.join(self.tmp.name, "air.db")
+        with SQLiteStore(db_path) as store:
+            self.assertTrue(store.load_csv(self.csv_path))
+            self.assertFalse(store.load_csv(self.csv_path))
+            table = ozone_pm25_air_quality(self.csv_path)
+            self.assertEqual(calculate_pm25_city_averages(store), calculate_pm25_city_averages(table))
+            self.assertEqual(unhealthy_ozone_days(store), unhealthy_ozone_days(table))
+            self.assertEqual(get_pm25_distribution(store), get_pm25_distribution(table))
+            self.assertEqual(ozone_statistics(store), ozone_statistics(table))
+            # Quantiles cannot be pushed down, so the engine streams the stored rows instead
+            self.assertEqual(get_pm25_quantiles(store), get_pm25_quantiles(table))
+            self.assertEqual(len(store), 6)
+        # A later run over another file answers for that file only, even from another directory
+        other_path = os.path.join(self.tmp.name, "other.csv")
+        write_sample_csv(other_path, SAMPLE_ROWS[:1])
+        with SQLiteStore(db_path) as store:
+            self.assertTrue(store.load_csv(other_path))
+            self.assertEqual(len(store), 1)
+            self.assertEqual(calculate_pm25_city_averages(store), {"A": {"avg_pm25": 10.0, "pm25_count": 1}})
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        with SQLiteStore(db_path) as store:
+            self.assertFalse(store.load_csv("sample.csv"))
+            self.assertEqual([vars_of(r) for r in store], [vars_of(r) for r in table])
+
+    def test_result_cache_tiers_counters_and_invalidation(self):
+        disk_dir = os.path.join(self.tmp.name, "results")
+        cache = ResultCache(disk_dir=disk_dir)
+        first = report.summarize(self.csv_path, k=1, cache=cache)
+        self.assertEqual(first["pm25_worst"], [("C", 59.0)])
+        self.assertEqual(report.summarize(self.csv_path, k=2, cities=["A", "B"], cache=cache)["pm25_worst"],
+                         [("B", 30.0), ("A", 15.0)])
+        self.assertIs(report.summarize(self.csv_path, k=1, cache=cache), first)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (2, 3))
+        restarted = ResultCache(disk_dir=disk_dir)
+        self.assertEqual(report.summarize(self.csv_path, k=1, cache=restarted), first)
+        self.assertEqual(restarted.stats()["disk_hits"], 1)
+        write_sample_csv(self.csv_path, SAMPLE_ROWS[:2])
+        os.utime(self.csv_path, ns=(1, 1))
+        self.assertEqual(report.summarize(self.csv_path, k=1, cache=cache)["records"], 2)
+        small = ResultCache(max_bytes=200)
+        for number in range(5):
+            small.put(("key", number), "x" * 60)
+        self.assertLessEqual(small.stats()["bytes"], 200)
+        self.assertGreater(small.stats()["evictions"], 0)
+        self.assertIsNone(small.get(("key", 0)))
+
+    def test_report_server_answers_and_hot_reloads(self):
+        server = ReportServer([self.csv_path], port=0, poll_seconds=3600)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://%s:%d" % server.server_address[:2]
+        try:
+            with urlopen(base + "/summary?k=1&city=A&city=B") as response:
+                self.assertEqual(json.load(response)["pm25_worst"], [["B", 30.0]])
+            with urlopen(base + "/city?name=A&pollutant=pm25&end=01/01/2024") as response:
+                self.assertEqual(json.load(response)["average"], 10.0)
+            with urlopen(base + "/report") as response:
+                self.assertIn("Records: 5, Cities: 3", response.read().decode("utf-8"))
+            self.assertFalse(server.reload_if_changed())
+            write_sample_csv(self.csv_path, SAMPLE_ROWS[:2])
+            os.utime(self.csv_path, ns=(1, 1))
+            self.assertTrue(server.reload_if_changed())
+            with urlopen(base + "/health") as response:
+                health = json.load(response)
+            self.assertEqual((health["rows"], health["reloads"]), (2, 1))
+            # A failed reload keeps the old data, says so once on stderr and shows up in /health
+            with open(self.csv_path, "w") as handle:
+                handle.write("Date,Value\n01/01/2024,1\n")
+            errors = io.StringIO()
+            with contextlib.redirect_stderr(errors):
+                self.assertFalse(server.reload_if_changed())
+                self.assertFalse(server.reload_if_changed())
+            self.assertEqual(errors.getvalue().count("Reload failed"), 1)
+            with urlopen(base + "/health") as response:
+                health = json.load(response)
+            self.assertEqual((health["rows"], health["last_error"]),
+                             (2, "no city column (looked for Local Site Name, City)"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestTooling(SampleFileTestCase):
+    def test_synthetic_generator_is_deterministic(self):
+        other_path = os.path.join(self.tmp.name, "other.csv")
+        self.assertEqual(write_synthetic_csv(self.csv_path, 4, 10, 0.1), 40)
+        write_synthetic_csv(other_path, 4, 10, 0.1)
+        with open(self.csv_path) as first, open(other_path) as second:
+            self.assertEqual(first.read(), second.read())
+        table = ozone_pm25_air_quality(self.csv_path)
+        self.assertEqual(len(table), 40)
+        self.assertEqual(len(table.city_names), 4)
+
+    def test_profiler_stages_and_counters(self):
+        profiler = Profiler()
+        with profiler.stage("off"):
+            pass
+        profiler.count("rows", 5)
+        self.assertEqual(profiler.summary()["stages"], {})
+        profiler.enable()
+        for _ in range(2):
+            with profiler.stage("load"):
+                ozone_pm25_air_quality(self.csv_path)
+        profiler.count("rows", 6)
+        summary = profiler.summary()
+        self.assertEqual(summary["stages"]["load"]["calls"], 2)
+        self.assertEqual(summary["counters"], {"rows": 6})
+        self.assertGreaterEqual(summary["total_seconds"], summary["stages"]["load"]["seconds"])
+
+    def test_profile_options_and_environment(self):
+        # A CSV path after --profile is an input file, never the summary destination
+        args = report.parse_args(["--profile", "data.csv"])
+        self.assertEqual((args.csv_paths, args.profile), (["data.csv"], "-"))
+        args = report.parse_args(["data.csv", "--profile-out", "run.json"])
+        self.assertEqual((args.csv_paths, args.profile), (["data.csv"], "run.json"))
+        self.assertEqual([profile_destination(value) for value in (None, "", "0", "false", "FALSE", "1", "run.json")],
+                         [None, None, None, None, None, "-", "run.json"])
+
+
+def vars_of(record):
+    return (record.city, record.date, record.pm25, record.ozone, record.aqi)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,177 @@
+"""Time Index
+Purpose: Answer per-city, date-range questions without scanning every record.
+Dates are parsed once per distinct date string into ordinal day numbers, each city's rows are sorted
+by date, and prefix-sum arrays per pollutant make range averages, counts and unhealthy-day counts
+two binary searches (O(log n)). Listing the rows in a range costs O(log n + k).
+Prefix sums are exact integers (see exact_sum.scaled), so a range average equals the aggregation
+engine's average over the same rows bit for bit. Rows whose date parse_date cannot read are left out
+and counted (the loaders already skip them; this covers records built some other way).
+Example: index = TimeIndex(ozone_pm25_air_quality("ozone_pm25_data.csv"))
+         index.average("Fresno", "pm25", "08/01/2024", "08/31/2024") -> 14.2
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+from categories import BREAKPOINTS
+from data import AirQualityTable
+from exact_sum import from_scaled, mean, scale_bits, scaled
+# parse_date lives with the other field conversions, so the loaders reject dates it cannot read
+from schema import DATE_FORMATS, parse_date
+
+POLLUTANTS = ("pm25", "ozone", "aqi")
+
+
+"""
+Purpose: Parse each distinct date string of a table once.
+Input type: list[str] (AirQualityTable.date_names)
+Output type: list of int ordinal day numbers, None where parse_date cannot read the date
+Example: date_ordinals(["01/02/2024", "Jan 2 2024"]) -> [738887, None]
+"""
+def date_ordinals(date_names):
+    ordinals = []
+    for text in date_names:
+        try:
+            ordinals.append(parse_date(text))
+        except ValueError:
+            ordinals.append(None)
+    return ordinals
+
+
+class CitySeries:
+    """One city's rows in date order, with prefix sums for each pollutant."""
+    def __init__(self, rows, ordinals, table, pollutants=POLLUTANTS):
+        self.rows = array("i", rows)
+        self.dates = array("i", ordinals)
+        # Prefix sums are ints counting 2**-bits[pollutant] units (see exact_sum.scaled)
+        self.sums = {}
+        self.bits = {}
+        self.counts = {}
+        self.unhealthy = {}
+        for pollutant in pollutants:
+            values = table.column(pollutant)
+            unhealthy_at = BREAKPOINTS[pollutant].unhealthy_at
+            column = [values[row] for row in rows]
+            bits = scale_bits(column)
+            units = {}
+            sums = [0]
+            counts = array("i", [0])
+            unhealthy = array("i", [0])
+            total = 0
+            count = 0
+            bad = 0
+            for value in column:
+                if value == value:
+                    step = units.get(value)
+                    if step is None:
+                        step = units[value] = scaled(value, bits)
+                    total += step
+                    count += 1
+                    if value >= unhealthy_at:
+                        bad += 1
+                sums.append(total)
+                counts.append(count)
+                unhealthy.append(bad)
+            self.sums[pollutant] = sums
+            self.bits[pollutant] = bits
+            self.counts[pollutant] = counts
+            self.unhealthy[pollutant] = unhealthy
+
+    def span(self, start, end):
+        """Return the (low, high) positions of rows dated start..end inclusive (None = open)."""
+        low = 0 if start is None else bisect_left(self.dates, parse_date(start))
+        high = len(self.dates) if end is None else bisect_right(self.dates, parse_date(end))
+        return low, max(low, high)
+
+
+class TimeIndex:
+    """Per-city, date-sorted index over an AirQualityTable."""
+    def __init__(self, records, report=None):
+        """Purpose: Build the index (parses each distinct date once, then sorts each city's rows).
+        Inputs: AirQualityTable (other record iterables are copied into one first), report
+        (file_handling.ParseReport or None: rows left out for an unreadable date count as "bad date").
+        Output: None (self.skipped holds the number of rows left out).
+        Example: TimeIndex(table)
+        """
+        if not isinstance(records, AirQualityTable):
+            records = AirQualityTable.from_records(records)
+        self.table = records
+        ordinals = date_ordinals(records.date_names)
+        buckets = [[] for _ in records.city_names]
+        date_ids = records.date_ids
+        self.skipped = 0
+        if None in ordinals:
+            for row, (city_id, date_id) in enumerate(zip(records.city_ids, date_ids)):
+                if ordinals[date_id] is None:
+                    self.skipped += 1
+                    if report is not None:
+                        report.reject("bad date")
+                else:
+                    buckets[city_id].append(row)
+        else:
+            for row, city_id in enumerate(records.city_ids):
+                buckets[city_id].append(row)
+        # Extra pollutant columns (see schema.py) are indexed too when they have a breakpoint table
+        self.indexed = POLLUTANTS + tuple(pollutant for pollutant in records.extra_values if pollutant in BREAKPOINTS)
+        self.cities = {}
+        for city_id, rows in enumerate(buckets):
+            rows.sort(key=lambda row: ordinals[date_ids[row]])
+            self.cities[records.city_names[city_id]] = CitySeries(
+                rows, [ordinals[date_ids[row]] for row in rows], records, self.indexed
+            )
+
+    def pollutants(self):
+        """Purpose: List the pollutants that range queries accept, like ["pm25", "ozone", "aqi", "no2"]."""
+        return list(self.indexed)
+
+    def series(self, city):
+        """Purpose: Return one city's rows in date order (row numbers and date ordinals, see CitySeries).
+        Input: city str.
+        Output: CitySeries. Raises KeyError for a city with no readings.
+        Example: index.series("Fresno").dates[0] -> 738886 (01/01/2024)
+        """
+        series = self.cities.get(city)
+        if series is None:
+            raise KeyError("unknown city: " + str(city))
+        return series
+
+    def query(self, city=None, start=None, end=None):
+        """Purpose: Return the records for one city (or every city) dated start..end inclusive, in date order.
+        Inputs: city str or None, start/end date str, ordinal int or None for an open end.
+        Output: list[AirQuality].
+        Example: index.query(city="Fresno", start="08/01/2024", end="08/31/2024")
+        """
+        cities = list(self.cities) if city is None else [city]
+        records = []
+        for name in cities:
+            series = self.series(name)
+            low, high = series.span(start, end)
+            for row in series.rows[low:high]:
+                records.append(self.table[row])
+        return records
+
+    def count(self, city, pollutant, start=None, end=None):
+        """Purpose: Number of non-missing readings for a city in a date range. O(log n)."""
+        series = self.series(city)
+        low, high = series.span(start, end)
+        counts = series.counts[pollutant]
+        return counts[high] - counts[low]
+
+    def average(self, city, pollutant, start=None, end=None):
+        """Purpose: Average reading for a city in a date range, or None when there are none. O(log n).
+        Example: index.average("A", "pm25", "01/01/2024", "01/02/2024") -> 15.0
+        """
+        series = self.series(city)
+        low, high = series.span(start, end)
+        counts = series.counts[pollutant]
+        count = counts[high] - counts[low]
+        if count == 0:
+            return None
+        sums = series.sums[pollutant]
+        return mean(from_scaled(sums[high] - sums[low], series.bits[pollutant]), count)
+
+    def unhealthy_days(self, city, pollutant, start=None, end=None):
+        """Purpose: Number of unhealthy readings for a city in a date range. O(log n)."""
+        series = self.series(city)
+        low, high = series.span(start, end)
+        unhealthy = series.unhealthy[pollutant]
+        return unhealthy[high] - unhealthy[low]